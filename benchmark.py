@@ -0,0 +1,245 @@
+"""
+Benchmarks for scheme file formats and the editor pipeline
+
+    python benchmark.py [--components N] [--shapes M] [--labels K] [--label NAME]
+    python benchmark.py --formats [copies]
+
+Results are appended to benchmark_results.json and compared with the last run
+made with the same parameters, so regressions show up between versions.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tempfile
+import tracemalloc
+import pyglet
+# file tools need no OpenGL context, the editor benchmarks draw offscreen
+pyglet.options['shadow_window'] = False
+pyglet.options['headless'] = True
+from feetcad import SCHEME, BINARY_SCHEME
+
+HOME = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(HOME, 'benchmark_results.json')
+FONT = {"name": "GOST TYPE A", "size": 5, "bold": False, "itallic": False, "underline": False, "strikeout": False}
+WHITE = [255, 255, 255, 255]
+
+
+def scaled_scheme(source, copies):
+    """ Scheme built from the components of source repeated on a square raster. """
+    scheme = SCHEME()
+    scheme.loadScheme(source)
+    components = scheme.persistentData()['components']
+    side = int(copies**0.5) + 1
+    result = []
+    for n in range(copies):
+        for component in components:
+            component = copy.deepcopy(component)
+            component['x'] += (n % side) * 100
+            component['y'] += (n // side) * 100
+            result.append(component)
+    scheme.jsonData = {'name': 'benchmark', 'components': result}
+    return scheme
+
+
+def synthetic_scheme(components = 5000, shapes = 4, labels = 2, seed = 0):
+    """ Scheme of components on a square raster, each with shapes lines/rectangles and labels labels. """
+    rnd = random.Random(seed)
+    side = int(components**0.5) + 1
+    result = []
+    for n in range(components):
+        component = {"name": "U%d" % n, "x": (n % side) * 40, "y": (n // side) * 40,
+                     "customGroup": "synthetic", "referenceTo": None, "nameMask": "U#",
+                     "labels": [], "shapes": [], "pins": []}
+        for i in range(labels):
+            font = dict(FONT, size = 7 if i == 0 else 5)
+            component['labels'].append({"field": "name" if i == 0 else "F%d" % i, "font": font,
+                                        "x": -10, "y": 5 - i*7, "text": "U%d" % n if i == 0 else "%d.%dk" % (i, n % 10)})
+        for i in range(shapes):
+            x1, y1 = rnd.randint(-15, 15), rnd.randint(-15, 15)
+            x2, y2 = x1 + rnd.randint(1, 10), y1 - rnd.randint(1, 10)
+            component['shapes'].append({"type": "rectangle" if i % 3 == 2 else "line",
+                                        "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+                                        "width": 0.3, "color": WHITE})
+        component['pins'].append({"name": "1", "x": 0, "y": 0, "visible": "True", "shapeType": "dot", "color": WHITE})
+        result.append(component)
+    scheme = SCHEME()
+    scheme.jsonData = {'name': 'synthetic', 'components': result}
+    return scheme
+
+
+def timed(function, repeat = 3, setup = None):
+    best = None
+    for i in range(repeat):
+        if setup != None:
+            setup()
+        t = time.perf_counter()
+        function()
+        t = time.perf_counter() - t
+        best = t if best == None else min(best, t)
+    return best
+
+
+def peak_memory(function, setup = None):
+    """ Peak of python allocations made by one call of function, in bytes. """
+    if setup != None:
+        setup()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_formats(source = 'test.json', copies = 500):
+    scheme = scaled_scheme(source, copies)
+    print('format benchmark:', len(scheme.jsonData['components']), 'components')
+    folder = tempfile.mkdtemp()
+    reference = scheme.persistentData()
+    for name, fileName in (('json', 'bench.jschem'), ('binary', 'bench' + BINARY_SCHEME.EXTENSION)):
+        fileName = os.path.join(folder, fileName)
+        save = timed(lambda: scheme.saveScheme(fileName))
+        loaded = SCHEME()
+        load = timed(lambda: loaded.loadScheme(fileName))
+        assert loaded.jsonData == reference, name + ' round trip changed the scheme'
+        print('%-8s save %8.1f ms   load %8.1f ms   size %10d bytes' % (
+            name, save*1000, load*1000, os.path.getsize(fileName)))
+        os.remove(fileName)
+    os.rmdir(folder)
+
+
+class SUITE():
+    """ Editor benchmarks on one synthetic scheme. """
+    def __init__(self, components, shapes, labels, repeat = 3, queries = 2000):
+        self.params = {'components': components, 'shapes': shapes, 'labels': labels}
+        self.repeat = repeat
+        self.queries = queries
+        self.scheme = synthetic_scheme(components, shapes, labels)
+        self.folder = tempfile.mkdtemp()
+        self.results = {}
+
+    def measure(self, name, function, items, unit, setup = None):
+        seconds = timed(function, self.repeat, setup)
+        peak = peak_memory(function, setup)
+        self.results[name] = {'seconds': seconds, 'throughput': items/seconds if seconds > 0 else None,
+                              'unit': unit, 'peak_bytes': peak}
+        print('%-22s %9.2f ms %12.0f %s/s   peak %9.1f KiB' % (
+            name, seconds*1000, self.results[name]['throughput'] or 0, unit, peak/1024))
+
+    def files(self):
+        components = len(self.scheme.jsonData['components'])
+        for name, fileName in (('json', 'bench.jschem'), ('binary', 'bench' + BINARY_SCHEME.EXTENSION)):
+            fileName = os.path.join(self.folder, fileName)
+            self.measure('saveScheme ' + name, lambda: self.scheme.saveScheme(fileName), components, 'components')
+            loaded = SCHEME()
+            self.measure('loadScheme ' + name, lambda: loaded.loadScheme(fileName), components, 'components')
+            os.remove(fileName)
+
+    def editor(self):
+        from feetcad import FEETCAD
+        # the editor finds its own resources
+        cad = FEETCAD()
+        cad.initialize_in_macro_label()
+        try:
+            cad.scheme.jsonData = self.scheme.jsonData
+            components = len(cad.scheme.jsonData['components'])
+            for lazy in (True, False):
+                cad.lazy_shapes = lazy
+                self.measure('loadShapesFromJson' + (' lazy' if lazy else ''), cad.loadShapesFromJson,
+                             components, 'components', setup = cad.clearScheme)
+            cad.lazy_shapes = True
+            def unviewed():
+                # reset_view materializes what it brings into view, start from nothing built
+                cad.clearScheme()
+                cad.loadShapesFromJson()
+            self.measure('reset_view', cad.reset_view, 1, 'calls', setup = unviewed)
+
+            minx, miny, maxx, maxy = cad.world_bounds()
+            rnd = random.Random(1)
+            points = [(rnd.uniform(minx, maxx), rnd.uniform(miny, maxy)) for i in range(self.queries)]
+            def hit_test():
+                for x, y in points:
+                    cad.check_mouse_onshape(x, y)
+            self.measure('check_mouse_onshape', hit_test, len(points), 'queries')
+
+            if not cad.grid_group.visible:
+                cad.toggle_grid()
+            def grid():
+                for i in range(100):
+                    cad.recalculate_grid()
+            self.measure('recalculate_grid', grid, 100, 'calls')
+        finally:
+            cad.on_close()
+
+    def run(self):
+        print('editor benchmark: %(components)d components, %(shapes)d shapes, %(labels)d labels' % self.params)
+        self.files()
+        self.editor()
+        os.rmdir(self.folder)
+        return self.results
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd = HOME,
+                                       stderr = subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(previous, results, tolerance):
+    """ Print the change against a previous run, returns names that got slower than tolerance. """
+    slower = []
+    print('compared with', previous['label'], previous['time'])
+    for name, result in results.items():
+        before = previous['results'].get(name)
+        if before == None:
+            continue
+        change = result['seconds']/before['seconds'] - 1 if before['seconds'] > 0 else 0
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            slower.append(name)
+        print('%-22s %+7.1f %%%s' % (name, change*100, flag))
+    return slower
+
+
+def save_results(results, params, label, fileName = RESULTS_FILE, tolerance = 0.1):
+    runs = []
+    if os.path.exists(fileName):
+        with open(fileName) as f:
+            runs = json.load(f)['runs']
+    previous = [run for run in runs if run['params'] == params]
+    slower = compare(previous[-1], results, tolerance) if previous else []
+    runs.append({'label': label, 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                 'python': sys.version.split()[0], 'params': params, 'results': results})
+    with open(fileName, 'w') as f:
+        json.dump({'runs': runs}, f, indent = 1)
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'feetcad benchmarks')
+    parser.add_argument('--formats', type = int, nargs = '?', const = 500, metavar = 'COPIES',
+                        help = 'only compare file formats on copies of test.json')
+    parser.add_argument('--components', type = int, default = 5000)
+    parser.add_argument('--shapes', type = int, default = 4)
+    parser.add_argument('--labels', type = int, default = 2)
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--label', default = None, help = 'name of this run, git revision by default')
+    parser.add_argument('--output', default = RESULTS_FILE)
+    parser.add_argument('--tolerance', type = float, default = 0.1, help = 'slowdown reported as regression')
+    args = parser.parse_args()
+    os.chdir(HOME)
+    if args.formats != None:
+        bench_formats(copies = args.formats)
+    else:
+        suite = SUITE(args.components, args.shapes, args.labels, args.repeat)
+        results = suite.run()
+        slower = save_results(results, suite.params, args.label or revision(), args.output, args.tolerance)
+        sys.exit(1 if slower else 0)
@@ -0,0 +1,19 @@
+"""
+Convert schemes between the json (.jschem/.json) and binary (.bschem) formats
+"""
+import sys
+import pyglet
+# file tools need no OpenGL context
+pyglet.options['shadow_window'] = False
+from feetcad import SCHEME, BINARY_SCHEME
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print('usage: convert_scheme.py <input> <output>')
+        print('the output format follows the output extension (%s is binary)' % BINARY_SCHEME.EXTENSION)
+        sys.exit(1)
+
+    scheme = SCHEME()
+    scheme.loadScheme(sys.argv[1])
+    scheme.saveScheme(sys.argv[2])
+    print('converted', sys.argv[1], '->', sys.argv[2])
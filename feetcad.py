@@ -1,15 +1,149 @@
 """
 Simple example showing some animated shapes
 """
+import time
+# startup phases are measured from here, see STARTUP_TIMER
+LAUNCH_TIME = time.perf_counter()
 import math
 import pyglet
 from pyglet import shapes
 import json
+import copy
 from pyglet.graphics import Group
-from pyglet.math import Vec2
-import time
+from pyglet.math import Vec2, Vec3, Mat4
+import os
+import struct
+import mmap
+import threading
+import tempfile
+import sys
+import queue
+import bisect
+import operator
+import sqlite3
+from collections import OrderedDict, deque
 import pyglet.gl as gl
-from tkinter import Tk, Frame, Menu
+import numpy as np
+
+HOME = os.path.dirname(os.path.abspath(__file__))
+# per user, so nothing is written next to the program
+CACHE_FILE = os.path.join(pyglet.resource.get_settings_path('feetcad'), 'feetcad_cache.json')
+
+
+class STARTUP_TIMER():
+    """ Wall clock phases of the program start, for a breakdown printed once. """
+
+    def __init__(self, start):
+        self.start = start
+        self.last = start
+        self.phases = []
+
+    def mark(self, phase):
+        """ Close phase: the time since the previous mark is booked on it. """
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def mark_once(self, phase):
+        if not any(name == phase for name, duration in self.phases):
+            self.mark(phase)
+
+    def report(self):
+        lines = ['startup %.1f ms' % ((self.last - self.start)*1000)]
+        for phase, duration in self.phases:
+            lines.append('  %-12s %8.1f ms' % (phase, duration*1000))
+        return '\n'.join(lines)
+
+
+STARTUP = STARTUP_TIMER(LAUNCH_TIME)
+STARTUP.mark('imports')
+
+
+class STARTUP_CACHE():
+    """ Json file of what is worth remembering between runs to start faster. """
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.data = {}
+        self.changed = False
+
+    def load(self):
+        try:
+            with open(self.fileName, encoding = 'utf-8') as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            data = {}
+        self.data = data if isinstance(data, dict) else {}
+        self.changed = False
+
+    def get(self, key, default = None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        if self.data.get(key) != value:
+            self.data[key] = value
+            self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.fileName), exist_ok = True)
+            with open(self.fileName + '.tmp', 'w', encoding = 'utf-8') as handle:
+                json.dump(self.data, handle)
+            os.replace(self.fileName + '.tmp', self.fileName)
+            self.changed = False
+        except OSError:
+            # a read only install just starts a little slower
+            pass
+
+
+class RESOURCES():
+    """ Files shipped next to the program, opened by their relative name ('buttons/macro_line.png').
+
+    Only the given folders are indexed. The index is kept in the startup
+    cache and the directory walk is skipped while none of the walked
+    directories changed since the index was cached.
+    """
+
+    def __init__(self, cache, home, folders):
+        self.cache = cache
+        self.home = home
+        self.folders = list(folders)
+        self.index = None
+
+    @staticmethod
+    def stamp(directories):
+        try:
+            return [os.stat(directory).st_mtime_ns for directory in directories]
+        except OSError:
+            return None
+
+    def reindex(self):
+        key = [self.home] + self.folders
+        entry = self.cache.get('resources')
+        if entry != None and entry['key'] == key and RESOURCES.stamp(entry['dirs']) == entry['stamp']:
+            self.index = entry['files']
+            return
+
+        files = {}
+        dirs = []
+        for folder in self.folders:
+            for directory, subdirs, names in os.walk(os.path.join(self.home, folder)):
+                dirs.append(directory)
+                prefix = os.path.relpath(directory, self.home).replace(os.sep, '/')
+                for name in names:
+                    files[prefix + '/' + name] = os.path.join(directory, name)
+        self.index = files
+        self.cache.set('resources', {'key': key, 'files': files, 'dirs': dirs, 'stamp': RESOURCES.stamp(dirs)})
+
+    def file(self, name, mode = 'rb'):
+        if self.index == None:
+            self.reindex()
+        path = self.index.get(name)
+        if path == None:
+            raise pyglet.resource.ResourceNotFoundException(name)
+        return open(path, mode)
 
 class CameraGroup(Group):
     """ Graphics group emulating the behaviour of a camera in 2D space. """
@@ -20,6 +154,11 @@ class CameraGroup(Group):
         self.x = x
         self.y = y
         self.zoom = zoom
+        # (x0, y0, zoom0, x1, y1, zoom1, start, duration) while gliding, see animate
+        self.animation = None
+        self.__matrix = None
+        self.__matrix_key = None
+        self.__previous = None
 
     @property
     def position(self) -> Vec2:
@@ -31,27 +170,27 @@ class CameraGroup(Group):
         """Set the scroll offset directly."""
         self.x, self.y = new_position
 
-    def set_state(self):
-        """ Apply zoom and camera offset to view matrix. """
+    def translation(self):
+        """ Offset of the view in window pixels. """
+        return (-self.x * self.zoom, -self.y * self.zoom)
 
-        # Translate using the offset.
-        view_matrix = self._window.view.translate((-self.x * self.zoom, -self.y * self.zoom, 0))
-        # Scale by zoom level.
-        view_matrix = view_matrix.scale((self.zoom, self.zoom, 1))
+    def matrix(self, base):
+        """ View matrix of the camera on top of base; rebuilt only when something changed. """
+        tx, ty = self.translation()
+        key = (tx, ty, self.zoom, base)
+        if key != self.__matrix_key:
+            self.__matrix_key = key
+            self.__matrix = base @ Mat4.from_translation(Vec3(tx, ty, 0)) @ Mat4.from_scale(Vec3(self.zoom, self.zoom, 1))
+        return self.__matrix
 
-        self._window.view = view_matrix
+    def set_state(self):
+        """ Apply zoom and camera offset to view matrix. """
+        self.__previous = self._window.view
+        self._window.view = self.matrix(self.__previous)
 
     def unset_state(self):
-        """ Revert zoom and camera offset from view matrix. """
-        # Since this is a matrix, you will need to reverse the translate after rendering otherwise
-        # it will multiply the current offset every draw update pushing it further and further away.
-
-        # Use inverse zoom to reverse zoom
-        view_matrix = self._window.view.scale((1 / self.zoom, 1 / self.zoom, 1))
-        # Reverse translate.
-        view_matrix = view_matrix.translate((self.x * self.zoom, self.y * self.zoom, 0))
-
-        self._window.view = view_matrix
+        """ Put back the view matrix saved by set_state, instead of inverting the camera. """
+        self._window.view = self.__previous
 
     def set_zoom(self, zoom):
         self.zoom = zoom
@@ -60,6 +199,42 @@ class CameraGroup(Group):
         self.x = x
         self.y = y
 
+    def animate(self, x, y, zoom, duration, now):
+        """ Glide to x, y, zoom in duration seconds from now; advance moves the camera. """
+        self.animation = (self.x, self.y, self.zoom, x, y, zoom, now, duration)
+
+    def stop(self):
+        """ End an animation where the camera is now. """
+        self.animation = None
+
+    def target(self):
+        """ Where the camera is heading: the end of the animation, or where it is. """
+        if self.animation != None:
+            return self.animation[3:6]
+        return (self.x, self.y, self.zoom)
+
+    def advance(self, now):
+        """ Move the animation to time now; True while it is still running. """
+        if self.animation == None:
+            return False
+        x0, y0, zoom0, x1, y1, zoom1, start, duration = self.animation
+        t = 1.0 if duration <= 0 else min(max((now - start)/duration, 0.0), 1.0)
+        if t >= 1.0:
+            self.x, self.y, self.zoom = x1, y1, zoom1
+            self.animation = None
+            return False
+        s = t*t*(3 - 2*t)
+        # zoom evenly on a log scale; the offset follows so that the one screen
+        # point that ends up where it started stays put all the way
+        zoom = zoom0*(zoom1/zoom0)**s
+        f = s
+        if abs(zoom1 - zoom0) > 1e-9*zoom0:
+            f = (1/zoom0 - 1/zoom)/(1/zoom0 - 1/zoom1)
+        self.x = x0 + (x1 - x0)*f
+        self.y = y0 + (y1 - y0)*f
+        self.zoom = zoom
+        return True
+
 
 class CenteredCameraGroup(CameraGroup):
     """ Alternative centered camera group.
@@ -67,58 +242,2491 @@ class CenteredCameraGroup(CameraGroup):
     (0, 0) will be the center of the screen, as opposed to the bottom left.
     """
 
-    def set_state(self):
+    def translation(self):
         # Translate almost the same as normal, but add the center offset
         x = -self._window.width // 2 / self.zoom + self.x
         y = -self._window.height // 2 / self.zoom + self.y
+        return (-x * self.zoom, -y * self.zoom)
+
+    def view_rect(self, margin = 0):
+        """ World rectangle (minx, miny, maxx, maxy) currently shown in the window. """
+        return self.rect_at(self.x, self.y, self.zoom, margin)
+
+    def rect_at(self, x, y, zoom, margin = 0):
+        """ World rectangle the window would show with the camera at x, y, zoom. """
+        half_width = self._window.width / 2 / zoom + margin
+        half_height = self._window.height / 2 / zoom + margin
+        return (x - half_width, y - half_height, x + half_width, y + half_height)
+
+class GRID_GROUP(Group):
+    """ Draws the whole background grid from one quad in a fragment shader.
+
+    Line spacing, level colors and thickness are uniforms; only the camera
+    offset, zoom and window size are sent every frame.
+    """
+
+    vertex_source = """#version 150 core
+        in vec2 position;
+
+        uniform vec2 camera;
+        uniform float zoom;
+        uniform vec2 viewport;
+
+        out vec2 world_position;
+
+        void main()
+        {
+            world_position = camera + position * viewport / 2.0 / zoom;
+            gl_Position = vec4(position, 0.0, 1.0);
+        }
+    """
+
+    fragment_source = """#version 150 core
+        in vec2 world_position;
+        out vec4 final_color;
+
+        uniform float zoom;
+        uniform vec2 origin;
+        uniform float spacing;
+        uniform float level_step;
+        uniform float line_width;
+        uniform vec4 zero_color;
+        uniform vec4 primary_color;
+        uniform vec4 middle_color;
+        uniform vec4 secondary_color;
+
+        vec4 level_color(float index)
+        {
+            if (index == 0.0) return zero_color;
+            if (mod(index, level_step) == 0.0) return primary_color;
+            if (mod(index, level_step / 2.0) == 0.0) return middle_color;
+            return secondary_color;
+        }
+
+        void main()
+        {
+            vec2 p = world_position - origin;
+            vec2 index = floor(p / spacing + 0.5);
+            vec2 distance = abs(p - index * spacing) * zoom;
+
+            vec4 color = vec4(0.0);
+            if (distance.x <= line_width / 2.0) color = level_color(index.x);
+            if (distance.y <= line_width / 2.0) {
+                vec4 horizontal = level_color(index.y);
+                if (horizontal.a > color.a) color = horizontal;
+            }
+            if (color.a == 0.0) discard;
+            final_color = color;
+        }
+    """
+
+    def __init__(self, window, camera, order=0, parent=None):
+        super().__init__(order, parent)
+        self._window = window
+        self.camera = camera
+        self.program = pyglet.graphics.shader.ShaderProgram(
+            pyglet.graphics.shader.Shader(self.vertex_source, 'vertex'),
+            pyglet.graphics.shader.Shader(self.fragment_source, 'fragment'))
+        self.__style = None
+        self.__uploaded_style = None
+
+    def set_style(self, spacing, origin, level_step, line_width, zero_color, primary_color, middle_color, secondary_color):
+        """ Store the grid look; it is uploaded on the next draw only if it changed. """
+        self.__style = (spacing, origin, level_step, line_width,
+                        tuple(c/255 for c in zero_color), tuple(c/255 for c in primary_color),
+                        tuple(c/255 for c in middle_color), tuple(c/255 for c in secondary_color))
 
-        view_matrix = self._window.view.translate((-x * self.zoom, -y * self.zoom, 0))
-        view_matrix = view_matrix.scale((self.zoom, self.zoom, 1))
-        self._window.view = view_matrix
+    def set_state(self):
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        self.program.use()
+        if self.__style != self.__uploaded_style:
+            spacing, origin, level_step, line_width, zero, primary, middle, secondary = self.__style
+            self.program['spacing'] = spacing
+            self.program['origin'] = origin
+            self.program['level_step'] = level_step
+            self.program['line_width'] = line_width
+            self.program['zero_color'] = zero
+            self.program['primary_color'] = primary
+            self.program['middle_color'] = middle
+            self.program['secondary_color'] = secondary
+            self.__uploaded_style = self.__style
+        self.program['camera'] = (self.camera.x, self.camera.y)
+        self.program['zoom'] = self.camera.zoom
+        self.program['viewport'] = (self._window.width, self._window.height)
 
     def unset_state(self):
+        self.program.stop()
+        gl.glDisable(gl.GL_BLEND)
 
-        x = -self._window.width // 2 / self.zoom + self.x
-        y = -self._window.height // 2 / self.zoom + self.y
+    def __eq__(self, other):
+        return self is other
 
-        view_matrix = self._window.view.scale((1 / self.zoom, 1 / self.zoom, 1))
-        view_matrix = view_matrix.translate((x * self.zoom, y * self.zoom, 0))
-        self._window.view = view_matrix
+    def __hash__(self):
+        return id(self)
 
-    def set_zoom(self, zoom):
-        self.zoom = zoom
+class TINT_GROUP(Group):
+    """ Draws lines and rectangles once more over the sheet in one color, with one draw call.
 
-    def set_pos(self, x, y):
-        self.x = x
-        self.y = y
+    The tinted components keep their own shapes and colors, so tinting or
+    untinting never touches them or the tiles cached from them.
+    """
+
+    vertex_source = """#version 150 core
+        in vec2 position;
+
+        uniform WindowBlock
+        {
+            mat4 projection;
+            mat4 view;
+        } window;
+
+        void main()
+        {
+            gl_Position = window.projection * window.view * vec4(position, 0.0, 1.0);
+        }
+    """
+
+    fragment_source = """#version 150 core
+        out vec4 final_color;
+
+        uniform vec4 tint;
+
+        void main()
+        {
+            final_color = tint;
+        }
+    """
+
+    def __init__(self, batch, color, order=0, parent=None):
+        super().__init__(order, parent)
+        self.batch = batch
+        self.program = pyglet.graphics.shader.ShaderProgram(
+            pyglet.graphics.shader.Shader(self.vertex_source, 'vertex'),
+            pyglet.graphics.shader.Shader(self.fragment_source, 'fragment'))
+        self.color = color
+        self.__quads = None
+        self.count = 0
+
+    def set_geometry(self, kinds, points, widths):
+        """ Replace what is tinted by COMPONENT_GEOMETRY style rows: kinds, (x1, y1, x2, y2) points and line widths. """
+        kinds = np.asarray(kinds)
+        points = np.asarray(points, dtype = np.float64).reshape(-1, 4)
+        widths = np.asarray(widths, dtype = np.float64)
+        # a line is a quad of its width centered on it, like shapes.Line
+        lines = points[kinds == COMPONENT_GEOMETRY.LINE]
+        direction = lines[:, 2:4] - lines[:, 0:2]
+        length = np.hypot(direction[:, 0], direction[:, 1])
+        scale = np.where(length > 0, widths[kinds == COMPONENT_GEOMETRY.LINE]/2/np.where(length > 0, length, 1), 0)
+        normal = np.stack((-direction[:, 1], direction[:, 0]), axis = 1)*scale[:, None]
+        corners = np.concatenate((lines[:, 0:2] + normal, lines[:, 2:4] + normal,
+                                  lines[:, 2:4] - normal, lines[:, 0:2] - normal), axis = 1)
+        rects = points[kinds == COMPONENT_GEOMETRY.RECT]
+        corners = np.concatenate((corners, rects[:, [0,1, 2,1, 2,3, 0,3]]))
+        # two triangles per quad a b c, a c d
+        position = corners[:, [0,1, 2,3, 4,5, 0,1, 4,5, 6,7]].ravel()
+        if len(corners) != self.count:
+            if self.__quads != None:
+                self.__quads.delete()
+                self.__quads = None
+            self.count = len(corners)
+            if self.count:
+                self.__quads = self.program.vertex_list(self.count*6, gl.GL_TRIANGLES, batch = self.batch, group = self)
+        if self.count:
+            # written through a view of the buffer, pyglet would copy float by float
+            np.ctypeslib.as_array(self.__quads.position)[:] = position
+
+    def set_state(self):
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        self.program.use()
+        self.program['tint'] = tuple(c/255 for c in self.color)
+
+    def unset_state(self):
+        self.program.stop()
+        gl.glDisable(gl.GL_BLEND)
+
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return id(self)
 
 class LIBRARY:
+    """ Part library kept in an indexed SQLite file.
 
-    def __init__(self):
-       self.__json_data = None
-       self.__file_name = 'library.json'
+    Only names and groups are queried when browsing; a part's json is parsed
+    on first use and kept in a small LRU cache. Saving a part rewrites one row.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS parts (
+            name TEXT PRIMARY KEY,
+            part_group TEXT,
+            custom_group TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS parts_group ON parts(part_group);
+        CREATE INDEX IF NOT EXISTS parts_custom_group ON parts(custom_group);
+    """
+
+    def __init__(self, cache_size = 256):
+       self.__file_name = 'library.db'
+       self.__db = None
+       self.__cache = OrderedDict()
+       self.cache_size = cache_size
+       # callbacks(names) after parts were saved or deleted, names is None after an import
+       self.listeners = []
+
+    def __changed(self, names):
+        for listener in self.listeners:
+            listener(names)
 
     def setLibraryFile(self,fileName):
+        self.closeLibrary()
         self.__file_name = fileName
 
     def loadLibrary(self):
-        with open(__file_name, 'r') as handle:
-            self.__json_data = json.load(handle)
+        """ Open (or create) the library file; no parts are read yet. """
+        self.closeLibrary()
+        self.__db = sqlite3.connect(self.__file_name)
+        self.__db.executescript(LIBRARY.SCHEMA)
+
+    def closeLibrary(self):
+        if self.__db != None:
+            self.__db.commit()
+            self.__db.close()
+            self.__db = None
+        self.__cache.clear()
 
     def saveLibrary(self):
-        with open(__file_name, 'w') as f:
-            f.write(json.dumps(self.__json_data, indent=4))
+        if self.__db != None:
+            self.__db.commit()
+
+    def importJson(self, fileName):
+        """ Bulk-load an old style library.json ({'parts': [...]}) into the database. """
+        if self.__db == None:
+            return 0
+        with open(fileName, 'r') as handle:
+            parts = json.load(handle).get('parts', [])
+        with self.__db:
+            self.__db.executemany("INSERT OR REPLACE INTO parts VALUES (?, ?, ?, ?)",
+                                  [self.__row(part) for part in parts])
+        self.__cache.clear()
+        self.__changed(None)
+        return len(parts)
+
+    def __row(self, part):
+        return (part['name'], part.get('group'), part.get('customGroup'), json.dumps(part))
+
+    def getPart(self, name):
+        if name in self.__cache:
+            self.__cache.move_to_end(name)
+            return self.__cache[name]
+        if self.__db == None:
+            return None
+        row = self.__db.execute("SELECT data FROM parts WHERE name = ?", (name,)).fetchone()
+        part = json.loads(row[0]) if row != None else None
+        # misses are cached too, scheme components often reference absent parts
+        self.__cache[name] = part
+        if len(self.__cache) > self.cache_size:
+            self.__cache.popitem(last = False)
+        return part
+
+    def savePart(self, part):
+        """ Add a part or replace the one with the same name. """
+        if self.__db == None:
+            return
+        with self.__db:
+            self.__db.execute("INSERT OR REPLACE INTO parts VALUES (?, ?, ?, ?)", self.__row(part))
+        self.__cache[part['name']] = part
+        self.__cache.move_to_end(part['name'])
+        if len(self.__cache) > self.cache_size:
+            self.__cache.popitem(last = False)
+        self.__changed([part['name']])
+
+    addPart = savePart
+
+    def deletePart(self, name):
+        if self.__db == None:
+            return
+        with self.__db:
+            self.__db.execute("DELETE FROM parts WHERE name = ?", (name,))
+        self.__cache.pop(name, None)
+        self.__changed([name])
+
+    def __where(self, name, group, customGroup):
+        clauses = []
+        arguments = []
+        if name:
+            # prefix match keeps the primary key index usable
+            clauses.append("name >= ? AND name < ?")
+            arguments += [name, name + '\uffff']
+        if group != None:
+            clauses.append("part_group = ?")
+            arguments.append(group)
+        if customGroup != None:
+            clauses.append("custom_group = ?")
+            arguments.append(customGroup)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), arguments
+
+    def findParts(self, name = '', group = None, customGroup = None, offset = 0, limit = 50):
+        """ (name, group, customGroup) rows of one page, ordered by name. """
+        if self.__db == None:
+            return []
+        where, arguments = self.__where(name, group, customGroup)
+        return self.__db.execute("SELECT name, part_group, custom_group FROM parts" + where +
+                                 " ORDER BY name LIMIT ? OFFSET ?", arguments + [limit, offset]).fetchall()
+
+    def countParts(self, name = '', group = None, customGroup = None):
+        if self.__db == None:
+            return 0
+        where, arguments = self.__where(name, group, customGroup)
+        return self.__db.execute("SELECT COUNT(*) FROM parts" + where, arguments).fetchone()[0]
+
+
+class SYMBOL_INSTANCE:
+    """ Handle of one placed copy of a library symbol; quacks like a shape for the scene item. """
+
+    def __init__(self, renderer, symbol, key, color, group):
+        self.renderer = renderer
+        self.symbol = symbol
+        self.key = key
+        self._color = color
+        self._group = group
+        self.visible = True
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        color = tuple(color)
+        if color != self._color:
+            self._color = color
+            self.renderer.set_tint(self.symbol, self.key, color)
+
+    @property
+    def group(self):
+        return self._group
+
+    @group.setter
+    def group(self, group):
+        if group is not self._group:
+            self._group = group
+            self.renderer.move(self.symbol, self.key, group)
+
+    def delete(self):
+        self.renderer.remove(self.symbol, self.key)
+
+
+class SYMBOL_RENDERER:
+    """ Draws all placed copies of each library symbol with instanced draw calls.
+
+    A symbol's triangles are built once from the library part; every copy only
+    adds an offset and a tint to an instance buffer. Copies are bucketed by
+    their culling tile, one draw call per symbol and visible tile.
+
+    A tint's color replaces the symbol's own colors, as setting the color of a
+    shape does, and its alpha fades them. White (NO_TINT) keeps the colors of
+    the part, so fading alone leaves the symbol recognizable.
+    """
+
+    vertex_source = """#version 150 core
+        in vec2 position;
+        in vec4 colors;
+        in vec2 offset;
+        in vec4 tint;
+
+        out vec4 vertex_colors;
+
+        uniform WindowBlock
+        {
+            mat4 projection;
+            mat4 view;
+        } window;
+
+        void main()
+        {
+            gl_Position = window.projection * window.view * vec4(position + offset, 0.0, 1.0);
+            vec3 rgb = all(equal(tint.rgb, vec3(1.0))) ? colors.rgb : tint.rgb;
+            vertex_colors = vec4(rgb, colors.a * tint.a);
+        }
+    """
+
+    fragment_source = """#version 150 core
+        in vec4 vertex_colors;
+        out vec4 final_color;
+
+        void main()
+        {
+            final_color = vertex_colors;
+        }
+    """
+
+    INSTANCE = struct.Struct('<ffBBBB')
+    NO_TINT = (255,255,255,255)
+
+    class SYMBOL:
+        def __init__(self, program, vertices, colors):
+            self.program = program
+            self.count = len(vertices)//2
+            self.geometry = pyglet.graphics.vertexbuffer.BufferObject(max(len(vertices)*4, 4))
+            self.geometry.set_data((gl.GLfloat * len(vertices))(*vertices))
+            self.colors = pyglet.graphics.vertexbuffer.BufferObject(max(len(colors), 4))
+            self.colors.set_data((gl.GLubyte * len(colors))(*colors))
+            # culling tile group -> BUCKET, and key -> the bucket holding that copy
+            self.buckets = {}
+            self.where = {}
+
+        def bucket(self, group):
+            bucket = self.buckets.get(group)
+            if bucket == None:
+                bucket = self.buckets[group] = SYMBOL_RENDERER.BUCKET(self)
+            return bucket
+
+        def delete(self):
+            for bucket in self.buckets.values():
+                bucket.delete()
+            self.buckets = {}
+            self.geometry.delete()
+            self.colors.delete()
+
+    class BUCKET:
+        """ Copies of one symbol under one culling tile, drawn with one instanced call. """
+
+        def __init__(self, symbol):
+            program = symbol.program
+            self.vao = pyglet.graphics.vertexarray.VertexArray()
+            self.vao.bind()
+            symbol.geometry.bind()
+            SYMBOL_RENDERER.attribute(program, 'position', 2, gl.GL_FLOAT, False, 0, 0)
+            symbol.colors.bind()
+            SYMBOL_RENDERER.attribute(program, 'colors', 4, gl.GL_UNSIGNED_BYTE, True, 0, 0)
+
+            self.capacity = 64
+            size = SYMBOL_RENDERER.INSTANCE.size
+            self.instances = pyglet.graphics.vertexbuffer.BufferObject(self.capacity*size)
+            SYMBOL_RENDERER.attribute(program, 'offset', 2, gl.GL_FLOAT, False, size, 0, divisor = 1)
+            SYMBOL_RENDERER.attribute(program, 'tint', 4, gl.GL_UNSIGNED_BYTE, True, size, 8, divisor = 1)
+            self.vao.unbind()
+
+            self.keys = []
+            self.slots = {}
+            self.data = bytearray()
+            # byte range of self.data that differs from the gpu copy
+            self.dirty = None
+
+        def touch(self, start, end):
+            if self.dirty == None:
+                self.dirty = (start, end)
+            else:
+                self.dirty = (min(self.dirty[0], start), max(self.dirty[1], end))
+
+        def add(self, key, x, y, tint):
+            size = SYMBOL_RENDERER.INSTANCE.size
+            index = self.slots[key] = len(self.keys)
+            self.keys.append(key)
+            self.data += SYMBOL_RENDERER.INSTANCE.pack(x, y, *tint)
+            self.touch(index*size, (index+1)*size)
+
+        def move(self, key, x, y):
+            offset = self.slots[key]*SYMBOL_RENDERER.INSTANCE.size
+            if struct.unpack_from('<ff', self.data, offset) != (x, y):
+                struct.pack_into('<ff', self.data, offset, x, y)
+                self.touch(offset, offset+8)
+
+        def tint(self, key):
+            offset = self.slots[key]*SYMBOL_RENDERER.INSTANCE.size + 8
+            return tuple(self.data[offset:offset+4])
+
+        def set_tint(self, key, color):
+            offset = self.slots[key]*SYMBOL_RENDERER.INSTANCE.size + 8
+            self.data[offset:offset+4] = bytes(color)
+            self.touch(offset, offset+4)
+
+        def remove(self, key):
+            """ Drop a copy; returns its (x, y, tint). """
+            size = SYMBOL_RENDERER.INSTANCE.size
+            index = self.slots.pop(key)
+            x, y, *tint = SYMBOL_RENDERER.INSTANCE.unpack_from(self.data, index*size)
+            last = len(self.keys) - 1
+            if index != last:
+                # the last copy takes the freed slot
+                moved = self.keys[last]
+                self.keys[index] = moved
+                self.slots[moved] = index
+                self.data[index*size:(index+1)*size] = self.data[last*size:(last+1)*size]
+                self.touch(index*size, (index+1)*size)
+            self.keys.pop()
+            del self.data[last*size:]
+            return x, y, tint
+
+        def upload(self):
+            if self.dirty == None:
+                return
+            if len(self.data) > self.capacity*SYMBOL_RENDERER.INSTANCE.size:
+                while len(self.data) > self.capacity*SYMBOL_RENDERER.INSTANCE.size:
+                    self.capacity *= 2
+                self.instances.resize(self.capacity*SYMBOL_RENDERER.INSTANCE.size)
+                self.dirty = (0, len(self.data))
+            start, end = self.dirty[0], min(self.dirty[1], len(self.data))
+            if end > start:
+                chunk = (gl.GLubyte * (end-start)).from_buffer_copy(self.data[start:end])
+                self.instances.set_data_region(chunk, start, end-start)
+            self.dirty = None
+
+        def delete(self):
+            self.instances.delete()
+            self.vao.delete()
+
+    @staticmethod
+    def attribute(program, name, count, gl_type, normalize, stride, offset, divisor = 0):
+        location = program.attributes[name]['location']
+        gl.glEnableVertexAttribArray(location)
+        gl.glVertexAttribPointer(location, count, gl_type, normalize, stride, offset)
+        if divisor:
+            gl.glVertexAttribDivisor(location, divisor)
+
+    def __init__(self, magnifier):
+        self.magnifier = magnifier
+        self.program = pyglet.graphics.shader.ShaderProgram(
+            pyglet.graphics.shader.Shader(self.vertex_source, 'vertex'),
+            pyglet.graphics.shader.Shader(self.fragment_source, 'fragment'))
+        self.symbols = {}
+
+    def triangles(self, part_shapes):
+        """ Triangles and vertex colors of a part's lines and rectangles in magnified units. """
+        vertices = []
+        colors = []
+        m = self.magnifier
+        for shape in part_shapes:
+            if shape['type'] == "line":
+                x1, y1, x2, y2 = shape['x1']*m, shape['y1']*m, shape['x2']*m, shape['y2']*m
+                length = math.hypot(x2-x1, y2-y1) or 1
+                nx = -(y2-y1)/length*shape['width']*m/2
+                ny = (x2-x1)/length*shape['width']*m/2
+                quad = ((x1+nx, y1+ny), (x1-nx, y1-ny), (x2-nx, y2-ny), (x2+nx, y2+ny))
+            elif shape['type'] == "rectangle":
+                x1, y1, x2, y2 = shape['x1']*m, shape['y1']*m, shape['x2']*m, shape['y2']*m
+                quad = ((x1, y1), (x2, y1), (x2, y2), (x1, y2))
+            else:
+                continue
+            for index in (0, 1, 2, 0, 2, 3):
+                vertices.extend(quad[index])
+                colors.extend(shape['color'])
+        return vertices, colors
+
+    def place(self, name, part_shapes, key, x, y, group = None):
+        """ Put (or move) the copy identified by key under a culling tile; the symbol is built on first use. """
+        symbol = self.symbols.get(name)
+        if symbol == None:
+            symbol = self.symbols[name] = SYMBOL_RENDERER.SYMBOL(self.program, *self.triangles(part_shapes))
+        bucket = symbol.bucket(group)
+        old = symbol.where.get(key)
+        if old is bucket:
+            bucket.move(key, x, y)
+        else:
+            tint = old.remove(key)[2] if old != None else SYMBOL_RENDERER.NO_TINT
+            bucket.add(key, x, y, tint)
+            symbol.where[key] = bucket
+        return SYMBOL_INSTANCE(self, symbol, key, bucket.tint(key), group)
+
+    def move(self, symbol, key, group):
+        """ Hand a copy over to the bucket of another culling tile. """
+        old = symbol.where.get(key)
+        if old != None:
+            bucket = symbol.bucket(group)
+            if bucket is not old:
+                x, y, tint = old.remove(key)
+                bucket.add(key, x, y, tint)
+                symbol.where[key] = bucket
+
+    def set_tint(self, symbol, key, color):
+        bucket = symbol.where.get(key)
+        if bucket != None:
+            bucket.set_tint(key, color)
+
+    def remove(self, symbol, key):
+        bucket = symbol.where.pop(key, None)
+        if bucket != None:
+            bucket.remove(key)
+
+    def count(self):
+        return sum(len(symbol.where) for symbol in self.symbols.values())
+
+    def forget(self, name):
+        """ Drop a symbol whose library part changed; its copies are re-placed on the next sync. """
+        symbol = self.symbols.pop(name, None)
+        if symbol != None:
+            symbol.delete()
+
+    def draw(self):
+        """ Draw the copies in visible culling tiles. """
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        self.program.use()
+        for symbol in self.symbols.values():
+            for group, bucket in symbol.buckets.items():
+                if len(bucket.keys) == 0 or group != None and not group.visible:
+                    continue
+                bucket.upload()
+                bucket.vao.bind()
+                gl.glDrawArraysInstanced(gl.GL_TRIANGLES, 0, symbol.count, len(bucket.keys))
+                bucket.vao.unbind()
+        self.program.stop()
+        gl.glDisable(gl.GL_BLEND)
+
+
+class BOUNDS_SET:
+    """ Union of member boxes, recomputed only after a member on its edge changed or left. """
+
+    def __init__(self):
+        self.members = {}
+        self.__union = None
+        self.__stale = False
+
+    def __on_edge(self, bounds):
+        union = self.__union
+        return union != None and (bounds[0] <= union[0] or bounds[1] <= union[1] or
+                                  bounds[2] >= union[2] or bounds[3] >= union[3])
+
+    def set(self, key, bounds):
+        old = self.members.get(key)
+        self.members[key] = bounds
+        if old != None and self.__on_edge(old):
+            self.__stale = True
+        elif not self.__stale:
+            union = self.__union
+            if union == None:
+                self.__union = bounds
+            else:
+                self.__union = (min(union[0], bounds[0]), min(union[1], bounds[1]),
+                                max(union[2], bounds[2]), max(union[3], bounds[3]))
+
+    def remove(self, key):
+        old = self.members.pop(key, None)
+        if old != None and self.__on_edge(old):
+            self.__stale = True
+
+    def bounds(self):
+        if self.__stale:
+            self.__stale = False
+            self.__union = None
+            if self.members:
+                boxes = self.members.values()
+                self.__union = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                                max(b[2] for b in boxes), max(b[3] for b in boxes))
+        return self.__union
+
+    def __len__(self):
+        return len(self.members)
+
+
+class BOUNDS_TREE:
+    """ Component boxes combined per tile, and tiles combined into the sheet extent.
+
+    An edit only marks its tile; the sheet is recombined from the changed tiles
+    on the next read, so an unchanged tree answers in O(1).
+    """
+
+    def __init__(self, tile_size = 1000.0):
+        self.tile_size = tile_size
+        self.tiles = {}
+        self.sheet = BOUNDS_SET()
+        self.__tile_of = {}
+        self.__changed = set()
+
+    def set(self, key, bounds):
+        tile = (int(math.floor((bounds[0]+bounds[2])/2/self.tile_size)),
+                int(math.floor((bounds[1]+bounds[3])/2/self.tile_size)))
+        if self.__tile_of.get(key, tile) != tile:
+            self.remove(key)
+        members = self.tiles.get(tile)
+        if members == None:
+            members = self.tiles[tile] = BOUNDS_SET()
+        members.set(key, bounds)
+        self.__tile_of[key] = tile
+        self.__changed.add(tile)
+
+    def remove(self, key):
+        tile = self.__tile_of.pop(key, None)
+        if tile != None:
+            self.tiles[tile].remove(key)
+            self.__changed.add(tile)
+
+    def clear(self):
+        self.tiles = {}
+        self.sheet = BOUNDS_SET()
+        self.__tile_of = {}
+        self.__changed = set()
+
+    def bounds(self):
+        for tile in self.__changed:
+            members = self.tiles.get(tile)
+            if members != None and len(members):
+                self.sheet.set(tile, members.bounds())
+            else:
+                self.tiles.pop(tile, None)
+                self.sheet.remove(tile)
+        self.__changed.clear()
+        return self.sheet.bounds()
+
+
+class SPATIAL_INDEX:
+    """ Uniform grid of component bounding boxes for hover hit-testing. """
+
+    def __init__(self, cell_size = 100.0):
+        self.cell_size = cell_size
+        self.__cells = {}
+        self.__items = {}
+        # every box inserted here, combined for zoom-to-fit
+        self.extent = BOUNDS_TREE(cell_size*16)
+
+    def __cell_range(self, minx, miny, maxx, maxy):
+        cs = self.cell_size
+        return (int(math.floor(minx/cs)), int(math.floor(miny/cs)),
+                int(math.floor(maxx/cs)), int(math.floor(maxy/cs)))
+
+    def insert(self, key, item, bounds):
+        self.remove(key)
+        cx1, cy1, cx2, cy2 = self.__cell_range(*bounds)
+        cells = []
+        for cx in range(cx1, cx2+1):
+            for cy in range(cy1, cy2+1):
+                self.__cells.setdefault((cx,cy), {})[key] = item
+                cells.append((cx,cy))
+        self.__items[key] = (item, bounds, cells)
+        self.extent.set(key, bounds)
+
+    def remove(self, key):
+        entry = self.__items.pop(key, None)
+        if entry == None:
+            return
+        self.extent.remove(key)
+        for cell in entry[2]:
+            bucket = self.__cells[cell]
+            del bucket[key]
+            if len(bucket) == 0:
+                del self.__cells[cell]
+
+    def clear(self):
+        self.__cells = {}
+        self.__items = {}
+        self.extent.clear()
+
+    def bounds(self, key):
+        entry = self.__items.get(key)
+        return entry[1] if entry != None else None
+
+    def items(self):
+        """ (key, item) of everything indexed. """
+        return [(key, entry[0]) for key, entry in self.__items.items()]
+
+    def world_bounds(self):
+        """ Box around everything in the index, or None when it is empty. """
+        return self.extent.bounds()
+
+    def query_point(self, x, y, tolerance = 0):
+        """ Items whose bounds, grown by tolerance, contain the point. """
+        cx1, cy1, cx2, cy2 = self.__cell_range(x-tolerance, y-tolerance, x+tolerance, y+tolerance)
+        found = {}
+        for cx in range(cx1, cx2+1):
+            for cy in range(cy1, cy2+1):
+                bucket = self.__cells.get((cx,cy))
+                if bucket == None:
+                    continue
+                for key in bucket:
+                    item, (minx, miny, maxx, maxy), cells = self.__items[key]
+                    if  x >= minx - tolerance and x <= maxx + tolerance and\
+                        y >= miny - tolerance and y <= maxy + tolerance:
+                            found[key] = item
+        return list(found.values())
+
+    def query_rect(self, minx, miny, maxx, maxy):
+        """ Items whose bounds intersect the rectangle. """
+        cx1, cy1, cx2, cy2 = self.__cell_range(minx, miny, maxx, maxy)
+        seen = {}
+        if (cx2-cx1+1)*(cy2-cy1+1) > len(self.__cells):
+            buckets = [bucket for (cx,cy), bucket in self.__cells.items()
+                       if cx1 <= cx <= cx2 and cy1 <= cy <= cy2]
+        else:
+            buckets = [self.__cells[(cx,cy)] for cx in range(cx1, cx2+1) for cy in range(cy1, cy2+1)
+                       if (cx,cy) in self.__cells]
+        for bucket in buckets:
+            for key in bucket:
+                if key in seen:
+                    continue
+                item, (bminx, bminy, bmaxx, bmaxy), cells = self.__items[key]
+                if bmaxx >= minx and bminx <= maxx and bmaxy >= miny and bminy <= maxy:
+                    seen[key] = item
+        return list(seen.values())
+
+    def __len__(self):
+        return len(self.__items)
+
+
+class NETLIST:
+    """ Which line ends and pins touch, kept per component with an explicit net id per node.
+
+    Ends are hashed by their sheet coordinates. Adding a component merges the
+    nets its nodes touch, smaller into larger. Removing one can only split a net
+    where the component held it together at two or more points, so only then
+    is it searched, from those points, until the pieces meet or one runs out.
+    A node is (component key, 'shape' or 'pin', index).
+    """
+
+    def __init__(self):
+        # bumped on every change, for views of a net to catch up
+        self.version = 0
+        self.clear()
+
+    def clear(self):
+        # node -> id of its net
+        self.net_of = {}
+        # net id -> every node of the net
+        self.members = {}
+        # sheet point -> nodes with an end there
+        self.at = {}
+        self.ends = {}
+        # line node -> its width, for drawing a net
+        self.widths = {}
+        # key -> (component, node points, library part)
+        self.components = {}
+        self.__next_net = 0
+        self.version += 1
+
+    def __new_net(self, nodes):
+        net = self.__next_net
+        self.__next_net += 1
+        self.members[net] = nodes
+        for node in nodes:
+            self.net_of[node] = net
+        return net
+
+    @staticmethod
+    def point(x, y):
+        return (round(x, 6), round(y, 6))
+
+    @staticmethod
+    def node_points(component, part = None):
+        """ (kind, index, ends) of every line and pin of the component, in sheet units.
+
+        A library reference is connected by the lines and pins of its part.
+        """
+        x0 = component['x']
+        y0 = component['y']
+        source = part if part != None else component
+        points = []
+        for index, shape in enumerate(source.get('shapes', [])):
+            if shape.get('type') == 'line':
+                points.append(('shape', index, (NETLIST.point(x0+shape['x1'], y0+shape['y1']),
+                                                NETLIST.point(x0+shape['x2'], y0+shape['y2']))))
+        for index, pin in enumerate(source.get('pins', [])):
+            points.append(('pin', index, (NETLIST.point(x0+pin['x'], y0+pin['y']),)))
+        return points
+
+    def find(self, node):
+        return self.net_of[node]
+
+    def union(self, a, b):
+        a = self.net_of[a]
+        b = self.net_of[b]
+        if a == b:
+            return a
+        if len(self.members[a]) < len(self.members[b]):
+            a, b = b, a
+        moved = self.members.pop(b)
+        for node in moved:
+            self.net_of[node] = a
+        self.members[a] |= moved
+        return a
+
+    def link(self, node):
+        """ Union node with whatever ends where it ends. """
+        for end in self.ends[node]:
+            others = self.at.setdefault(end, set())
+            # everything at one point is on one net already
+            if others:
+                self.union(node, next(iter(others)))
+            others.add(node)
+
+    def update(self, key, component, part = None):
+        """ Sync the nodes of a component with its json; the nets are only touched if an end moved. """
+        points = NETLIST.node_points(component, part)
+        entry = self.components.get(key)
+        moved = entry == None or entry[1] != points
+        if moved and entry != None:
+            self.remove(key)
+        self.components[key] = (component, points, part)
+        shapes = (part if part != None else component).get('shapes', [])
+        changed = moved
+        for kind, index, ends in points:
+            node = (key, kind, index)
+            if moved:
+                self.ends[node] = ends
+                self.__new_net({node})
+                self.link(node)
+            if kind == 'shape' and self.widths.get(node) != shapes[index].get('width', 0):
+                self.widths[node] = shapes[index].get('width', 0)
+                changed = True
+        if changed:
+            self.version += 1
+
+    def remove(self, key):
+        entry = self.components.pop(key, None)
+        if entry == None:
+            return
+        nets = set()
+        for kind, index, ends in entry[1]:
+            node = (key, kind, index)
+            net = self.net_of.pop(node)
+            nets.add(net)
+            self.members[net].discard(node)
+            self.widths.pop(node, None)
+            for end in self.ends.pop(node):
+                self.at[end].discard(node)
+        # what is left at each freed point is connected through that point
+        seeds = {net: {} for net in nets}
+        for kind, index, ends in entry[1]:
+            for end in ends:
+                others = self.at.get(end)
+                if others:
+                    other = next(iter(others))
+                    seeds[self.net_of[other]][end] = other
+                elif others != None:
+                    del self.at[end]
+        for net in nets:
+            if not self.members[net]:
+                del self.members[net]
+            elif len(seeds[net]) > 1:
+                self.__split(net, list(seeds[net].values()))
+        self.version += 1
+
+    def __split(self, net, seeds):
+        """ Search from every seed at once; a search that runs out before meeting the others is a net of its own. """
+        owner = {}
+        merged = list(range(len(seeds)))
+        visited = []
+        stacks = []
+        for search, seed in enumerate(seeds):
+            if seed in owner:
+                merged[search] = owner[seed]
+                visited.append(set())
+                stacks.append([])
+            else:
+                owner[seed] = search
+                visited.append({seed})
+                stacks.append([seed])
+
+        def top(search):
+            while merged[search] != search:
+                search = merged[search]
+            return search
+
+        running = [search for search in range(len(seeds)) if merged[search] == search]
+        while len(running) > 1:
+            for search in list(running):
+                if merged[search] != search:
+                    continue
+                stack = stacks[search]
+                if not stack:
+                    # everything it reaches: split off, unless it is the last piece left
+                    running.remove(search)
+                    self.members[net] -= visited[search]
+                    self.__new_net(visited[search])
+                    if len(running) == 1:
+                        break
+                    continue
+                for end in self.ends[stack.pop()]:
+                    for other in self.at[end]:
+                        found = owner.get(other)
+                        if found == None:
+                            owner[other] = search
+                            visited[search].add(other)
+                            stack.append(other)
+                            continue
+                        found = top(found)
+                        if found != search:
+                            # met another search: they are one piece
+                            merged[found] = search
+                            running.remove(found)
+                            visited[search] |= visited[found]
+                            stack += stacks[found]
+                            visited[found] = None
+                            stacks[found] = None
+
+    def net(self, node):
+        return self.members[self.find(node)]
+
+    def component_nets(self, key):
+        """ Ids of the nets the component is on. """
+        entry = self.components.get(key)
+        if entry == None:
+            return set()
+        return {self.find((key, kind, index)) for kind, index, ends in entry[1]}
+
+    def export(self):
+        """ Nets that connect pins, as {'nets': [{'name', 'pins': [[component, pin]...], 'segments'}]}. """
+        nets = []
+        for members in self.members.values():
+            pins = []
+            segments = 0
+            for key, kind, index in members:
+                if kind == 'pin':
+                    component, points, part = self.components[key]
+                    pin = (part if part != None else component)['pins'][index]
+                    pins.append([component.get('name', ''), str(pin.get('name', index+1))])
+                else:
+                    segments += 1
+            if pins:
+                nets.append((sorted(pins), segments))
+        nets.sort()
+        return {'nets': [{'name': 'N%d' % (n+1), 'pins': pins, 'segments': segments}
+                         for n, (pins, segments) in enumerate(nets)]}
+
+
+class CULL_TILE_GROUP(Group):
+    """ Parent group of all components anchored in one tile; hidden when off screen. """
+
+    def __init__(self, tile, parent=None):
+        super().__init__(0, parent)
+        self.tile = tile
+        self.extent = BOUNDS_SET()
+
+    @property
+    def bounds(self):
+        return self.extent.bounds()
+
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return id(self)
+
+
+class TILE_GRID:
+    """ Splits the sheet into square tiles and toggles their groups with the view. """
+
+    def __init__(self, parent, tile_size = 500.0):
+        self.parent = parent
+        self.tile_size = tile_size
+        self.tiles = {}
+        self.visible_tiles = set()
+        self.__group_of = {}
+        # how far (in tiles) any member reaches outside its own tile
+        self.overhang = 0
+
+    def tile_of(self, x, y):
+        return (int(math.floor(x/self.tile_size)), int(math.floor(y/self.tile_size)))
+
+    def group(self, x, y):
+        tile = self.tile_of(x, y)
+        group = self.tiles.get(tile)
+        if group == None:
+            group = self.tiles[tile] = CULL_TILE_GROUP(tile, self.parent)
+            self.visible_tiles.add(tile)
+        return group
+
+    def place(self, key, group, bounds):
+        """ Record the bounds of member key under group, leaving its previous tile. """
+        previous = self.__group_of.get(key)
+        if previous != None and previous is not group:
+            previous.extent.remove(key)
+        group.extent.set(key, bounds)
+        self.__group_of[key] = group
+        tx, ty = group.tile
+        ts = self.tile_size
+        reach = max(tx*ts - bounds[0], ty*ts - bounds[1], bounds[2] - (tx+1)*ts, bounds[3] - (ty+1)*ts)
+        if reach > self.overhang*ts:
+            self.overhang = int(math.ceil(reach/ts))
+
+    def release(self, key):
+        group = self.__group_of.pop(key, None)
+        if group != None:
+            group.extent.remove(key)
+
+    def clear(self):
+        self.tiles = {}
+        self.visible_tiles = set()
+        self.__group_of = {}
+        self.overhang = 0
+
+    def update(self, minx, miny, maxx, maxy):
+        """ Show the tiles touching the view rectangle and hide the ones that left it. """
+        tx1, ty1 = self.tile_of(minx, miny)
+        tx2, ty2 = self.tile_of(maxx, maxy)
+        tx1 -= self.overhang
+        ty1 -= self.overhang
+        tx2 += self.overhang
+        ty2 += self.overhang
+
+        visible = set()
+        if (tx2-tx1+1)*(ty2-ty1+1) > len(self.tiles):
+            candidates = [(tile, group) for tile, group in self.tiles.items()
+                          if tx1 <= tile[0] <= tx2 and ty1 <= tile[1] <= ty2]
+        else:
+            candidates = [((tx,ty), self.tiles[(tx,ty)]) for tx in range(tx1, tx2+1) for ty in range(ty1, ty2+1)
+                          if (tx,ty) in self.tiles]
+        for tile, group in candidates:
+            b = group.bounds
+            if b == None:
+                # nothing left in this tile
+                continue
+            if b[2] >= minx and b[0] <= maxx and b[3] >= miny and b[1] <= maxy:
+                visible.add(tile)
+
+        for tile in self.visible_tiles - visible:
+            if tile in self.tiles:
+                self.tiles[tile].visible = False
+        for tile in visible - self.visible_tiles:
+            self.tiles[tile].visible = True
+        self.visible_tiles = visible
+
+
+class TILE_CACHE:
+    """ Sheet content rendered into textures per zoom level and tile, composited while panning.
+
+    A level renders at zoom 2**level, the first power of two at or above the
+    camera zoom, so cached tiles are only ever scaled down. Edits drop just the
+    tiles their bounds touch; past max_tiles the least recently shown go first.
+    """
+
+    def __init__(self, window, camera, tile_px = 256, max_tiles = 256, budget = 4):
+        self.window = window
+        self.camera = camera
+        self.tile_px = tile_px
+        self.max_tiles = max_tiles
+        # tiles rendered per frame; the rest of the view is drawn live meanwhile
+        self.budget = budget
+        self.enabled = True
+        self.tiles = OrderedDict()
+        self.levels = {}
+        self.shown = set()
+        self.free = []
+        self.rendered = 0
+        self.batch = pyglet.graphics.Batch()
+        self.framebuffer = None
+
+    @staticmethod
+    def level(zoom):
+        return int(math.ceil(math.log2(zoom)))
+
+    def tile_size(self, level):
+        """ World size of a tile at level. """
+        return self.tile_px / 2.0**level
+
+    def tile_range(self, level, minx, miny, maxx, maxy):
+        size = self.tile_size(level)
+        return (int(math.floor(minx/size)), int(math.floor(miny/size)),
+                int(math.floor(maxx/size)), int(math.floor(maxy/size)))
+
+    def invalidate(self, bounds):
+        """ Drop the cached tiles that touch bounds. """
+        if bounds == None or bounds[0] > bounds[2]:
+            return
+        for level, keys in list(self.levels.items()):
+            tx1, ty1, tx2, ty2 = self.tile_range(level, *bounds)
+            if (tx2-tx1+1)*(ty2-ty1+1) < len(keys):
+                doomed = [(level, tx, ty) for tx in range(tx1, tx2+1) for ty in range(ty1, ty2+1)
+                          if (level, tx, ty) in keys]
+            else:
+                doomed = [key for key in keys if tx1 <= key[1] <= tx2 and ty1 <= key[2] <= ty2]
+            for key in doomed:
+                self.drop(key)
+
+    def clear(self):
+        for key in list(self.tiles):
+            self.drop(key)
+
+    def drop(self, key):
+        texture, sprite = self.tiles.pop(key)
+        keys = self.levels[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.levels[key[0]]
+        self.shown.discard(key)
+        sprite.delete()
+        self.free.append(texture)
+
+    def render(self, key, draw):
+        """ Render tile key: draw(rect) draws the sheet for the world rect with the camera set for the tile. """
+        level, tx, ty = key
+        size = self.tile_size(level)
+        zoom = 2.0**level
+        if self.free:
+            texture = self.free.pop()
+        else:
+            texture = pyglet.image.Texture.create(self.tile_px, self.tile_px)
+            # neighbours are separate textures: filtering must not wrap around the edge
+            gl.glBindTexture(texture.target, texture.id)
+            gl.glTexParameteri(texture.target, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+            gl.glTexParameteri(texture.target, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+        if self.framebuffer == None:
+            self.framebuffer = pyglet.image.Framebuffer()
+        self.framebuffer.attach_texture(texture)
+
+        window = self.window
+        camera = self.camera
+        saved = (window.projection, window.view, camera.x, camera.y, camera.zoom)
+        clear_color = (gl.GLfloat*4)()
+        gl.glGetFloatv(gl.GL_COLOR_CLEAR_VALUE, clear_color)
+        self.framebuffer.bind()
+        gl.glViewport(0, 0, self.tile_px, self.tile_px)
+        gl.glClearColor(0, 0, 0, 0)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        # the groups reset glBlendFunc, which squares alpha when drawing over transparent black;
+        # the equation is left alone, so coverage is kept as the largest alpha drawn instead
+        gl.glBlendEquationSeparate(gl.GL_FUNC_ADD, gl.GL_MAX)
+        try:
+            window.projection = Mat4.orthogonal_projection(0, self.tile_px, 0, self.tile_px, -255, 255)
+            camera.x, camera.y, camera.zoom = (tx+0.5)*size, (ty+0.5)*size, zoom
+            # base view that turns the camera transform into tile center -> texture center
+            cx, cy = camera.translation()
+            half = self.tile_px/2
+            window.view = Mat4.from_translation(Vec3(half - camera.x*zoom - cx, half - camera.y*zoom - cy, 0))
+            draw((tx*size, ty*size, (tx+1)*size, (ty+1)*size))
+        finally:
+            gl.glBlendEquation(gl.GL_FUNC_ADD)
+            self.framebuffer.unbind()
+            window.projection, window.view, camera.x, camera.y, camera.zoom = saved
+            gl.glViewport(0, 0, *window.get_framebuffer_size())
+            gl.glClearColor(*clear_color)
+
+        # the texture holds premultiplied color over transparent black
+        sprite = pyglet.sprite.Sprite(texture, tx*size, ty*size, blend_src = gl.GL_ONE,
+                                      blend_dest = gl.GL_ONE_MINUS_SRC_ALPHA, batch = self.batch)
+        sprite.scale = 1/zoom
+        sprite.visible = False
+        self.tiles[key] = (texture, sprite)
+        self.levels.setdefault(level, set()).add(key)
+
+    def draw(self, draw):
+        """ Composite the view from cached tiles, rendering at most budget missing ones.
+
+        Returns False if tiles are still missing; the caller then draws live and asks
+        for another frame.
+        """
+        level = TILE_CACHE.level(self.camera.zoom)
+        tx1, ty1, tx2, ty2 = self.tile_range(level, *self.camera.view_rect())
+        view = [(level, tx, ty) for tx in range(tx1, tx2+1) for ty in range(ty1, ty2+1)]
+        missing = [key for key in view if key not in self.tiles]
+        self.rendered = min(len(missing), self.budget)
+        for key in missing[:self.budget]:
+            self.render(key, draw)
+
+        for key in view:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+        while len(self.tiles) > max(self.max_tiles, len(view)):
+            self.drop(next(iter(self.tiles)))
+
+        if len(missing) > self.budget:
+            return False
+        view = set(view)
+        for key in self.shown - view:
+            self.tiles[key][1].visible = False
+        for key in view - self.shown:
+            self.tiles[key][1].visible = True
+        self.shown = view
+        self.camera.set_state()
+        self.batch.draw()
+        self.camera.unset_state()
+        return True
+
+
+class LABEL_CACHE:
+    """ LRU cache of glyph layouts shared by every label with the same text, font and size.
+
+    The first time a font/size is used the whole schematic character set is
+    rendered into its glyph atlas, so later strings only look glyphs up.
+    """
+
+    CHARSET = ('0123456789.,:;+-*/=()[]<>%#_ '
+               'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+               'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯабвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+               'µΩ±°')
+
+    def __init__(self, capacity = 4096):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.__layouts = OrderedDict()
+        self.__fonts = {}
+
+    def font(self, font_name, font_size):
+        key = (font_name, font_size)
+        font = self.__fonts.get(key)
+        if font == None:
+            font = pyglet.font.load(font_name, font_size, bold="semibold", dpi=96)
+            font.get_glyphs(LABEL_CACHE.CHARSET)
+            self.__fonts[key] = font
+        return font
+
+    def layout(self, text, font_name, font_size):
+        """ Glyph runs for text at the origin: (texture, vertices, tex_coords, glyph count, indices). """
+        key = (text, font_name, font_size)
+        runs = self.__layouts.get(key)
+        if runs != None:
+            self.hits += 1
+            self.__layouts.move_to_end(key)
+            return runs
+
+        self.misses += 1
+        by_texture = OrderedDict()
+        x = 0
+        for glyph in self.font(font_name, font_size).get_glyphs(text):
+            vertices, tex_coords = by_texture.setdefault(glyph.owner, ([], []))
+            v0, v1, v2, v3 = glyph.vertices
+            vertices.extend((v0+x, v1, 0, v2+x, v1, 0, v2+x, v3, 0, v0+x, v3, 0))
+            tex_coords.extend(glyph.tex_coords)
+            x += glyph.advance
+
+        runs = []
+        for texture, (vertices, tex_coords) in by_texture.items():
+            count = len(vertices)//12
+            indices = tuple(i + g*4 for g in range(count) for i in (0, 1, 2, 0, 2, 3))
+            runs.append((texture, tuple(vertices), tuple(tex_coords), count, indices))
+        runs = tuple(runs)
+
+        self.__layouts[key] = runs
+        if len(self.__layouts) > self.capacity:
+            self.__layouts.popitem(last = False)
+        return runs
+
+    def fonts(self):
+        """ [font_name, font_size] of every font rendered so far. """
+        return sorted([name, size] for name, size in self.__fonts)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        return 'label cache: %d hits, %d misses, hit rate %.1f%%, %d layouts' % (
+            self.hits, self.misses, self.hit_rate()*100, len(self.__layouts))
+
+
+class GLYPH_LABEL:
+    """ Label drawn straight from a cached glyph layout, without a pyglet text layout.
+
+    Hiding collapses the glyph quads in place, like pyglet shapes do, so the
+    vertex lists are only rebuilt when the text itself changes.
+    """
+
+    def __init__(self, cache, text, font_name, font_size, x, y, color, batch, group):
+        self.cache = cache
+        self.text = text
+        self.font_name = font_name
+        self.font_size = font_size
+        self.x = x
+        self.y = y
+        self._color = tuple(color)
+        self.batch = batch
+        self._group = group
+        self._visible = True
+        self.__lists = []
+        self.__build()
+
+    def __release(self):
+        for vertex_list, vertices, texture in self.__lists:
+            vertex_list.delete()
+        self.__lists = []
+
+    def __positions(self, vertices):
+        if not self._visible:
+            return (0,)*len(vertices)
+        x, y = self.x, self.y
+        return [v + (x, y, 0)[i % 3] for i, v in enumerate(vertices)]
+
+    def __text_group(self, texture):
+        program = pyglet.text.layout.get_default_layout_shader()
+        return pyglet.text.layout.TextLayoutGroup(texture, program, order=1, parent=self._group)
+
+    def __build(self):
+        self.__release()
+        program = pyglet.text.layout.get_default_layout_shader()
+        for texture, vertices, tex_coords, count, indices in self.cache.layout(self.text, self.font_name, self.font_size):
+            vertex_list = program.vertex_list_indexed(count*4, gl.GL_TRIANGLES, indices, self.batch,
+                                                      self.__text_group(texture),
+                                                      position=('f', self.__positions(vertices)),
+                                                      colors=('Bn', self._color*(count*4)),
+                                                      tex_coords=('f', tex_coords),
+                                                      rotation=('f', (0,)*(count*4)),
+                                                      anchor=('f', (0,0)*(count*4)))
+            self.__lists.append((vertex_list, vertices, texture))
+
+    def __place(self):
+        for vertex_list, vertices, texture in self.__lists:
+            vertex_list.position[:] = self.__positions(vertices)
+
+    def update(self, text, font_name, font_size, x, y):
+        if (text, font_name, font_size) != (self.text, self.font_name, self.font_size):
+            self.text, self.font_name, self.font_size, self.x, self.y = text, font_name, font_size, x, y
+            self.__build()
+        elif (x, y) != (self.x, self.y):
+            self.x, self.y = x, y
+            if self._visible:
+                self.__place()
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        self._color = tuple(color)
+        for vertex_list, vertices, texture in self.__lists:
+            vertex_list.colors[:] = self._color*(len(vertex_list.colors)//4)
+
+    @property
+    def visible(self):
+        return self._visible
+
+    @visible.setter
+    def visible(self, visible):
+        if visible != self._visible:
+            self._visible = visible
+            self.__place()
+
+    @property
+    def group(self):
+        return self._group
+
+    @group.setter
+    def group(self, group):
+        if group is self._group:
+            return
+        self._group = group
+        for vertex_list, vertices, texture in self.__lists:
+            self.batch.migrate(vertex_list, gl.GL_TRIANGLES, self.__text_group(texture), self.batch)
+
+    def delete(self):
+        self.__release()
+
+
+class LOD_LABEL:
+    """ One component label drawn as text, as a plain bar or not at all, by zoom level.
+
+    The text label and the bar are created on first use and then only hidden,
+    so switching levels back and forth does not rebuild them.
+    """
+
+    TEXT, BAR, HIDDEN = range(3)
+
+    def __init__(self, text, font_name, font_size, x, y, color, level, batch, group, cache):
+        self.cache = cache
+        self.text = text
+        self.font_name = font_name
+        self.font_size = font_size
+        self.x = x
+        self.y = y
+        self._color = color
+        self._group = group
+        self.batch = batch
+        self.label = None
+        self.bar = None
+        self.level = None
+        self.set_level(level)
+
+    @staticmethod
+    def extent(text, font_size, x, y):
+        """ Rough box of a label: average glyph width and cap height of the font size. """
+        return (x, y, x + len(text)*font_size*0.8, y + font_size*0.9)
+
+    def bar_geometry(self):
+        x1, y1, x2, y2 = LOD_LABEL.extent(self.text, self.font_size, self.x, self.y)
+        return (x1, y1, x2-x1, y2-y1)
+
+    def bar_color(self):
+        return (self._color[0], self._color[1], self._color[2], self._color[3]//2)
+
+    def set_level(self, level):
+        if level == self.level:
+            return
+        self.level = level
+        if level == LOD_LABEL.TEXT and self.label == None:
+            self.label = GLYPH_LABEL(self.cache, self.text, self.font_name, self.font_size,
+                                     self.x, self.y, self._color, self.batch, self._group)
+        if level == LOD_LABEL.BAR and self.bar == None:
+            x, y, width, height = self.bar_geometry()
+            self.bar = shapes.Rectangle(x, y, width, height, self.bar_color(), batch=self.batch, group=self._group)
+        if self.label != None:
+            self.label.visible = level == LOD_LABEL.TEXT
+        if self.bar != None:
+            self.bar.visible = level == LOD_LABEL.BAR
+
+    def update(self, text, font_name, font_size, x, y, color):
+        changed = (text, font_name, font_size, x, y) != (self.text, self.font_name, self.font_size, self.x, self.y)
+        self.text, self.font_name, self.font_size, self.x, self.y = text, font_name, font_size, x, y
+        if self.label != None:
+            self.label.update(text, font_name, font_size, x, y)
+        if self.bar != None and changed:
+            x, y, width, height = self.bar_geometry()
+            self.bar.position = (x, y)
+            self.bar.width = width
+            self.bar.height = height
+        self.color = color
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        color = tuple(color)
+        if color == self._color:
+            return
+        self._color = color
+        if self.label != None:
+            self.label.color = color
+        if self.bar != None:
+            self.bar.color = self.bar_color()
+
+    @property
+    def group(self):
+        return self._group
+
+    @group.setter
+    def group(self, group):
+        self._group = group
+        if self.label != None:
+            self.label.group = group
+        if self.bar != None:
+            self.bar.group = group
+
+    def delete(self):
+        if self.label != None:
+            self.label.delete()
+        if self.bar != None:
+            self.bar.delete()
+        self.label = None
+        self.bar = None
+
+
+class COMPONENT_GEOMETRY:
+    """ Columnar world-space geometry, labels and bounds of one component.
+
+    Geometry is built for many components at once: every line and rectangle
+    endpoint goes into one NumPy array, moved and magnified in a single
+    operation and reduced per component for bounds. Each component keeps views
+    into those arrays. Plain json in, no pyglet, so a loader thread can run it.
+    """
+
+    LINE = 0
+    RECT = 1
+    OTHER = -1
+
+    EMPTY_BOUNDS = (100000,100000,-100000,-100000)
+
+    def __init__(self, part, kinds, points, widths, colors, labels, bounds):
+        self.part = part
+        # one row per json shape index, OTHER rows are placeholders
+        self.kinds = kinds
+        self.points = points
+        self.widths = widths
+        self.colors = colors
+        self.labels = labels
+        self.bounds = bounds
+        self.__hit_arrays = None
+
+    @staticmethod
+    def columns(components, magnifier, parts = None, with_style = True):
+        """ Flatten the shapes of components into (kinds, points, widths, colors, counts). """
+        kinds = []
+        coordinates = []
+        origins = []
+        widths = []
+        colors = []
+        counts = []
+        labels = []
+        for i, component in enumerate(components):
+            labels.append(COMPONENT_GEOMETRY.component_labels(component, magnifier))
+            part = parts[i] if parts != None else None
+            # a library part replaces the component's own shapes
+            component_shapes = part['shapes'] if part != None else component.get('shapes')
+            if component_shapes == None:
+                component_shapes = []
+            origin = (component['x'], component['y'], component['x'], component['y'])
+            for shape in component_shapes:
+                if shape['type'] == "line":
+                    kinds.append(COMPONENT_GEOMETRY.LINE)
+                elif shape['type'] == "rectangle":
+                    kinds.append(COMPONENT_GEOMETRY.RECT)
+                else:
+                    kinds.append(COMPONENT_GEOMETRY.OTHER)
+                coordinates.append((shape.get('x1', 0), shape.get('y1', 0), shape.get('x2', 0), shape.get('y2', 0)))
+                origins.append(origin)
+                if with_style:
+                    widths.append(shape.get('width', 0) if shape['type'] == "line" else 0)
+                    colors.append(tuple(shape['color'][:4]) if 'color' in shape else None)
+            counts.append(len(component_shapes))
+
+        kinds = np.array(kinds, dtype = np.int8)
+        points = (np.array(coordinates, dtype = np.float64).reshape(-1, 4) +
+                  np.array(origins, dtype = np.float64).reshape(-1, 4))*magnifier
+        widths = np.array(widths, dtype = np.float64)*magnifier
+        return kinds, points, widths, colors, counts, labels
+
+    @staticmethod
+    def component_labels(component, magnifier):
+        """ (text, font_name, font_size, x, y) of each label, in world units. """
+        labels = []
+        x0 = component['x']
+        y0 = component['y']
+        if 'labels' in component:
+            for label in component['labels']:
+                if label['field'] == 'name':
+                    text = component["name"]
+                else:
+                    text = label['text']
+
+                if 'field_visible' in label and label['field_visible'] == True:
+                    text = label['field'] + ":" + text
+
+                labels.append((text, label['font']['name'], label['font']['size']*magnifier,
+                               (label['x']+x0)*magnifier, (label['y']+y0)*magnifier))
+        return labels
+
+    @staticmethod
+    def reduce_bounds(kinds, points, counts, labels):
+        """ (n, 4) array of minx, miny, maxx, maxy per component over shapes and label extents.
+
+        Components with nothing to bound get EMPTY_BOUNDS.
+        """
+        drawn = kinds != COMPONENT_GEOMETRY.OTHER
+        owners = np.repeat(np.arange(len(counts)), counts)[drawn]
+        boxes = np.concatenate((np.minimum(points[drawn, 0:2], points[drawn, 2:4]),
+                                np.maximum(points[drawn, 0:2], points[drawn, 2:4])), axis = 1)
+
+        label_boxes = [LOD_LABEL.extent(text, size, x, y)
+                       for component_labels in labels for text, name, size, x, y in component_labels]
+        if label_boxes:
+            owners = np.concatenate((owners, np.repeat(np.arange(len(labels)), [len(l) for l in labels])))
+            boxes = np.concatenate((boxes, np.array(label_boxes, dtype = np.float64)))
+
+        bounds = np.tile(np.array(COMPONENT_GEOMETRY.EMPTY_BOUNDS, dtype = np.float64), (len(counts), 1))
+        if len(owners) == 0:
+            return bounds
+        # group the boxes by owner, then reduce each run
+        order = np.argsort(owners, kind = 'stable')
+        owners = owners[order]
+        boxes = boxes[order]
+        starts = np.flatnonzero(np.concatenate(([True], owners[1:] != owners[:-1])))
+        owned = owners[starts]
+        bounds[owned, 0:2] = np.minimum.reduceat(boxes[:, 0:2], starts, axis = 0)
+        bounds[owned, 2:4] = np.maximum.reduceat(boxes[:, 2:4], starts, axis = 0)
+        return bounds
+
+    @staticmethod
+    def bounds_many(components, magnifier, parts = None):
+        """ Bounds only: endpoints are transformed and reduced, nothing else is built. """
+        kinds, points, widths, colors, counts, labels = COMPONENT_GEOMETRY.columns(components, magnifier, parts, with_style = False)
+        return COMPONENT_GEOMETRY.reduce_bounds(kinds, points, counts, labels)
+
+    @staticmethod
+    def build(components, magnifier, parts = None):
+        """ COMPONENT_GEOMETRY for each of components, sharing one set of arrays. """
+        kinds, points, widths, colors, counts, labels = COMPONENT_GEOMETRY.columns(components, magnifier, parts)
+        bounds = COMPONENT_GEOMETRY.reduce_bounds(kinds, points, counts, labels).tolist()
+
+        result = []
+        start = 0
+        for i, component in enumerate(components):
+            end = start + counts[i]
+            part = parts[i] if parts != None else None
+            component_bounds = tuple(bounds[i]) if bounds[i][0] <= bounds[i][2] else None
+            result.append(COMPONENT_GEOMETRY(part['name'] if part != None else None,
+                                             kinds[start:end], points[start:end], widths[start:end],
+                                             colors[start:end], labels[i], component_bounds))
+            start = end
+        return result
+
+    def shapes(self):
+        """ (index, kind, x1, y1, x2, y2, width, color) of every drawable shape. """
+        for index, (kind, points, width) in enumerate(zip(self.kinds.tolist(), self.points.tolist(), self.widths.tolist())):
+            if kind != COMPONENT_GEOMETRY.OTHER:
+                yield (index, kind, points[0], points[1], points[2], points[3], width, self.colors[index])
+
+    def hit(self, x, y, tolerance):
+        """ True if x,y is within tolerance of a line or inside a (grown) rectangle. """
+        if self.__hit_arrays == None:
+            lines = self.kinds == COMPONENT_GEOMETRY.LINE
+            rects = self.points[self.kinds == COMPONENT_GEOMETRY.RECT]
+            segments = self.points[lines]
+            self.__hit_arrays = (segments[:, :2], segments[:, 2:] - segments[:, :2], self.widths[lines]/2,
+                                 np.minimum(rects[:, :2], rects[:, 2:]), np.maximum(rects[:, :2], rects[:, 2:]))
+        start, direction, half_widths, low, high = self.__hit_arrays
+        point = np.array((x, y))
+
+        if len(low) and ((low - tolerance <= point) & (point <= high + tolerance)).all(axis = 1).any():
+            return True
+        if len(start):
+            offset = point - start
+            length2 = (direction*direction).sum(axis = 1)
+            t = np.clip((offset*direction).sum(axis = 1)/np.where(length2 > 0, length2, 1), 0, 1)
+            distance = np.hypot(*(offset - t[:, None]*direction).T)
+            if (distance <= tolerance + half_widths).any():
+                return True
+        return False
+
+    def dots(self):
+        """ Border dots shown on the shape ends and corners in macro edit. """
+        dots = []
+        for index, kind, x1, y1, x2, y2, width, color in self.shapes():
+            if kind == COMPONENT_GEOMETRY.LINE:
+                dots += [(x1, y1), (x2, y2)]
+            else:
+                dots += [(x1, y1), (x1, y2), (x2, y1), (x2, y2)]
+        return dots
 
 
 class SCHEME_DRAW_ITEM:
-    def __init__(self,shape=None):
-        self.shapes = [shape] if shape != None else []
+    """ Live pyglet objects of one component, kept between reloads. """
 
-    def addItem(self,item):
-        self.shapes.append(item)
+    LABEL_COLOR = (255,255,255,255)
+
+    def __init__(self):
+        self.shapes = []
+        self.bounds = None
+        self.group = None
+        # COMPONENT_GEOMETRY the live objects were built from, used for hit-testing
+        self.geometry = None
+        self.instance = None
+        self.slots = []
+        self.labels = []
+        self.dots = []
+        self.highlight = None
+        self.base_colors = []
+
+    def take_slot(self, index, kind):
+        """ Return the live object for a json shape if it can be updated in place. """
+        if index < len(self.slots) and type(self.slots[index]) is kind:
+            return self.slots[index]
+        return None
+
+    def set_slots(self, slots):
+        keep = set(map(id, slots))
+        for shape in self.slots:
+            if shape != None and id(shape) not in keep:
+                shape.delete()
+        self.slots = slots
+        self.__collect()
+
+    def set_labels(self, labels):
+        for label in self.labels[len(labels):]:
+            label.delete()
+        self.labels = labels
+        self.__collect()
+
+    def set_instance(self, instance):
+        if self.instance != None and (instance == None or instance.symbol is not self.instance.symbol):
+            self.instance.delete()
+        self.instance = instance
+        self.__collect()
+
+    def set_group(self, group):
+        """ Move every live object under another culling tile. """
+        if group is self.group:
+            return
+        if self.group != None:
+            for shape in self.shapes:
+                shape.group = group
+        self.group = group
+
+    def set_dots(self, positions, factory):
+        for dot in self.dots[len(positions):]:
+            dot.delete()
+        dots = self.dots[:len(positions)]
+        for index, (x, y) in enumerate(positions):
+            if index < len(dots):
+                if dots[index].x != x or dots[index].y != y:
+                    dots[index].position = (x, y)
+            else:
+                dots.append(factory(x, y))
+        self.dots = dots
+        self.__collect()
+
+    def set_highlight(self, color):
+        """ Recolor every live object, or restore the saved colors when color is None. """
+        if color == self.highlight:
+            return
+        if self.highlight == None:
+            self.base_colors = [shape.color for shape in self.shapes]
+        if color == None:
+            for shape, base in zip(self.shapes, self.base_colors):
+                shape.color = base
+            self.base_colors = []
+        else:
+            for shape in self.shapes:
+                shape.color = color
+        self.highlight = color
+
+    def refresh_highlight(self):
+        """ Re-apply the highlight after a sync reset the colors from json. """
+        color = self.highlight
+        if color != None:
+            self.highlight = None
+            self.set_highlight(color)
+
+    def __collect(self):
+        self.shapes = [shape for shape in self.slots if shape != None] + self.dots + self.labels
+        if self.instance != None:
+            self.shapes.append(self.instance)
+
+    def delete(self):
+        for shape in self.shapes:
+            shape.delete()
+        self.clear()
 
     def clear(self):
         self.shapes = []
+        self.slots = []
+        self.labels = []
+        self.dots = []
+        self.instance = None
+
+class JSON_STREAM:
+    """ Reads json values one at a time from a file handle without loading it whole. """
+
+    def __init__(self, handle, chunk_size = 1 << 16):
+        self.handle = handle
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        # file offset of buffer[0], in characters
+        self.base = 0
+
+    def offset(self):
+        """ Characters of the file consumed so far. """
+        return self.base + self.pos
+
+    def more(self):
+        chunk = self.handle.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.base += self.pos
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """ Next non-whitespace character, or '' at the end of the file. """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return ''
+
+    def expect(self, chars):
+        c = self.peek()
+        if c == '' or c not in chars:
+            raise ValueError("expected one of '%s' at offset %d, got '%s'" % (chars, self.offset(), c))
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number cut by the chunk boundary may continue in the next chunk
+                if self.eof or not isinstance(value, (int, float)) or \
+                   (end < len(self.buffer) and self.buffer[end] not in '.eE+-0123456789'):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as error:
+                if self.eof:
+                    raise ValueError('%s at offset %d' % (error.msg, self.base + error.pos)) from error
+            self.more()
+
+
+class BINARY_SCHEME:
+    """ Compact binary scheme format.
+
+    Layout (little endian): a header with magic, version, flags, the offset of
+    the tables and the record count; then length-prefixed records; then the
+    string, layout and template tables. Record 0 holds the top-level fields
+    (with a null in place of 'components' to keep key order, a header flag
+    tells a null component list from a missing one), every further record is
+    one component.
+
+    A component is written as a template index plus one struct-packed row of
+    all its scalars; components with the same structure share the template.
+    Anything a template cannot hold falls back to tagged values: strings are
+    stored once and referenced by index, and a dict whose values are all
+    scalars (shapes, pins, fonts) is a layout index plus one packed row.
+    """
+
+    MAGIC = b'FCSB'
+    VERSION = 2
+    EXTENSION = '.bschem'
+
+    HEADER = struct.Struct('<4sHHQI')
+    U32 = struct.Struct('<I')
+    I8 = struct.Struct('<b')
+    I32 = struct.Struct('<i')
+    I64 = struct.Struct('<q')
+    F64 = struct.Struct('<d')
+
+    T_NULL, T_FALSE, T_TRUE, T_INT8, T_INT32, T_INT64, T_BIGINT, T_FLOAT, \
+        T_STR, T_LIST, T_DICT, T_BYTES, T_ROW, T_TEMPLATE = range(14)
+
+    # header flags
+    FLAG_NULL_COMPONENTS = 1
+
+    # field kinds of packed rows and their struct codes
+    K_STR, K_INT8, K_INT32, K_INT64, K_FLOAT, K_BOOL, K_NULL, K_BYTES = range(8)
+    K_CODES = ('I', 'b', 'i', 'q', 'd', '?', 'x', 's')
+
+    @staticmethod
+    def is_binary(fileName):
+        with open(fileName, 'rb') as handle:
+            return handle.read(4) == BINARY_SCHEME.MAGIC
+
+    @staticmethod
+    def component_count(fileName):
+        with open(fileName, 'rb') as handle:
+            return BINARY_SCHEME.HEADER.unpack(handle.read(BINARY_SCHEME.HEADER.size))[4] - 1
+
+    @staticmethod
+    def is_bytes(value):
+        return 0 < len(value) < 256 and all(type(v) is int and 0 <= v < 256 for v in value)
+
+    @staticmethod
+    def row_format(fields):
+        return '<' + ''.join((str(n) if kind == BINARY_SCHEME.K_BYTES else '') + BINARY_SCHEME.K_CODES[kind]
+                             for key, kind, n in fields)
+
+    @staticmethod
+    def save(jsonData, fileName):
+        strings = {}
+        layouts = {}
+        templates = {}
+        # flat signature of a record -> its template
+        signatures = {}
+        INT_ONLY = {int}
+        U32, I8, I32, I64, F64 = (BINARY_SCHEME.U32, BINARY_SCHEME.I8,
+                                  BINARY_SCHEME.I32, BINARY_SCHEME.I64, BINARY_SCHEME.F64)
+        K = BINARY_SCHEME
+
+        def string_index(text):
+            index = strings.get(text)
+            if index == None:
+                index = strings[text] = len(strings)
+            return index
+
+        def row_fields(value):
+            """ (key, kind, size) per field if the dict can be packed as one row, else None. """
+            fields = []
+            for key, item in value.items():
+                t = type(item)
+                if t is str: fields.append((key, K.K_STR, 0))
+                elif t is int:
+                    if -128 <= item < 128: fields.append((key, K.K_INT8, 0))
+                    elif -2**31 <= item < 2**31: fields.append((key, K.K_INT32, 0))
+                    elif -2**63 <= item < 2**63: fields.append((key, K.K_INT64, 0))
+                    else: return None
+                elif t is float: fields.append((key, K.K_FLOAT, 0))
+                elif t is bool: fields.append((key, K.K_BOOL, 0))
+                elif item is None: fields.append((key, K.K_NULL, 0))
+                elif (t is list or t is tuple) and K.is_bytes(item): fields.append((key, K.K_BYTES, len(item)))
+                else: return None
+            return tuple(fields)
+
+        def describe(value, codes, values):
+            """ Structure of value, its scalars appended to codes and values; None if it needs tags. """
+            t = type(value)
+            if t is dict:
+                items = []
+                for key, item in value.items():
+                    shape = describe(item, codes, values)
+                    if shape == None or type(key) is not str:
+                        return None
+                    items.append((key, shape))
+                return ('d', tuple(items))
+            if t is list or t is tuple:
+                if K.is_bytes(value):
+                    codes.append('%ds' % len(value))
+                    values.append(bytes(value))
+                    return ('b', len(value))
+                items = []
+                for item in value:
+                    shape = describe(item, codes, values)
+                    if shape == None:
+                        return None
+                    items.append(shape)
+                return ('l', tuple(items))
+            if t is str:
+                codes.append('I')
+                values.append(string_index(value))
+                return K.K_STR
+            if t is int:
+                if -128 <= value < 128: kind = K.K_INT8
+                elif -2**31 <= value < 2**31: kind = K.K_INT32
+                elif -2**63 <= value < 2**63: kind = K.K_INT64
+                else: return None
+            elif t is float: kind = K.K_FLOAT
+            elif t is bool: kind = K.K_BOOL
+            elif value is None:
+                codes.append('x')
+                return K.K_NULL
+            else:
+                return None
+            codes.append(K.K_CODES[kind])
+            values.append(value)
+            return kind
+
+        def template_of(value, values):
+            """ (index, struct) of the template of value, its scalars appended to values; None if it has none. """
+            codes = []
+            shape = describe(value, codes, values)
+            if shape == None:
+                return None
+            template = templates.get(shape)
+            if template == None:
+                template = templates[shape] = (len(templates), struct.Struct('<' + ''.join(codes)))
+            return template
+
+        def signature(value, sig, values):
+            """ Flat form of describe() for a dict or list, its scalars appended to values; False if it needs tags.
+
+            Scalars are handled in the loop rather than by a call each, and the
+            flat list hashes faster than the nested shape.
+            """
+            t = type(value)
+            if t is dict:
+                sig.append('d')
+                sig.append(len(value))
+                for key in value:
+                    if type(key) is not str:
+                        return False
+                    sig.append(key)
+                items = value.values()
+            elif t is list or t is tuple:
+                if value and set(map(type, value)) == INT_ONLY and min(value) >= 0 and max(value) < 256 and len(value) < 256:
+                    sig.append('b')
+                    sig.append(len(value))
+                    values.append(bytes(value))
+                    return True
+                sig.append('l')
+                sig.append(len(value))
+                items = value
+            else:
+                return False
+            for item in items:
+                t = type(item)
+                if t is str:
+                    sig.append(K.K_STR)
+                    values.append(string_index(item))
+                elif t is float:
+                    sig.append(K.K_FLOAT)
+                    values.append(item)
+                elif t is int and -2**31 <= item < 2**31:
+                    sig.append(K.K_INT8 if -128 <= item < 128 else K.K_INT32)
+                    values.append(item)
+                elif t is bool:
+                    sig.append(K.K_BOOL)
+                    values.append(item)
+                elif item is None:
+                    sig.append(K.K_NULL)
+                elif t is int:
+                    if not -2**63 <= item < 2**63:
+                        return False
+                    sig.append(K.K_INT64)
+                    values.append(item)
+                elif not signature(item, sig, values):
+                    return False
+            return True
+
+        def encode_record(value, out):
+            """ A record is one row of its template's struct when its structure allows. """
+            sig = []
+            values = []
+            if signature(value, sig, values):
+                sig = tuple(sig)
+                template = signatures.get(sig)
+                if template == None:
+                    template = signatures[sig] = template_of(value, [])
+            else:
+                # scalar records, and ones needing tags
+                values = []
+                template = template_of(value, values)
+                if template == None:
+                    encode(value, out)
+                    return
+            out.append(K.T_TEMPLATE)
+            out += U32.pack(template[0])
+            out += template[1].pack(*values)
+
+        def encode(value, out):
+            t = type(value)
+            if t is dict:
+                fields = row_fields(value)
+                if fields:
+                    layout = layouts.get(fields)
+                    if layout == None:
+                        layout = layouts[fields] = (len(layouts), struct.Struct(K.row_format(fields)))
+                        for key, kind, n in fields:
+                            string_index(key)
+                    row = []
+                    for (key, kind, n), item in zip(fields, value.values()):
+                        if kind == K.K_STR: row.append(string_index(item))
+                        elif kind == K.K_BYTES: row.append(bytes(item))
+                        elif kind != K.K_NULL: row.append(item)
+                    out.append(K.T_ROW)
+                    out += U32.pack(layout[0])
+                    out += layout[1].pack(*row)
+                    return
+                out.append(K.T_DICT)
+                out += U32.pack(len(value))
+                for key, item in value.items():
+                    out += U32.pack(string_index(key))
+                    encode(item, out)
+            elif t is str:
+                out.append(K.T_STR)
+                out += U32.pack(string_index(value))
+            elif t is int:
+                if -128 <= value < 128:
+                    out.append(K.T_INT8)
+                    out += I8.pack(value)
+                elif -2**31 <= value < 2**31:
+                    out.append(K.T_INT32)
+                    out += I32.pack(value)
+                elif -2**63 <= value < 2**63:
+                    out.append(K.T_INT64)
+                    out += I64.pack(value)
+                else:
+                    out.append(K.T_BIGINT)
+                    out += U32.pack(string_index(str(value)))
+            elif t is float:
+                out.append(K.T_FLOAT)
+                out += F64.pack(value)
+            elif t is list or t is tuple:
+                if K.is_bytes(value):
+                    out.append(K.T_BYTES)
+                    out.append(len(value))
+                    out += bytes(value)
+                else:
+                    out.append(K.T_LIST)
+                    out += U32.pack(len(value))
+                    for item in value:
+                        encode(item, out)
+            elif value is None:
+                out.append(K.T_NULL)
+            elif value is True:
+                out.append(K.T_TRUE)
+            elif value is False:
+                out.append(K.T_FALSE)
+            else:
+                raise TypeError('%s is not serializable' % t.__name__)
+
+        flags = 0
+        components = jsonData.get('components')
+        if components == None:
+            if 'components' in jsonData:
+                flags |= K.FLAG_NULL_COMPONENTS
+            components = []
+        meta = {key: (None if key == 'components' else value) for key, value in jsonData.items()}
+
+        body = bytearray()
+        payload = bytearray()
+        encode(meta, payload)
+        body += U32.pack(len(payload))
+        body += payload
+        for record in components:
+            payload = bytearray()
+            encode_record(record, payload)
+            body += U32.pack(len(payload))
+            body += payload
+
+        tables = bytearray(U32.pack(len(strings)))
+        for text in strings:
+            data = text.encode('utf-8')
+            tables += U32.pack(len(data))
+            tables += data
+        tables += U32.pack(len(layouts))
+        for fields in layouts:
+            tables += U32.pack(len(fields))
+            for key, kind, n in fields:
+                tables += U32.pack(string_index(key))
+                tables.append(kind)
+                tables.append(n)
+        tables += U32.pack(len(templates))
+        for shape in templates:
+            data = json.dumps(shape, separators = (',', ':')).encode('utf-8')
+            tables += U32.pack(len(data))
+            tables += data
+
+        header = K.HEADER.pack(K.MAGIC, K.VERSION, flags, K.HEADER.size + len(body), len(components) + 1)
+        with open(fileName, 'wb') as f:
+            f.write(header)
+            f.write(body)
+            f.write(tables)
+
+    @staticmethod
+    def template(shape):
+        """ (struct, function) for a template: the function rebuilds the value from the unpacked row.
+
+        Decoding needs no compiled source: the row is resolved into its plain
+        values, strings and byte lists, then every dict and list is appended to
+        it children first, each one zipped from an itemgetter over what came
+        before. A whole component comes back from one unpack and one call.
+        """
+        K = BINARY_SCHEME
+        codes = []
+        # unpacked row indices of the plain values, strings and byte lists
+        fields = {'plain': [], 'str': [], 'bytes': []}
+        # (keys, or None for a list; where its items are) per container, children first
+        containers = []
+        # index of the next unpacked value, pad bytes of nulls have none
+        count = [0]
+
+        def field(code, group):
+            codes.append(code)
+            fields[group].append(count[0])
+            count[0] += 1
+            return (group, len(fields[group]) - 1)
+
+        def node(shape):
+            """ Where the value of shape ends up: (group, position in the group). """
+            if type(shape) is int:
+                if not 0 <= shape < len(K.K_CODES) or shape == K.K_BYTES:
+                    raise ValueError('bad template field kind %r' % (shape,))
+                if shape == K.K_NULL:
+                    # pad bytes, the resolved row starts with a None
+                    codes.append('x')
+                    return ('none', 0)
+                return field(K.K_CODES[shape], 'str' if shape == K.K_STR else 'plain')
+            kind, items = shape
+            if kind == 'b':
+                if type(items) is not int:
+                    raise ValueError('bad template byte length %r' % (items,))
+                return field('%ds' % items, 'bytes')
+            if kind == 'd':
+                keys = []
+                parts = []
+                for key, item in items:
+                    if type(key) is not str:
+                        raise ValueError('bad template key %r' % (key,))
+                    keys.append(key)
+                    parts.append(node(item))
+            elif kind == 'l':
+                keys = None
+                parts = [node(item) for item in items]
+            else:
+                raise ValueError('bad template node %r' % (kind,))
+            containers.append((keys, parts))
+            return ('container', len(containers) - 1)
+
+        def getter(indices):
+            """ itemgetter of the row at indices, always returning a sequence. """
+            if len(indices) == 1:
+                return operator.itemgetter(slice(indices[0], indices[0] + 1))
+            if len(indices) == 0:
+                return operator.itemgetter(slice(0, 0))
+            return operator.itemgetter(*indices)
+
+        root = node(shape)
+        # resolved row: None, plain values, strings, byte lists, then the containers
+        offsets = {'none': 0, 'plain': 1}
+        offsets['str'] = offsets['plain'] + len(fields['plain'])
+        offsets['bytes'] = offsets['str'] + len(fields['str'])
+        offsets['container'] = offsets['bytes'] + len(fields['bytes'])
+        program = [(keys, getter([offsets[group] + index for group, index in parts]))
+                   for keys, parts in containers]
+        result = offsets[root[0]] + root[1]
+        plain = getter(fields['plain'])
+        strs = getter(fields['str'])
+        blobs = getter(fields['bytes'])
+
+        def build(row, strings):
+            values = [None]
+            values += plain(row)
+            values += map(strings.__getitem__, strs(row))
+            values += map(list, blobs(row))
+            append = values.append
+            for keys, items in program:
+                if keys is None:
+                    append(list(items(values)))
+                else:
+                    append(dict(zip(keys, items(values))))
+            return values[result]
+
+        return struct.Struct('<' + ''.join(codes)), build
+
+    class READER:
+        """ Memory-mapped binary scheme: meta is the top-level dict, records() yields components.
+
+        The map stays open until close(), or the end of a with block.
+        """
+
+        def __init__(self, fileName):
+            handle = open(fileName, 'rb')
+            try:
+                self.__buf = mmap.mmap(handle.fileno(), 0, access = mmap.ACCESS_READ)
+            finally:
+                handle.close()
+            try:
+                self.__parse(fileName)
+            except Exception:
+                self.__buf.close()
+                raise
+
+        def __parse(self, fileName):
+            K = BINARY_SCHEME
+            buf = self.__buf
+            magic, version, flags, table_offset, record_count = K.HEADER.unpack_from(buf, 0)
+            if magic != K.MAGIC:
+                raise ValueError('%s is not a binary scheme' % fileName)
+            if version > K.VERSION:
+                raise ValueError('%s has unsupported binary scheme version %d' % (fileName, version))
+            self.record_count = record_count
+
+            u32 = K.U32.unpack_from
+            strings = []
+            (count,) = u32(buf, table_offset)
+            pos = table_offset + 4
+            for i in range(count):
+                (length,) = u32(buf, pos)
+                strings.append(str(buf[pos+4:pos+4+length], 'utf-8'))
+                pos += 4 + length
+
+            # per layout: row struct, keys in row order, and the keys needing conversion
+            layouts = []
+            (count,) = u32(buf, pos)
+            pos += 4
+            for i in range(count):
+                (length,) = u32(buf, pos)
+                pos += 4
+                fields = []
+                for j in range(length):
+                    fields.append((strings[u32(buf, pos)[0]], buf[pos+4], buf[pos+5]))
+                    pos += 6
+                keys = [key for key, kind, n in fields if kind != K.K_NULL]
+                layouts.append((struct.Struct(K.row_format(fields)),
+                                [key for key, kind, n in fields],
+                                keys,
+                                [key for key, kind, n in fields if kind == K.K_STR],
+                                [key for key, kind, n in fields if kind == K.K_BYTES],
+                                len(keys) != len(fields)))
+
+            # version 1 files have no templates
+            templates = []
+            if version >= 2:
+                (count,) = u32(buf, pos)
+                pos += 4
+                for i in range(count):
+                    (length,) = u32(buf, pos)
+                    templates.append(K.template(json.loads(str(buf[pos+4:pos+4+length], 'utf-8'))))
+                    pos += 4 + length
+
+            i8 = K.I8.unpack_from
+            i32 = K.I32.unpack_from
+            i64 = K.I64.unpack_from
+            f64 = K.F64.unpack_from
+
+            def decode(pos):
+                tag = buf[pos]
+                pos += 1
+                if tag == K.T_TEMPLATE:
+                    row, build = templates[u32(buf, pos)[0]]
+                    return build(row.unpack_from(buf, pos + 4), strings), pos + 4 + row.size
+                if tag == K.T_ROW:
+                    row, all_keys, keys, str_keys, bytes_keys, has_null = layouts[u32(buf, pos)[0]]
+                    value = dict(zip(keys, row.unpack_from(buf, pos + 4)))
+                    for key in str_keys:
+                        value[key] = strings[value[key]]
+                    for key in bytes_keys:
+                        value[key] = list(value[key])
+                    if has_null:
+                        value = {key: value.get(key) for key in all_keys}
+                    return value, pos + 4 + row.size
+                if tag == K.T_DICT:
+                    (count,) = u32(buf, pos)
+                    pos += 4
+                    value = {}
+                    for i in range(count):
+                        (key,) = u32(buf, pos)
+                        value[strings[key]], pos = decode(pos + 4)
+                    return value, pos
+                if tag == K.T_LIST:
+                    (count,) = u32(buf, pos)
+                    pos += 4
+                    value = []
+                    for i in range(count):
+                        item, pos = decode(pos)
+                        value.append(item)
+                    return value, pos
+                if tag == K.T_STR:
+                    return strings[u32(buf, pos)[0]], pos + 4
+                if tag == K.T_INT8:
+                    return i8(buf, pos)[0], pos + 1
+                if tag == K.T_FLOAT:
+                    return f64(buf, pos)[0], pos + 8
+                if tag == K.T_BYTES:
+                    length = buf[pos]
+                    return list(buf[pos+1:pos+1+length]), pos + 1 + length
+                if tag == K.T_INT32:
+                    return i32(buf, pos)[0], pos + 4
+                if tag == K.T_INT64:
+                    return i64(buf, pos)[0], pos + 8
+                if tag == K.T_BIGINT:
+                    return int(strings[u32(buf, pos)[0]]), pos + 4
+                if tag == K.T_NULL:
+                    return None, pos
+                if tag == K.T_TRUE:
+                    return True, pos
+                if tag == K.T_FALSE:
+                    return False, pos
+                raise ValueError('unknown tag %d at offset %d' % (tag, pos - 1))
+
+            self.decode = decode
+            pos = K.HEADER.size
+            (length,) = u32(buf, pos)
+            self.meta = decode(pos + 4)[0]
+            self.__first = pos + 4 + length
+            # the placeholder keeping key order says whether there is a component list
+            if 'components' in self.meta and not flags & K.FLAG_NULL_COMPONENTS:
+                self.meta['components'] = []
+
+        def records(self):
+            u32 = BINARY_SCHEME.U32.unpack_from
+            buf = self.__buf
+            decode = self.decode
+            pos = self.__first
+            for i in range(self.record_count - 1):
+                (length,) = u32(buf, pos)
+                yield decode(pos + 4)[0]
+                pos += 4 + length
+
+        def close(self):
+            self.__buf.close()
+
+        @property
+        def closed(self):
+            return self.__buf.closed
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            self.close()
+
+    @staticmethod
+    def load(fileName):
+        with BINARY_SCHEME.READER(fileName) as reader:
+            meta = reader.meta
+            if meta.get('components') != None:
+                meta['components'] = list(reader.records())
+            return meta
+
 
 class SCHEME:
 
@@ -126,57 +2734,633 @@ class SCHEME:
         self.__components=[]
         self.__fileName = None
         self.jsonData = None
+        # share of the file consumed by the running iterScheme, 0..1
+        self.progress = 0.0
+
+    # keys holding runtime objects (live shapes etc), never written to disk
+    RUNTIME_PREFIX = 'temp_'
 
     def loadScheme(self,fileName):
         self.__fileName = fileName
-        with open(fileName, 'r') as handle:
-            self.jsonData = json.load(handle)
+        if BINARY_SCHEME.is_binary(fileName):
+            self.jsonData = BINARY_SCHEME.load(fileName)
+        else:
+            with open(fileName, 'r') as handle:
+                self.jsonData = json.load(handle)
+        # edits autosaved after the last full save
+        EDIT_HISTORY.replay(self.jsonData, SCHEME_JOURNAL.read(fileName))
 
-    def saveScheme(self,fileName = ""):
+    def getSchemeFile(self):
+        return self.__fileName
+
+    def setSchemeFile(self, fileName):
+        self.__fileName = fileName
+
+    def iterScheme(self, fileName, chunk_size = 1 << 16):
+        """ Start an incremental load; the returned generator yields each component once parsed.
+
+        jsonData is replaced right away and its component list fills up while the
+        generator is consumed. Once it is done jsonData holds the document as
+        json.load would return it: other keys in file order, a null or missing
+        component list left as it was.
+        """
+        self.__fileName = fileName
+        self.jsonData = {'components': []}
+        return self.__iterComponents(fileName, chunk_size)
+
+    def __iterComponents(self, fileName, chunk_size):
+        self.progress = 0.0
+        components = self.jsonData['components']
+        # the document in file order, its list is the one being filled
+        document = {}
+        if BINARY_SCHEME.is_binary(fileName):
+            total = max(BINARY_SCHEME.component_count(fileName), 1)
+            with BINARY_SCHEME.READER(fileName) as reader:
+                document.update(reader.meta)
+                if isinstance(document.get('components'), list):
+                    document['components'] = components
+                for index, component in enumerate(reader.records()):
+                    components.append(component)
+                    self.progress = (index+1)/total
+                    yield component
+        else:
+            size = max(os.path.getsize(fileName), 1)
+            with open(fileName, 'r') as handle:
+                stream = JSON_STREAM(handle, chunk_size)
+                stream.expect('{')
+                if stream.peek() == '}':
+                    stream.pos += 1
+                else:
+                    while True:
+                        key = stream.value()
+                        stream.expect(':')
+                        if key == 'components' and stream.peek() == '[':
+                            document[key] = components
+                            stream.pos += 1
+                            if stream.peek() == ']':
+                                stream.pos += 1
+                            else:
+                                while True:
+                                    component = stream.value()
+                                    components.append(component)
+                                    self.progress = min(stream.offset()/size, 1.0)
+                                    yield component
+                                    if stream.expect(',]') == ']':
+                                        break
+                        else:
+                            document[key] = stream.value()
+                        if stream.expect(',}') == '}':
+                            break
+        self.jsonData.clear()
+        self.jsonData.update(document)
+        self.progress = 1.0
+
+    @staticmethod
+    def persistent(value):
+        """ value without runtime keys, if it is a component (or any dict). """
+        if isinstance(value, dict):
+            return {key: item for key, item in value.items() if not key.startswith(SCHEME.RUNTIME_PREFIX)}
+        return value
+
+    def persistentData(self):
+        """ Shallow copy of jsonData with the runtime-only component keys left out. """
+        data = dict(self.jsonData)
+        if data.get('components') != None:
+            data['components'] = [{key: value for key, value in component.items()
+                                   if not key.startswith(SCHEME.RUNTIME_PREFIX)}
+                                  for component in data['components']]
+        return data
+
+    def saveScheme(self,fileName = "", binary = None):
         if fileName != "":
             self.__fileName = fileName
+        if binary == None:
+            binary = self.__fileName.endswith(BINARY_SCHEME.EXTENSION)
+        if binary:
+            BINARY_SCHEME.save(self.persistentData(), self.__fileName)
+            return
         #print(json.dumps(self.jsonData, indent=4,default=bool))
         with open(self.__fileName, 'w') as f:
-            f.write(json.dumps(self.jsonData, indent=4, default=bool))
+            f.write(json.dumps(self.persistentData(), indent=4))
+
+class EDIT_COMMAND:
+    """ One reversible change of the scheme json at a key path.
+
+    path walks jsonData (keys and list indexes). SET replaces path's value,
+    INSERT and REMOVE add or take out the list item at path. Old and new values
+    are kept by reference, never copied: unchanged parts of the tree stay
+    shared between the scheme and the history.
+    """
+
+    SET = 'set'
+    INSERT = 'insert'
+    REMOVE = 'remove'
+    # only in logs: the undo of a SET that created its key
+    UNSET = 'unset'
+
+    # old value of a SET that created the key
+    MISSING = object()
+
+    def __init__(self, kind, path, old = None, new = None):
+        self.kind = kind
+        self.path = path
+        self.old = old
+        self.new = new
+
+    @staticmethod
+    def container(root, path):
+        for key in path[:-1]:
+            root = root[key]
+        return root
+
+    def apply(self, root):
+        container = EDIT_COMMAND.container(root, self.path)
+        key = self.path[-1]
+        if self.kind == EDIT_COMMAND.SET:
+            container[key] = self.new
+        elif self.kind == EDIT_COMMAND.INSERT:
+            container.insert(key, self.new)
+        else:
+            del container[key]
+
+    def inverse(self):
+        """ Command that undoes this one when applied. """
+        if self.kind == EDIT_COMMAND.SET:
+            if self.old is EDIT_COMMAND.MISSING:
+                return EDIT_COMMAND(EDIT_COMMAND.UNSET, self.path, self.new)
+            return EDIT_COMMAND(EDIT_COMMAND.SET, self.path, self.new, self.old)
+        if self.kind == EDIT_COMMAND.INSERT:
+            return EDIT_COMMAND(EDIT_COMMAND.REMOVE, self.path, self.new)
+        return EDIT_COMMAND(EDIT_COMMAND.INSERT, self.path, new = self.old)
+
+    def revert(self, root):
+        container = EDIT_COMMAND.container(root, self.path)
+        key = self.path[-1]
+        if self.kind == EDIT_COMMAND.SET:
+            if self.old is EDIT_COMMAND.MISSING:
+                del container[key]
+            else:
+                container[key] = self.old
+        elif self.kind == EDIT_COMMAND.INSERT:
+            del container[key]
+        else:
+            container.insert(key, self.old)
+
+    def component_index(self):
+        """ Index of the component this command edits, or None if it changes the component list. """
+        if self.path[0] == 'components' and len(self.path) > 2:
+            return self.path[1]
+        return None
+
+    def record(self):
+        """ json-ready form for logs and journals; runtime keys are left out. """
+        return {'op': self.kind, 'path': self.path, 'value': SCHEME.persistent(self.new)}
+
+    @staticmethod
+    def from_record(record):
+        return EDIT_COMMAND(record['op'], record['path'], new = record.get('value'))
+
+    def weight(self):
+        """ Rough count of json nodes this command keeps alive. """
+        return 1 + EDIT_COMMAND.nodes(self.old) + EDIT_COMMAND.nodes(self.new)
+
+    @staticmethod
+    def nodes(value, limit = 10000):
+        count = 0
+        stack = [value]
+        while stack and count < limit:
+            value = stack.pop()
+            count += 1
+            if isinstance(value, dict):
+                stack.extend(value.values())
+            elif isinstance(value, list):
+                stack.extend(value)
+        return count
+
+
+class EDIT_STEP:
+    """ Commands undone and redone together, e.g. every component moved by one nudge. """
+
+    def __init__(self, label, merge = None):
+        self.label = label
+        self.merge = merge
+        self.commands = []
+        self.time = time.monotonic()
+        self.weight = 0
+
+    def components(self, root):
+        """ Components touched by the step, or None if the component list itself changed. """
+        touched = []
+        for command in self.commands:
+            index = command.component_index()
+            if index == None:
+                return None
+            touched.append(root['components'][index])
+        return touched
+
+
+class EDIT_HISTORY:
+    """ Undo/redo log of EDIT_STEPs over a scheme's jsonData.
+
+    Steps with the same merge key arriving within coalesce_time of each other
+    fold into one (a drag or a run of nudges undoes at once). The oldest steps
+    are dropped once max_steps or max_weight (json nodes kept alive) is passed.
+    """
+
+    def __init__(self, scheme, max_steps = 500, max_weight = 500000, coalesce_time = 0.75):
+        self.scheme = scheme
+        self.max_steps = max_steps
+        self.max_weight = max_weight
+        self.coalesce_time = coalesce_time
+        self.root = None
+        self.done = []
+        self.undone = []
+        self.weight = 0
+        self.__step = None
+        # callbacks(step, commands, direction) after each change, direction is 1 or -1
+        self.listeners = []
+
+    def __follow(self):
+        # a newly loaded scheme starts with an empty history
+        if self.root is not self.scheme.jsonData:
+            self.root = self.scheme.jsonData
+            self.clear()
+
+    def clear(self):
+        self.done = []
+        self.undone = []
+        self.weight = 0
+        self.__step = None
+
+    def begin(self, label, merge = None):
+        self.__follow()
+        self.__step = EDIT_STEP(label, merge)
+
+    def __record(self, command):
+        single = self.__step == None
+        if single:
+            self.begin(command.kind)
+        command.apply(self.root)
+        self.__step.commands.append(command)
+        if single:
+            return self.end()
+
+    def set(self, path, value):
+        self.__follow()
+        container = EDIT_COMMAND.container(self.root, path)
+        key = path[-1]
+        old = container[key] if isinstance(container, list) or key in container else EDIT_COMMAND.MISSING
+        return self.__record(EDIT_COMMAND(EDIT_COMMAND.SET, list(path), old, value))
+
+    def insert(self, path, value):
+        return self.__record(EDIT_COMMAND(EDIT_COMMAND.INSERT, list(path), new = value))
+
+    def remove(self, path):
+        self.__follow()
+        old = EDIT_COMMAND.container(self.root, path)[path[-1]]
+        return self.__record(EDIT_COMMAND(EDIT_COMMAND.REMOVE, list(path), old = old))
+
+    def end(self):
+        """ Close the open step; returns it, or None if nothing was recorded. """
+        step = self.__step
+        self.__step = None
+        if step == None or len(step.commands) == 0:
+            return None
+        self.undone = []
+
+        last = self.done[-1] if self.done else None
+        if last != None and step.merge != None and last.merge == step.merge and \
+            step.time - last.time <= self.coalesce_time and \
+            all(command.kind == EDIT_COMMAND.SET for command in last.commands + step.commands):
+            # keep the first old value, take the latest new value
+            by_path = {tuple(command.path): command for command in last.commands}
+            # the merged step holds other values now, and maybe more of them
+            weight = 0
+            for command in step.commands:
+                previous = by_path.get(tuple(command.path))
+                if previous != None:
+                    weight += EDIT_COMMAND.nodes(command.new) - EDIT_COMMAND.nodes(previous.new)
+                    previous.new = command.new
+                else:
+                    weight += command.weight()
+                    last.commands.append(command)
+                    by_path[tuple(command.path)] = command
+            last.time = step.time
+            last.weight += weight
+            self.weight += weight
+            self.__trim()
+            self.__notify(step, step.commands, 1)
+            return last
+
+        step.weight = sum(command.weight() for command in step.commands)
+        self.done.append(step)
+        self.weight += step.weight
+        self.__trim()
+        self.__notify(step, step.commands, 1)
+        return step
+
+    def __trim(self):
+        while len(self.done) > 1 and (len(self.done) > self.max_steps or self.weight > self.max_weight):
+            self.weight -= self.done.pop(0).weight
+
+    def undo(self):
+        self.__follow()
+        if not self.done:
+            return None
+        step = self.done.pop()
+        self.weight -= step.weight
+        for command in reversed(step.commands):
+            command.revert(self.root)
+        self.undone.append(step)
+        self.__notify(step, step.commands, -1)
+        return step
+
+    def redo(self):
+        self.__follow()
+        if not self.undone:
+            return None
+        step = self.undone.pop()
+        for command in step.commands:
+            command.apply(self.root)
+        self.done.append(step)
+        self.weight += step.weight
+        self.__notify(step, step.commands, 1)
+        return step
+
+    def __notify(self, step, commands, direction):
+        for listener in self.listeners:
+            listener(step, commands, direction)
+
+    def records(self):
+        """ Done commands in order, as json-ready records. """
+        return [command.record() for step in self.done for command in step.commands]
+
+    @staticmethod
+    def replay(root, records):
+        """ Apply logged records to another jsonData, e.g. one freshly loaded from the saved file. """
+        for record in records:
+            EDIT_COMMAND.from_record(record).apply(root)
+        return root
+
+
+class SCHEME_JOURNAL(threading.Thread):
+    """ Append-only autosave of edits next to the scheme file, written by a background thread.
+
+    <scheme>.journal holds a header line stamping the base file (size, mtime)
+    and then one EDIT_COMMAND record per line. After idle_time without edits
+    the thread compacts: base plus journal are saved into the base file and
+    the journal starts over. Only files are touched here, never jsonData, so
+    nothing waits on the main thread and the main thread never waits on disk.
+    """
+
+    EXTENSION = '.journal'
+    VERSION = 1
+
+    def __init__(self, idle_time = 5.0):
+        super(SCHEME_JOURNAL,self).__init__(daemon = True)
+        self.idle_time = idle_time
+        self.queue = queue.Queue()
+        self.fileName = None
+        self.handle = None
+        # records written since the last compaction
+        self.pending = 0
+        self.error = None
+
+    @staticmethod
+    def path(fileName):
+        return fileName + SCHEME_JOURNAL.EXTENSION
+
+    @staticmethod
+    def stamp(fileName):
+        stat = os.stat(fileName)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def read(fileName):
+        """ Records journaled against fileName as it is on disk now; [] if none or stale. """
+        path = SCHEME_JOURNAL.path(fileName)
+        if not os.path.exists(path):
+            return []
+        records = []
+        with open(path, 'r') as handle:
+            try:
+                header = json.loads(handle.readline())
+            except ValueError:
+                return []
+            if header.get('journal') != SCHEME_JOURNAL.VERSION or header.get('stamp') != SCHEME_JOURNAL.stamp(fileName):
+                return []
+            for line in handle:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # a write cut short by the crash
+                    break
+        return records
+
+    def open(self, fileName):
+        """ Journal edits of the scheme loaded from fileName from now on. """
+        self.queue.put(('open', fileName))
+
+    def append(self, records):
+        if records:
+            self.queue.put(('append', records))
+
+    def save(self, fileName = None):
+        """ Write base plus journal into fileName (default: the base) in the background. """
+        self.queue.put(('save', fileName))
+
+    def close(self):
+        self.queue.put(('close', None))
+        self.join()
+
+    def run(self):
+        while True:
+            try:
+                operation, argument = self.queue.get(timeout = self.idle_time if self.pending else None)
+            except queue.Empty:
+                operation, argument = ('save', None)
+            try:
+                if operation == 'open':
+                    self.__close_handle()
+                    self.fileName = argument
+                    self.pending = len(SCHEME_JOURNAL.read(argument)) if os.path.exists(argument) else 0
+                elif operation == 'append':
+                    self.__write(argument)
+                elif operation == 'save':
+                    self.__compact(argument)
+                elif operation == 'close':
+                    self.__close_handle()
+                    return
+            except Exception as error:
+                self.error = error
+                print('journal', operation, 'failed:', error)
+
+    def __close_handle(self):
+        if self.handle != None:
+            self.handle.close()
+            self.handle = None
+
+    def __write(self, records):
+        if self.fileName == None:
+            return
+        if self.handle == None:
+            if self.pending:
+                self.handle = open(SCHEME_JOURNAL.path(self.fileName), 'a')
+            else:
+                self.handle = open(SCHEME_JOURNAL.path(self.fileName), 'w')
+                self.handle.write(json.dumps({'journal': SCHEME_JOURNAL.VERSION,
+                                              'stamp': SCHEME_JOURNAL.stamp(self.fileName)}) + '\n')
+        self.handle.write(''.join(json.dumps(record, separators = (',', ':')) + '\n' for record in records))
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+        self.pending += len(records)
+
+    def __compact(self, target):
+        if self.fileName == None:
+            return
+        if target == None:
+            target = self.fileName
+            if self.pending == 0:
+                return
+        self.__close_handle()
+        # loadScheme replays the journal onto the base
+        scheme = SCHEME()
+        scheme.loadScheme(self.fileName)
+        temporary = target + '.tmp'
+        scheme.saveScheme(temporary, binary = target.endswith(BINARY_SCHEME.EXTENSION))
+        os.replace(temporary, target)
+        # the records are in target now: replayed again they would edit the old
+        # base on its next load, or a target saved over before
+        for fileName in (self.fileName, target):
+            if os.path.exists(SCHEME_JOURNAL.path(fileName)):
+                os.remove(SCHEME_JOURNAL.path(fileName))
+        self.fileName = target
+        self.pending = 0
+
+
+class SCHEME_LOADER(threading.Thread):
+    """ Parses a scheme file and prepares component geometry on a worker thread.
+
+    Finished components are handed over in batches through a bounded queue;
+    None marks the end. The main thread owns everything pyglet.
+    """
+
+    def __init__(self, fileName, magnifier, batch_size = 64):
+        super(SCHEME_LOADER,self).__init__(daemon = True)
+        self.fileName = fileName
+        self.magnifier = magnifier
+        self.batch_size = batch_size
+        # a few batches of lookahead: past that the worker blocks and leaves the GIL to the UI
+        self.queue = queue.Queue(maxsize = 8)
+        self.scheme = SCHEME()
+        self.progress = 0.0
+        self.error = None
+        self.cancelled = False
+
+    def run(self):
+        components = self.scheme.iterScheme(self.fileName)
+        try:
+            batch = []
+            for component in components:
+                if self.cancelled:
+                    return
+                batch.append(component)
+                if len(batch) >= self.batch_size:
+                    self.hand_over(batch)
+                    batch = []
+                    self.progress = self.scheme.progress
+            if batch:
+                self.hand_over(batch)
+            self.progress = 1.0
+        except Exception as error:
+            self.error = error
+        finally:
+            # a cancelled load lets go of its file right away
+            components.close()
+            self.queue.put(None)
+
+    def hand_over(self, batch):
+        for component, geometry in zip(batch, COMPONENT_GEOMETRY.build(batch, self.magnifier)):
+            component['temp_geometry'] = geometry
+        self.queue.put(batch)
+
+    def document(self, components):
+        """ The loaded document in file order, once run() is done, holding components as its list.
+
+        A null or missing component list stays that way, as json.load would return it.
+        """
+        return {key: components if key == 'components' and isinstance(value, list) else value
+                for key, value in self.scheme.jsonData.items()}
+
+    def cancel(self):
+        self.cancelled = True
+        # unblock a worker waiting on a full queue
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+
 
 class HUD():
+    """ Toolbar of image buttons.
+
+    Images go to one texture atlas, so the whole bar is a single draw. Layout is
+    fixed when a button is added; scrolling moves the strip group, and only the
+    buttons entering or leaving hover are restyled.
+    """
 
     class BUTTON():
-        def __init__(self, owner_window, image, batch, camera, function, x, y):
-            self.owner_window = owner_window
-            self.batch = batch
-            self.camera = camera
+        def __init__(self, image, batch, group, function, x, y):
             self.function = function
-
-            #pyglet.resource.path = ['buttons']
-            #pyglet.resource.reindex()
-
-            self.image = pyglet.resource.image(image)
+            self.image = image
+            # position inside the strip, the strip group does the scrolling
+            self.x = x
+            self.y = y
             self.sprite = pyglet.sprite.Sprite(self.image,
                                   x=x,
                                   y=y,
-                                  batch = self.batch,
-                                  group = self.camera)
-            self.sprite.opacity = 128
-            self.sprite.anchor_x = self.sprite.image.width/2
-            self.sprite.visible = False
-
-
-
+                                  batch = batch,
+                                  group = group)
+            self.set_hover(False)
+
+        def set_hover(self, hover):
+            if hover:
+                self.sprite.scale = 1.1
+                self.sprite.opacity = 255
+                self.sprite.color = (255,255,255)
+            else:
+                self.sprite.scale = 1
+                self.sprite.opacity = 128
+                self.sprite.color = (200,200,200)
 
     def __init__(self, owner_window, batch, camera):
         self.buttons = []
+        self.starts = []
         self.batch = batch
         self.camera = camera
         self.owner_window = owner_window
         self.width = 0
         self.height = 0
+        self.hover = None
+        self.images = {}
+        self.atlas = pyglet.image.atlas.TextureBin(512, 512)
+        # drawn under the other hud items
+        self.strip = CameraGroup(owner_window, 0, 0, 1, order = -1, parent = camera)
+        self.strip.visible = False
+
+    def image(self, name):
+        """ Atlas region of a button image; every file is read once. """
+        region = self.images.get(name)
+        if region == None:
+            with self.owner_window.resources.file(name) as handle:
+                region = self.atlas.add(pyglet.image.load(name, file = handle))
+            self.images[name] = region
+        return region
 
     def add_button(self, image, function):
-        x = 0
-        for button in self.buttons:
-            x+=button.image.width
-        button = HUD.BUTTON(self.owner_window, image, self.batch, self.camera, function, x, 0)
+        button = HUD.BUTTON(self.image(image), self.batch, self.strip, function, self.width, 0)
+        self.starts.append(self.width)
 
         self.width+=button.image.width
         if self.height < button.image.height:
@@ -184,31 +3368,274 @@ class HUD():
 
         self.buttons.append(button)
 
+    def button_at(self, x, y):
+        """ Button under window point x,y, or None. """
+        if not self.strip.visible:
+            return None
+        x += self.strip.x
+        index = bisect.bisect_right(self.starts, x) - 1
+        if index < 0:
+            return None
+        button = self.buttons[index]
+        if x <= button.x+button.image.width and y >= button.y and y <= button.y+button.image.height:
+            return button
+        return None
+
+    def set_hover(self, button):
+        if button is self.hover:
+            return
+        if self.hover != None:
+            self.hover.set_hover(False)
+        if button != None:
+            button.set_hover(True)
+        self.hover = button
+
     def recalculate_hud(self, window_width, window_height, mouse_x, mouse_y):
-        def in_rect(x0,y0,x1,y1,x2,y2):
-            return x0>=x1 and x0<=x2 and y0>=y1 and y0<=y2
+        # the bar slides under the mouse so that every button can be reached
+        self.strip.x = -(window_width - self.width - 40) * mouse_x / window_width -20
+        self.set_hover(self.button_at(mouse_x, mouse_y))
 
-        x0 = -(window_width - self.width - 40) * mouse_x / window_width -20
+    def set_visible(self,visible):
+        self.strip.visible = visible
+        if not visible:
+            self.set_hover(None)
+
+    def click(self, x, y):
+        """ Run the function of the button under x,y; True if a button was hit. """
+        button = self.button_at(x, y)
+        if button == None:
+            return False
+        if button.function != None:
+            button.function()
+        return True
 
-        x = 0
-        for button in self.buttons:
-            button.sprite.x = x - x0
-            #button.sprite.update()
-            if in_rect(mouse_x, mouse_y, button.sprite.x,button.sprite.y,button.sprite.x+button.image.width,button.sprite.y+button.image.height):
-                button.sprite.scale = 1.1
-                button.sprite.opacity = 255
-                button.sprite.color = (255,255,255)
-            else:
-                button.sprite.scale = 1
-                button.sprite.opacity = 128
-                button.sprite.color = (200,200,200)
+class LIBRARY_BROWSER():
+    """ Paged part list over the hud; only the visible page is ever read from the library. """
 
-            x+=button.sprite.width
+    def __init__(self, library, batch, camera, rows = 20, row_height = 16, width = 260):
+        self.library = library
+        self.batch = batch
+        self.camera = camera
+        self.row_height = row_height
+        self.width = width
+        self.filter = ''
+        self.offset = 0
+        self.total = 0
+        self.page = []
+        self.visible = False
+        self.on_select = None
+
+        self.background = shapes.Rectangle(0, 0, width, (rows+1)*row_height+8, color=(20,20,20,230),
+                                           batch = self.batch, group = self.camera)
+        self.title = pyglet.text.Label('', font_name='Segoe UI', bold="bold", font_size=10,
+                                       color=(255,255,255,255), batch = self.batch, group = self.camera)
+        self.rows = []
+        for i in range(rows):
+            self.rows.append(pyglet.text.Label('', font_name='Segoe UI', font_size=9,
+                                               color=(200,200,200,255), batch = self.batch, group = self.camera))
+        self.set_visible(False)
+
+    def set_visible(self, visible):
+        self.visible = visible
+        self.background.visible = visible
+        self.title.visible = visible
+        for row in self.rows:
+            row.visible = visible
+
+    def open(self, on_select):
+        self.on_select = on_select
+        self.offset = 0
+        self.refresh()
+        self.set_visible(True)
+
+    def close(self):
+        self.set_visible(False)
+
+    def layout(self, window_width, window_height):
+        x = 10
+        top = window_height - 30
+        self.background.x = x - 4
+        self.background.y = top - self.background.height + self.row_height
+        self.title.x = x
+        self.title.y = top
+        for i, row in enumerate(self.rows):
+            row.x = x
+            row.y = top - (i+1)*self.row_height
+
+    def refresh(self):
+        self.total = self.library.countParts(self.filter)
+        self.page = self.library.findParts(self.filter, offset = self.offset, limit = len(self.rows))
+        last = min(self.offset+len(self.page), self.total)
+        self.title.text = 'parts: ' + self.filter + '_   ' + str(self.offset+1 if self.page else 0) + \
+                          '-' + str(last) + ' / ' + str(self.total)
+        for i, row in enumerate(self.rows):
+            if i < len(self.page):
+                name, group, customGroup = self.page[i]
+                row.text = name + ('   [' + customGroup + ']' if customGroup else '')
+            else:
+                row.text = ''
+
+    def type(self, text):
+        if text.isprintable():
+            self.filter += text
+            self.offset = 0
+            self.refresh()
+
+    def backspace(self):
+        if self.filter:
+            self.filter = self.filter[:-1]
+            self.offset = 0
+            self.refresh()
+
+    def scroll(self, steps):
+        offset = max(0, min(self.offset + steps*len(self.rows)//4, self.total - len(self.rows)))
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+
+    def contains(self, x, y):
+        return x >= self.background.x and x <= self.background.x+self.background.width and \
+               y >= self.background.y and y <= self.background.y+self.background.height
+
+    def click(self, x, y):
+        """ Pick the part under x,y; a click outside closes the browser. """
+        if not self.contains(x, y):
+            self.close()
+            return
+        for i, row in enumerate(self.rows):
+            if i < len(self.page) and y >= row.y - 4 and y < row.y - 4 + self.row_height:
+                self.close()
+                if self.on_select != None:
+                    self.on_select(self.page[i][0])
+                return
+
+class PROFILER:
+    """ Opt-in timing of hot methods, shown in a HUD overlay and exported as a chrome trace.
+
+    While enabled, each watched method is shadowed by a timing wrapper stored
+    as an instance attribute; disabling deletes those attributes again, so
+    when off the original bound methods run with no added cost at all.
+    Handlers named on_* are events: they also record how many more memory
+    blocks the interpreter held after they ran than before, i.e. the blocks
+    they retained net of what they freed, not every allocation they made.
+    """
 
+    def __init__(self, window, batch, group, frames = 600, events = 50000):
+        self.window = window
+        self.enabled = False
+        self.targets = []
+        self.counters = []
+        self.frames = deque(maxlen = frames)
+        self.events = deque(maxlen = events)
+        self.phases = {}
+        self.retained = {}
+        self.origin = time.perf_counter()
+        self.label = pyglet.text.Label('', font_name='Consolas', font_size=9, multiline=True, width=420,
+                                       color=(255,255,0,230), anchor_y='top',
+                                       batch = batch, group = group)
+        self.label.visible = False
+
+    def watch(self, owner, name, phase = None):
+        """ Time owner.name under phase (default: the name) whenever profiling is on. """
+        self.targets.append((owner, name, phase or name))
+
+    def count(self, name, function):
+        """ Add a line 'name: function()' to the overlay; evaluated only when it refreshes. """
+        self.counters.append((name, function))
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.frames.clear()
+        self.phases = {}
+        self.retained = {}
+        for owner, name, phase in self.targets:
+            setattr(owner, name, self.__wrap(getattr(owner, name), phase, name.startswith('on_')))
+        self.label.visible = True
+        pyglet.clock.schedule_interval(self.refresh, 0.25)
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        for owner, name, phase in self.targets:
+            # drop the wrapper, the class method shows through again
+            delattr(owner, name)
+        self.label.visible = False
+        pyglet.clock.unschedule(self.refresh)
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def __wrap(self, method, phase, event):
+        record = self.record
+
+        def timed(*args, **kwargs):
+            blocks = sys.getallocatedblocks() if event else 0
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record(phase, start, time.perf_counter(), sys.getallocatedblocks() - blocks if event else None)
+        return timed
+
+    def record(self, phase, start, end, retained = None):
+        self.events.append((phase, start, end))
+        self.phases[phase] = self.phases.get(phase, 0) + end - start
+        if retained != None:
+            calls, blocks = self.retained.get(phase, (0, 0))
+            self.retained[phase] = (calls + 1, blocks + retained)
+        if phase == 'on_draw':
+            # a frame ends with its draw
+            self.frames.append((end, self.phases))
+            self.phases = {}
+
+    @staticmethod
+    def batch_counts(batch):
+        """ (groups, domains, vertices) allocated in a pyglet batch. """
+        domains = [domain for domain_map in batch.group_map.values() for domain in domain_map.values()]
+        return (len(batch.group_map), len(domains), sum(sum(domain.allocator.sizes) for domain in domains))
+
+    def refresh(self, dt = 0):
+        frames = list(self.frames)
+        lines = []
+        if len(frames) > 1:
+            span = frames[-1][0] - frames[0][0]
+            lines.append('fps %.1f   frame %.2f ms' % ((len(frames)-1)/span if span > 0 else 0,
+                                                      1000*span/(len(frames)-1)))
+            totals = {}
+            worst = {}
+            for end, phases in frames:
+                for phase, seconds in phases.items():
+                    totals[phase] = totals.get(phase, 0) + seconds
+                    worst[phase] = max(worst.get(phase, 0), seconds)
+            lines.append('phase                    avg ms   max ms')
+            for phase in sorted(totals, key = totals.get, reverse = True):
+                lines.append('%-24s %7.3f  %7.3f' % (phase, 1000*totals[phase]/len(frames), 1000*worst[phase]))
+        if self.retained:
+            lines.append('event            calls  net blocks retained/call')
+            for phase, (calls, blocks) in sorted(self.retained.items()):
+                lines.append('%-16s %6d  %10.1f' % (phase, calls, blocks/calls))
+        for name, function in self.counters:
+            lines.append('%s: %s' % (name, function()))
+        self.label.text = '\n'.join(lines)
+        self.label.x = 10
+        self.label.y = self.window.height - 40
+        self.window.invalidate()
+
+    def export(self, fileName):
+        """ Write the recorded calls as a chrome://tracing / Perfetto json trace. """
+        trace = [{'name': phase, 'ph': 'X', 'pid': 1, 'tid': 1,
+                  'ts': (start - self.origin)*1e6, 'dur': (end - start)*1e6}
+                 for phase, start, end in self.events]
+        with open(fileName, 'w') as handle:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, handle)
+        return len(trace)
 
-    def set_visible(self,visible):
-        for button in self.buttons:
-            button.sprite.visible = visible
 
 class FEETCAD(pyglet.window.Window):
 
@@ -217,26 +3644,48 @@ class FEETCAD(pyglet.window.Window):
         config.sample_buffers = 1
         config.samples = 1
         super(FEETCAD,self).__init__(720, 480, "FEETCAD",config=config,resizable=True,style=pyglet.window.Window.WINDOW_STYLE_DEFAULT)
+        STARTUP.mark('window')
+        self.startup_cache = STARTUP_CACHE(CACHE_FILE)
+        self.startup_cache.load()
+        self.resources = RESOURCES(self.startup_cache, HOME, ['buttons'])
+        # schematic fonts shipped with the program, registered once before any label
+        if os.path.isdir(os.path.join(HOME, 'fonts')):
+            pyglet.font.add_directory(os.path.join(HOME, 'fonts'))
+        self.__preload_fonts = [tuple(font) for font in self.startup_cache.get('fonts', [])]
         self.time = 0
+        # input handlers only record what changed, update_state does the work once per frame
+        self.dirty = set()
+        self.frame_interval = 1/60
+        self.__frame_pending = False
+        self.__last_frame = 0
+        self.__mouse = (0, 0)
+        self.__pan = [0, 0]
+        self.__zoom_steps = 0
+        self.__zoom_anchor = (0, 0)
         self.__grid_batch = pyglet.graphics.Batch()
-        self.circle = shapes.Circle(360, 240, 75, color=(255, 225, 255, 250))
         self.scheme = SCHEME()
         self.batch = pyglet.graphics.Batch()
+        # components go to their own batch, so it can be rendered into cached tiles
+        self.sheet_batch = pyglet.graphics.Batch()
         self.camera = CenteredCameraGroup(self,0,0,1)
+        self.tile_cache = TILE_CACHE(self, self.camera)
         self.camera_hud = CameraGroup(self,0,0,1)
+        # selection and hovered nets are tinted over the sheet, so neither re-renders cached tiles
+        self.selection_batch = pyglet.graphics.Batch()
+        self.selection_group = TINT_GROUP(self.selection_batch, (255,60,60,255), order = 1, parent = self.camera)
+        self.selection = {}
+        # window corners of a left drag in progress, and the selection it adds to
+        self.__band = None
+        self.__band_base = {}
+        self.band_threshold = 4
         self.__clickTime = time.time()
 
-        self.__grid_shapes_big = []
-        self.__grid_shapes_small = []
-
         self.__grid_visible = False
-        self.__last_grid_state = True
 
         self.magnifier = 10.0
 
         self.grid_width = 2
         self.grid_step = 1
-        self.grid_steps = 60
         self.grid_min_cell_width = 20
         self.grid_zoom_step = 10
         self.grid_zero_color = color=(255,255,255,150)
@@ -244,19 +3693,65 @@ class FEETCAD(pyglet.window.Window):
         self.grid_middle_color = color=(255,255,255,50)
         self.grid_secondary_color = color=(255,255,255,25)
 
-        self.under_mouse_shapes = []
+        self.hit_tolerance = 0.5
+        self.spatial_index = SPATIAL_INDEX(cell_size = 20*self.magnifier)
+        self.scene_items = {}
+        self.netlist = NETLIST()
+        # hover also tints the wires on the nets of the hovered components
+        self.net_color = (0,200,255,255)
+        self.net_tint = TINT_GROUP(self.selection_batch, self.net_color, parent = self.camera)
+        self.__net_version = None
+        self.tile_grid = TILE_GRID(self.camera, tile_size = 64*self.magnifier)
+        # labels smaller than this on screen (pixels) become bars, then disappear
+        self.label_bar_px = 6
+        self.label_hide_px = 1.5
+        self.__label_levels = {}
+        self.label_sizes = set()
+        self.label_cache = LABEL_CACHE()
+        # components get pyglet objects only once they come into view
+        self.lazy_shapes = True
+        self.view_margin = 20*self.magnifier
+        # components referencing a library part share one instanced symbol
+        self.library = LIBRARY()
+        self.symbols = SYMBOL_RENDERER(self.magnifier)
+        self.library.listeners.append(self.on_library_change)
+        self.library_browser = LIBRARY_BROWSER(self.library, self.batch, self.camera_hud)
+
+        # every edit of jsonData goes through here, see edit_step
+        self.history = EDIT_HISTORY(self.scheme)
+        self.history.listeners.append(self.on_history_change)
+        self.journal = SCHEME_JOURNAL()
+        self.journal.start()
+        self.journal_file = None
+        self.nudge_step = 1
+
+        # background scheme loading, see streamScheme
+        self.loader = None
+        self.load_progress_frame = shapes.Rectangle(0, 0, 200, 8, color=(255,255,255,60), batch = self.batch, group = self.camera_hud)
+        self.load_progress_bar = shapes.Rectangle(0, 0, 1, 8, color=(171,0,247,200), batch = self.batch, group = self.camera_hud)
+        self.load_progress_label = pyglet.text.Label('', font_name='Segoe UI', font_size=9, color=(255,255,255,200),
+                                                     batch = self.batch, group = self.camera_hud)
+        self.set_load_progress(None)
 
         self.zoom_step = 5
+        # seconds a scroll step and a view reset glide, 0 jumps
+        self.zoom_time = 0.12
+        self.view_time = 0.3
         self.cursor = shapes.Circle(20, 20, 2, color=(255,255,255,50), batch = self.batch, group = self.camera)
+        self.band = shapes.BorderedRectangle(0, 0, 1, 1, border = 1, color = (40,70,130,80),
+                                             border_color = (120,180,255,80), batch = self.batch, group = self.camera_hud)
+        self.band.visible = False
 
 
         self.generate_grid()
 
         self.hilighted_components = []
+        self.hilight_color = (255,0,0,255)
 
         self.in_macro_edit = None
+        # alpha of every other component while one is in macro edit
+        self.macro_dim_alpha = 20
 
-        self.miny,self.minx,self.maxy,self.maxx = (100,100,-100,-100)
 
         self.toggle_grid()
 
@@ -274,7 +3769,7 @@ class FEETCAD(pyglet.window.Window):
         self.hud_macro.add_button('buttons/macro_circle.png',self.do_macro_create_line())
         self.hud_macro.add_button('buttons/macro_from_file.png',self.do_macro_create_line())
         self.hud_macro.add_button('buttons/macro_to_file.png',self.do_macro_create_line())
-        self.hud_macro.add_button('buttons/macro_from_db.png',self.do_macro_create_line())
+        self.hud_macro.add_button('buttons/macro_from_db.png',self.browse_library)
         for j in range(8):
 
             self.hud_macro.add_button('buttons/macro_line.png',self.do_macro_create_line())
@@ -283,29 +3778,123 @@ class FEETCAD(pyglet.window.Window):
 
         self.fps = pyglet.window.FPSDisplay(window=self)
 
+        # F3 toggles the overlay, ctrl+F3 writes a trace
+        self.profiler = PROFILER(self, self.batch, self.camera_hud)
+        for name in ('on_draw', 'update_state', 'on_mouse_motion', 'on_mouse_scroll', 'on_mouse_drag', 'on_mouse_press',
+                     'on_key_press', 'recalculate_grid', 'check_mouse_onshape', 'loadShapesFromJson',
+                     'materialize_visible', 'update_culling', 'update_label_lod'):
+            self.profiler.watch(self, name)
+        self.profiler.watch(self.hud_macro, 'recalculate_hud', 'HUD.recalculate_hud')
+        self.profiler.watch(self.__grid_batch, 'draw', 'grid.draw')
+        self.profiler.watch(self.symbols, 'draw', 'symbols.draw')
+        self.profiler.watch(self.sheet_batch, 'draw', 'sheet.draw')
+        self.profiler.watch(self.tile_cache, 'draw', 'tiles.draw')
+        self.profiler.watch(self.batch, 'draw', 'batch.draw')
+        self.profiler.count('batch groups/domains/vertices', lambda: PROFILER.batch_counts(self.sheet_batch))
+        self.profiler.count('cached tiles', lambda: len(self.tile_cache.tiles))
+        self.profiler.count('nets', lambda: len(self.netlist.members))
+        self.profiler.count('selected', lambda: len(self.selection))
+        self.profiler.count('components/built', lambda: (len(self.scheme.jsonData.get('components') or [])
+                                                         if self.scheme.jsonData != None else 0, len(self.scene_items)))
+        self.profiler.count('pyglet objects', lambda: sum(len(component['temp_shapes'].shapes)
+                                                          for component in self.scene_items.values()))
+        self.profiler.count('symbol instances', self.symbols.count)
+        self.profiler.count('label cache hit rate', lambda: '%.1f%%' % (self.label_cache.hit_rate()*100))
+        STARTUP.mark('editor')
+
+    def preload_fonts(self, dt = 0):
+        """ Render the fonts the last session used, one per call, in between frames. """
+        if self.__preload_fonts:
+            font_name, font_size = self.__preload_fonts.pop(0)
+            self.label_cache.font(font_name, font_size)
+        if self.__preload_fonts:
+            pyglet.clock.schedule_once(self.preload_fonts, 0)
+
     def do_macro_create_line(self):
         pass
 
+    def browse_library(self):
+        self.library_browser.layout(self.width, self.height)
+        self.library_browser.open(self.place_library_part)
+
+    def place_library_part(self, name):
+        """ Make the component in macro edit a copy of the library part. """
+        part = self.library.getPart(name)
+        if part == None or self.in_macro_edit == None:
+            return
+        index = self.component_index(self.in_macro_edit)
+        self.history.begin('from library')
+        self.history.set(['components', index, 'referenceTo'], name)
+        self.history.set(['components', index, 'shapes'], copy.deepcopy(part.get('shapes', [])))
+        self.history.end()
+
+    def component_index(self, component):
+        for index, candidate in enumerate(self.scheme.jsonData['components']):
+            if candidate is component:
+                return index
+        return None
+
+    def component_indices(self):
+        """ {id(component): index} from one pass over the list, for edits touching many components. """
+        return {id(component): index for index, component in enumerate(self.scheme.jsonData['components'])}
+
+    def nudge_components(self, dx, dy):
+        """ Move the edited, selected or else hovered components; a run of nudges undoes as one step. """
+        if self.in_macro_edit != None:
+            targets = [self.in_macro_edit]
+        else:
+            targets = list(self.selection.values()) or list(self.hilighted_components)
+        if len(targets) == 0:
+            return
+        self.history.begin('nudge', merge = ('nudge',) + tuple(id(component) for component in targets))
+        indices = self.component_indices()
+        for component in targets:
+            index = indices[id(component)]
+            self.history.set(['components', index, 'x'], component['x'] + dx)
+            self.history.set(['components', index, 'y'], component['y'] + dy)
+        self.history.end()
+
+    def on_history_change(self, step, commands, direction):
+        """ Journal an edit, undo or redo and rebuild what it touched. """
+        if direction < 0:
+            commands = [command.inverse() for command in reversed(commands)]
+        self.follow_journal()
+        self.journal.append([command.record() for command in commands])
+
+        components = step.components(self.scheme.jsonData)
+        # selected boxes follow the edit
+        self.invalidate('selection')
+        if components == None:
+            # components were added or removed: the full pass syncs the scene
+            self.loadShapesFromJson()
+            return
+        seen = set()
+        for component in components:
+            if id(component) not in seen:
+                seen.add(id(component))
+                self.invalidate_component(component)
+        if self.in_macro_edit != None:
+            self.recalculate_grid()
+        self.update_culling()
+
 
 
     def check_for_macro_edit(self, enter_to_edit = True):
+        # macro edit dims the sheet and is drawn live
+        self.tile_cache.clear()
         if enter_to_edit:
             if len(self.hilighted_components) == 1:
                 self.in_macro_edit = self.hilighted_components[0]
+                self.set_hilighted_components([])
 
-                if 'components' in self.scheme.jsonData:
-                    for component in self.scheme.jsonData['components']:
-
-                        for shape in component['temp_shapes'].shapes:
-                            color = shape.color
-                            if len(color) == 4:
-                                shape.color = (color[0],color[1],color[2],20)
+                # resyncing dims what is built, the rest is dimmed when it gets built
+                for component in list(self.scene_items.values()):
+                    if component is not self.in_macro_edit:
+                        self.loadShapesFromJson(component)
 
                 self.hud_macro.set_visible(True)
-                self.loadShapesFromJson(self.hilighted_components[0],macro_mode = True)
-                print("self.in_macro_edit['x'],self.in_macro_edit[y]",self.in_macro_edit['x'],self.in_macro_edit['y'])
+                self.loadShapesFromJson(self.in_macro_edit,macro_mode = True)
         else:
-            print('exiting macro edit')
             self.in_macro_edit = None
             self.loadShapesFromJson()
             self.hud_macro.set_visible(False)
@@ -316,125 +3905,49 @@ class FEETCAD(pyglet.window.Window):
         self.recalculate_grid()
 
     def generate_grid(self):
-        vert = []
-        horz = []
-        for x in range(0,self.grid_steps):
-            grid_line = shapes.Rectangle(x*self.grid_step, -200000, self.grid_width, 400000,  color=(255,255,255,50), batch = self.batch, group = self.camera)
-            vert.append(grid_line)
-        for y in range(0,self.grid_steps):
-            grid_line = shapes.Rectangle(-200000, y*self.grid_step, 400000, self.grid_width,  color=(255,255,255,50), batch = self.batch, group = self.camera)
-            horz.append(grid_line)
-
-        self.__grid_shapes_big.append(horz)
-        self.__grid_shapes_big.append(vert)
-        print(self.__grid_shapes_big)
+        self.grid_group = GRID_GROUP(self, self.camera)
+        self.grid_group.visible = self.__grid_visible
+        self.__grid_quad = self.grid_group.program.vertex_list_indexed(4, gl.GL_TRIANGLES, [0,1,2,0,2,3],
+                                    batch = self.__grid_batch, group = self.grid_group,
+                                    position = ('f', (-1,-1, 1,-1, 1,1, -1,1)))
 
     def recalculate_grid(self):
-        if not self.__last_grid_state and not self.__grid_visible:
+        if not self.__grid_visible:
             return
 
-        newx = self.camera.x
-        newy = self.camera.y
-
         cell_width = self.grid_step*self.camera.zoom/self.magnifier
         #print('cell width',cell_width)
         #normal: between 10 and 100
         zoom_factor = 1
-        cnt = 1
 
         while cell_width < self.grid_min_cell_width:
             zoom_factor = zoom_factor*self.grid_zoom_step
             cell_width = self.grid_step*self.camera.zoom*zoom_factor
 
-        cell_width = self.grid_step*self.camera.zoom*zoom_factor
         #print('zoom_factor',zoom_factor)
-        #print('new cell width',cell_width)
-
-        middlex = (self.grid_steps*self.grid_step*zoom_factor)/2
-        if self.in_macro_edit != None:
-            middlex+=self.in_macro_edit['x']*self.magnifier
 
-        middley = (self.grid_steps*self.grid_step*zoom_factor)/2
+        origin = (0, 0)
         if self.in_macro_edit != None:
-            middley+=self.in_macro_edit['y']*self.magnifier
-
-        #vertical lines
-        x = 0
-        for line in self.__grid_shapes_big[1]:
-            line.x = x*self.grid_step*zoom_factor-middlex+self.camera.x-self.camera.x%(zoom_factor*self.grid_step)
-
-            if line.x  == 0:
-                line.color = self.grid_zero_color
-            elif line.x % (self.grid_zoom_step*zoom_factor) == 0:
-                line.color = self.grid_primary_color
-            elif line.x % (self.grid_zoom_step/2*zoom_factor) == 0:
-                line.color = self.grid_middle_color
-            else:
-                line.color = self.grid_secondary_color
-
-            line.width = self.grid_width/self.camera.zoom
-            line.x-=line.width/2
-            if self.in_macro_edit != None:
-                line.x+=self.in_macro_edit['x']*self.magnifier
-
-
-            x+=1
-
-            if not self.__grid_visible:
-                line.x+=1000000
-
-        #horizontal lines
-        y = 0
-        for line in self.__grid_shapes_big[0]:
-            line.y = y*self.grid_step*zoom_factor-middley+self.camera.y-self.camera.y%(zoom_factor*self.grid_step)
-
-            if line.y  == 0:
-                line.color = self.grid_zero_color
-            elif line.y % (self.grid_zoom_step*zoom_factor) == 0:
-                line.color = self.grid_primary_color
-            elif line.y % (self.grid_zoom_step/2*zoom_factor) == 0:
-                line.color = self.grid_middle_color
-            else:
-                line.color = self.grid_secondary_color
-
-            line.height = self.grid_width/self.camera.zoom
-            line.y-=line.height/2
-            if self.in_macro_edit != None:
-                line.y+=self.in_macro_edit['y']*self.magnifier
-
-            y+=1
-
-            if not self.__grid_visible:
-                line.y+=1000000
-
-        self.__last_grid_state = self.__grid_visible
-
-        #print('grid_recalculate after','newx newy',newx,newy)
-        #0.8 and 8
-
-
+            origin = (self.in_macro_edit['x']*self.magnifier, self.in_macro_edit['y']*self.magnifier)
 
+        # camera offset and zoom are read by the grid group itself on every draw
+        self.grid_group.set_style(self.grid_step*zoom_factor, origin, self.grid_zoom_step, self.grid_width,
+                                  self.grid_zero_color, self.grid_primary_color,
+                                  self.grid_middle_color, self.grid_secondary_color)
 
     def toggle_grid(self):
         self.__grid_visible = not self.__grid_visible
+        self.grid_group.visible = self.__grid_visible
         self.recalculate_grid()
-        print('grid',self.__grid_visible)
 
-    def redraw(self):
-        self.clearScheme()
-        self.loadShapesFromJson()
-
-    def reset_view(self):
+    def reset_view(self, animate = False):
         #calc zoom
         #WITH BORDER 20PX
 
-        maxx = self.maxx
-        minx = self.minx
-        maxy = self.maxy
-        miny = self.miny
-
-        if self.in_macro_edit != None:
-            minx,miny,maxx,maxy = self.loadShapesFromJson(self.in_macro_edit, onlyBounds = True)
+        bounds = self.world_bounds()
+        if bounds == None:
+            return
+        minx,miny,maxx,maxy = bounds
 
         scheme_width = maxx - minx+20
         scheme_height = maxy - miny+20
@@ -448,91 +3961,314 @@ class FEETCAD(pyglet.window.Window):
             max_dim_window = self.height
 
         zoom = max_dim_window/max_dim_scheme
+        if animate and self.view_time > 0:
+            self.animate_camera(minx+(maxx-minx)/2, miny+(maxy-miny)/2, zoom, self.view_time)
+            return
+        self.camera.stop()
         self.camera.zoom=zoom
         self.camera.x = minx+(maxx-minx)/2
         self.camera.y = miny+(maxy-miny)/2
         self.recalculate_grid()
+        self.update_label_lod()
+        self.materialize_visible()
+        self.invalidate()
+
+    def animate_camera(self, x, y, zoom, duration):
+        """ Glide the camera to x, y, zoom.
+
+        Everything the glide will show is built and unculled here, once; the frames
+        in between only move the view matrix, the grid and LOD follow at the end.
+        """
+        now = self.camera.view_rect(self.view_margin)
+        then = self.camera.rect_at(x, y, zoom, self.view_margin)
+        self.materialize_visible((min(now[0], then[0]), min(now[1], then[1]),
+                                  max(now[2], then[2]), max(now[3], then[3])))
+        self.camera.animate(x, y, zoom, duration, time.perf_counter())
+        self.invalidate()
+
+    def invalidate(self, *parts):
+        """ Mark parts of the frame state dirty and schedule one redraw for them. """
+        self.dirty.update(parts)
+        if self.__frame_pending:
+            return
+        self.__frame_pending = True
+        delay = max(0.0, self.__last_frame + self.frame_interval - time.perf_counter())
+        pyglet.clock.schedule_once(self.__frame, delay)
+
+    def __frame(self, dt):
+        self.__frame_pending = False
+        self.switch_to()
+        self.dispatch_event('on_draw')
+        self.flip()
+        STARTUP.mark_once('first frame')
+
+    def update_state(self):
+        """ Apply the input coalesced since the last frame and redo what it dirtied. """
+        if self.__pan != [0, 0]:
+            # dragging takes the camera over from a glide
+            self.camera.stop()
+            self.camera.x -= self.__pan[0]/self.camera.zoom
+            self.camera.y -= self.__pan[1]/self.camera.zoom
+            self.__pan = [0, 0]
+            self.dirty.add('camera')
+        if self.__zoom_steps != 0:
+            # steps stack on where a running glide is heading
+            x, y, zoom = self.camera.target()
+            while self.__zoom_steps != 0:
+                direction = 1 if self.__zoom_steps > 0 else -1
+                x, y, zoom = self.zoom_at(x, y, zoom, self.__zoom_anchor[0], self.__zoom_anchor[1], direction)
+                self.__zoom_steps -= direction
+            if self.zoom_time > 0:
+                self.animate_camera(x, y, zoom, self.zoom_time)
+            else:
+                self.camera.x, self.camera.y, self.camera.zoom = x, y, zoom
+                self.dirty.add('camera')
+        if self.camera.animation != None:
+            if self.camera.advance(time.perf_counter()):
+                self.invalidate()
+            else:
+                # landed: now the grid, LOD and culling catch up
+                self.dirty.add('camera')
 
-    def on_mouse_motion(self, x, y, dx, dy):
-        self.cursor.x = (-self.width/2+x)/self.camera.zoom+self.camera.x
-        self.cursor.y = (-self.height/2+y)/self.camera.zoom+self.camera.y
-        #print("mouse on canvas: x,y:",self.cursor.x,self.cursor.y)
-        #print('len(self.hilighted_components)',len(self.hilighted_components));
-        if self.in_macro_edit == None:
-            selected = self.check_mouse_onshape(self.cursor.x, self.cursor.y)
-            #print(selected)
+        if 'camera' in self.dirty:
+            self.recalculate_grid()
+            self.update_label_lod()
+            self.materialize_visible()
+            # the sheet moved under the mouse
+            self.dirty.add('hover')
+
+        if 'hover' in self.dirty:
+            x, y = self.__mouse
+            self.cursor.x = (-self.width/2+x)/self.camera.zoom+self.camera.x
+            self.cursor.y = (-self.height/2+y)/self.camera.zoom+self.camera.y
+            if self.in_macro_edit == None:
+                self.set_hilighted_components(self.check_mouse_onshape(self.cursor.x, self.cursor.y))
+            else:
+                self.hud_macro.recalculate_hud(self.width, self.height, x, y)
+
+        if 'band' in self.dirty and self.__band != None:
+            x1, y1, x2, y2 = self.__band
+            self.band.visible = True
+            self.band.position = (min(x1, x2), min(y1, y2))
+            self.band.width = max(abs(x2-x1), 1)
+            self.band.height = max(abs(y2-y1), 1)
+            self.select_band(x1, y1, x2, y2)
+
+        if 'selection' in self.dirty:
+            self.update_selection()
+        if self.netlist.version != self.__net_version:
+            # edits and loading changed the nets under the hover
+            self.hilight_nets(self.hilighted_components)
+        self.dirty.clear()
+
+    def window_to_world(self, x, y):
+        return ((-self.width/2+x)/self.camera.zoom+self.camera.x,
+                (-self.height/2+y)/self.camera.zoom+self.camera.y)
+
+    def select_band(self, x1, y1, x2, y2):
+        """ Select by a window rectangle on top of the selection the drag started from.
+
+        Dragged to the right it takes the components inside the box, to the left
+        also those it only crosses.
+        """
+        minx, miny = self.window_to_world(min(x1, x2), min(y1, y2))
+        maxx, maxy = self.window_to_world(max(x1, x2), max(y1, y2))
+        selection = dict(self.__band_base)
+        for component in self.spatial_index.query_rect(minx, miny, maxx, maxy):
+            key = id(component)
+            if x2 > x1:
+                bounds = self.spatial_index.bounds(key)
+                if bounds[0] < minx or bounds[1] < miny or bounds[2] > maxx or bounds[3] > maxy:
+                    continue
+            selection[key] = component
+        self.set_selection(selection)
+
+    def set_selection(self, selection):
+        """ Replace the selected components, a dict keyed by id(component). """
+        self.selection = selection
+        self.invalidate('selection')
+
+    def update_selection(self):
+        """ Tint the geometry of the selected components; deleted components leave the selection. """
+        kinds = []
+        points = []
+        widths = []
+        unbuilt = []
+        for key, component in list(self.selection.items()):
+            if self.spatial_index.bounds(key) == None:
+                del self.selection[key]
+                continue
+            item = component.get('temp_shapes')
+            if isinstance(item, SCHEME_DRAW_ITEM) and item.geometry != None:
+                kinds.append(item.geometry.kinds)
+                points.append(item.geometry.points)
+                widths.append(item.geometry.widths)
+            else:
+                unbuilt.append(component)
+        if unbuilt:
+            parts = [self.library.getPart(component['referenceTo']) if component.get('referenceTo') != None else None
+                     for component in unbuilt]
+            columns = COMPONENT_GEOMETRY.columns(unbuilt, self.magnifier, parts)
+            kinds.append(columns[0])
+            points.append(columns[1])
+            widths.append(columns[2])
+        if kinds:
+            self.selection_group.set_geometry(np.concatenate(kinds), np.concatenate(points), np.concatenate(widths))
+        else:
+            self.selection_group.set_geometry([], [], [])
 
-            for component in self.hilighted_components:
-                #print('last',component['name'])
-                self.loadShapesFromJson(component)
+    def on_mouse_motion(self, x, y, dx, dy):
+        self.__mouse = (x, y)
+        self.invalidate('hover')
 
-            if len(selected) > 0:
-                for component in selected:
-                    #print('new',selected)
-                    for shape in component['temp_shapes'].shapes:
-                        shape.color = [255,0,0,255]
 
-            self.hilighted_components = selected
-        else:
-            self.hud_macro.recalculate_hud(self.width, self.height, x, y)
 
+    def set_hilighted_components(self, selected):
+        """ Swap the hover highlight; only components entering or leaving the set are touched. """
+        previous = self.hilighted_components
+        if len(previous) == len(selected) and all(any(a is b for b in previous) for a in selected):
+            return
 
+        for component in previous:
+            if not any(component is c for c in selected):
+                item = component.get('temp_shapes')
+                if isinstance(item, SCHEME_DRAW_ITEM):
+                    item.set_highlight(None)
+                    self.tile_cache.invalidate(item.bounds)
+
+        for component in selected:
+            item = component.get('temp_shapes')
+            if isinstance(item, SCHEME_DRAW_ITEM) and item.highlight != self.hilight_color:
+                item.set_highlight(self.hilight_color)
+                self.tile_cache.invalidate(item.bounds)
+
+        self.hilighted_components = selected
+        self.hilight_nets(selected)
+
+    def hilight_nets(self, selected):
+        """ Tint the wires connected to the selected components, they keep their own highlight.
+
+        The wires come from the netlist, so they are tinted whether or not their shapes are built.
+        """
+        hovered = set(id(component) for component in selected)
+        nets = set()
+        for key in hovered:
+            nets |= self.netlist.component_nets(key)
+        wires = [node for net in nets for node in self.netlist.members[net]
+                 if node[1] == 'shape' and node[0] not in hovered]
+        ends = self.netlist.ends
+        points = [value for node in wires for end in ends[node] for value in end]
+        widths = [self.netlist.widths[node] for node in wires]
+        self.net_tint.set_geometry(np.full(len(wires), COMPONENT_GEOMETRY.LINE),
+                                   np.array(points, dtype = np.float64).reshape(-1, 4)*self.magnifier,
+                                   np.array(widths, dtype = np.float64)*self.magnifier)
+        self.__net_version = self.netlist.version
+
+    def update_net(self, component):
+        """ Reconnect one component after it was loaded, moved or edited. """
+        part = None
+        if component.get('referenceTo') != None:
+            part = self.library.getPart(component['referenceTo'])
+        self.netlist.update(id(component), component, part)
+
+    def export_netlist(self, fileName):
+        """ Write the nets that connect pins as json, returns how many there are. """
+        data = self.netlist.export()
+        with open(fileName, 'w') as f:
+            json.dump(data, f, indent = 1)
+        return len(data['nets'])
 
     def on_mouse_scroll(self, x, y, scroll_x, scroll_y):
+        if self.library_browser.visible and self.library_browser.contains(x, y):
+            self.library_browser.scroll(-int(scroll_y))
+            self.invalidate()
+            return
+        self.__mouse = (x, y)
+        self.__zoom_anchor = (x, y)
+        self.__zoom_steps += 1 if scroll_y > 0 else -1
+        self.invalidate('camera')
+
+    def zoom_at(self, camera_x, camera_y, zoom, x, y, direction):
+        """ Camera x, y, zoom after one zoom step in (direction 1) or out (-1) at window point x,y. """
         dx = (self.width/2-x)
         dy = (self.height/2-y)
-        print('dx,dy',dx,dy)
 
-        if scroll_y > 0:
+        if direction > 0:
             #dx = (self.width/2-x)/self.camera.zoom)
-            newzoom = self.camera.zoom + self.camera.zoom/self.zoom_step
-            self.camera.zoom=newzoom
+            newzoom = zoom + zoom/self.zoom_step
 
             dx = (dx/newzoom)/self.zoom_step
             dy = (dy/newzoom)/self.zoom_step
             #print('dx',dx)
-            self.camera.x -= dx
-            self.camera.y -= dy
+            return camera_x - dx, camera_y - dy, newzoom
 
         else:
             #dx = (self.width/2-x)/self.camera.zoom)
-            newzoom = self.camera.zoom - self.camera.zoom/self.zoom_step
-            self.camera.zoom=newzoom
+            newzoom = zoom - zoom/self.zoom_step
 
             dx = (dx/newzoom)/self.zoom_step
             dy = (dy/newzoom)/self.zoom_step
             #print('dx',dx)
-            self.camera.x += dx
-            self.camera.y += dy
-
-
-        self.recalculate_grid()
-
-        #self.camera.y -= dy/self.camera.zoom
-        print('scroll self.camera.zoom,scroll_y',self.camera.zoom,scroll_y)
-
+            return camera_x + dx, camera_y + dy, newzoom
 
     def on_mouse_drag(self, x, y, dx, dy, button, modifiers):
+        self.__mouse = (x, y)
         if button == pyglet.window.mouse.MIDDLE:
-            self.camera.x -= dx/self.camera.zoom
-            self.camera.y -= dy/self.camera.zoom
-            self.recalculate_grid()
-            print('drag self.camera.zoom,self.camera.x,self.camera.y',self.camera.zoom,self.camera.x,self.camera.y)
+            self.__pan[0] += dx
+            self.__pan[1] += dy
+            self.invalidate('camera')
+        elif button == pyglet.window.mouse.LEFT and self.__band != None:
+            self.__band[2:] = [x, y]
+            if max(abs(x-self.__band[0]), abs(y-self.__band[1])) >= self.band_threshold:
+                self.invalidate('band', 'hover')
+            else:
+                self.invalidate('hover')
+        else:
+            self.invalidate('hover')
+
+    def on_mouse_release(self, x, y, button, modifiers):
+        if button != pyglet.window.mouse.LEFT or self.__band == None:
+            return
+        x1, y1 = self.__band[:2]
+        self.__band = None
+        self.band.visible = False
+        self.invalidate()
+        if max(abs(x-x1), abs(y-y1)) >= self.band_threshold:
+            self.select_band(x1, y1, x, y)
+            return
+        # a click selects what is under the mouse, shift toggles it
+        selection = dict(self.__band_base)
+        for component in self.hilighted_components:
+            if id(component) in selection and pyglet.window.key.MOD_SHIFT & modifiers:
+                del selection[id(component)]
+            else:
+                selection[id(component)] = component
+        self.set_selection(selection)
 
     def on_mouse_press(self, x, y, button, modifiers):
+        self.invalidate()
         if button == pyglet.window.mouse.MIDDLE:
             t = time.time()
             if t - self.__clickTime < 0.25:
-                self.reset_view()
+                self.reset_view(animate = True)
             else:
                 self.__clickTime = time.time()
 
         if button == pyglet.window.mouse.LEFT:
+            if self.library_browser.visible:
+                self.library_browser.click(x, y)
+                return
+            if self.in_macro_edit != None and self.hud_macro.click(x, y):
+                return
             t = time.time()
             if t - self.__clickTime < 0.25:
                 self.check_for_macro_edit()
             else:
                 self.__clickTime = time.time()
+            # not on the double click that entered macro edit, its release would select
+            if self.in_macro_edit == None:
+                self.__band = [x, y, x, y]
+                self.__band_base = dict(self.selection) if pyglet.window.key.MOD_SHIFT & modifiers else {}
 
     def recalculate_in_macro_label(self):
         if len(self.in_macro_edit_shapes) >= 2:
@@ -555,242 +4291,484 @@ class FEETCAD(pyglet.window.Window):
                         group = self.camera_hud))
         self.check_for_macro_edit(False)
 
+    def on_resize(self, width, height):
+        super(FEETCAD,self).on_resize(width, height)
+        self.library_browser.layout(width, height)
+        self.invalidate('camera')
+
+    def on_expose(self):
+        self.invalidate()
+
     def on_draw(self):
         """Clear the screen and draw shapes"""
+        self.__last_frame = time.perf_counter()
+        self.update_state()
         #check macroedit mode
         self.clear()
         self.recalculate_in_macro_label()
+        self.__grid_batch.draw()
+        if self.in_macro_edit == None and self.tile_cache.enabled:
+            cached = self.tile_cache.draw(self.draw_sheet)
+            if self.tile_cache.rendered:
+                # tile renders culled the sheet for themselves
+                self.update_culling()
+            if not cached:
+                self.draw_sheet()
+                self.invalidate()
+        else:
+            self.draw_sheet()
+        if self.in_macro_edit == None:
+            self.selection_batch.draw()
         self.batch.draw()
         #self.fps.draw()
 
+    def draw_sheet(self, rect = None):
+        """ Draw the components, culled to rect if given. """
+        if rect != None:
+            self.tile_grid.update(*rect)
+        self.camera.set_state()
+        self.symbols.draw()
+        self.camera.unset_state()
+        self.sheet_batch.draw()
+
     def on_key_press(self, symbols, modifiers):
-        if pyglet.window.key.MOD_SHIFT & modifiers and \
-            symbols == pyglet.window.key.N:
-            print('shift')
+        self.invalidate()
+        if symbols == pyglet.window.key.F3:
+            if pyglet.window.key.MOD_CTRL & modifiers:
+                self.profiler.export(os.path.join(tempfile.gettempdir(), 'feetcad_trace.json'))
+            else:
+                self.profiler.toggle()
 
         if pyglet.window.key.MOD_CTRL & modifiers and \
             symbols == pyglet.window.key.G:
-            print('ctrl')
             self.toggle_grid()
 
+        if pyglet.window.key.MOD_CTRL & modifiers and \
+            symbols == pyglet.window.key.E:
+            self.export_netlist(os.path.join(tempfile.gettempdir(), 'netlist.json'))
+
+        if self.library_browser.visible:
+            if symbols == pyglet.window.key.ESCAPE:
+                self.library_browser.close()
+            if symbols == pyglet.window.key.BACKSPACE:
+                self.library_browser.backspace()
+            return
+
+        if pyglet.window.key.MOD_CTRL & modifiers:
+            if symbols == pyglet.window.key.Z and pyglet.window.key.MOD_SHIFT & modifiers or \
+               symbols == pyglet.window.key.Y:
+                self.history.redo()
+            elif symbols == pyglet.window.key.Z:
+                self.history.undo()
+
+        nudges = {pyglet.window.key.LEFT: (-1, 0), pyglet.window.key.RIGHT: (1, 0),
+                  pyglet.window.key.UP: (0, 1), pyglet.window.key.DOWN: (0, -1)}
+        if symbols in nudges:
+            step = self.nudge_step*(10 if pyglet.window.key.MOD_SHIFT & modifiers else 1)
+            self.nudge_components(nudges[symbols][0]*step, nudges[symbols][1]*step)
+
         if symbols == pyglet.window.key.ESCAPE:
             if self.in_macro_edit != None:
                 self.check_for_macro_edit(False)
+            else:
+                self.set_selection({})
+
+    def follow_journal(self):
+        """ Point the journal at the file the current scheme came from. """
+        fileName = self.scheme.getSchemeFile()
+        if fileName != None and fileName != self.journal_file:
+            self.journal_file = fileName
+            self.journal.open(fileName)
+
+    def save_scheme(self, fileName = None):
+        """ Full save on the journal thread; returns at once. """
+        self.follow_journal()
+        self.journal.save(fileName)
+        if fileName != None:
+            self.scheme.setSchemeFile(fileName)
+            self.journal_file = fileName
+
+    def on_close(self):
+        pyglet.clock.unschedule(self.__frame)
+        pyglet.clock.unschedule(self.preload_fonts)
+        self.journal.close()
+        self.startup_cache.set('fonts', self.label_cache.fonts())
+        self.startup_cache.save()
+        super(FEETCAD,self).on_close()
+
+    def on_text(self, text):
+        self.invalidate()
+        if self.library_browser.visible:
+            self.library_browser.type(text)
 
     def clearScheme(self):
-        self.shapes = []
+        self.netlist.clear()
+        self.net_tint.set_geometry([], [], [])
+        self.set_selection({})
+        for component in list(self.scene_items.values()):
+            self.deleteComponentShapes(component)
+        self.spatial_index.clear()
+        self.tile_grid.clear()
 
     def check_mouse_onshape(self, mousex, mousey):
-
-        def mouseInRect(x1,y1,x2,y2, mousex,mousey, tolerance):
-            tolerance*=self.magnifier
-
-            if x1>x2:
-                b = x1
-                x1 = x2
-                x2 = b
-            if y1>y2:
-                b = y1
-                y1 = y2
-                y2 = b
-
-            x1-=tolerance
-            x2+=tolerance
-            y1-=tolerance
-            y2+=tolerance
-
-            if  mousex >= x1 and mousex <= x2 and\
-                mousey >= y1 and mousey <= y2:
-                    return True
-            return False
-
         selected = []
-
-        if self.scheme.jsonData and 'components' in self.scheme.jsonData:
-            for component in self.scheme.jsonData['components']:
-                if isinstance(component['temp_shapes'],SCHEME_DRAW_ITEM):
-                    minx = 0
-                    miny = 0
-                    maxx = 0
-                    maxy = 0
-                    temp_shapes = component['temp_shapes']
-                    for shape in temp_shapes.shapes:
-                        if isinstance(shape, shapes.Line):
-                            if mouseInRect(shape.x,shape.y,shape.x2,shape.y2,mousex,mousey,0.5):
-                                #print('component',component['name'],'has shape under mouse: x,y',shape.x,shape.y,str(shape))
-                                selected.append(component)
-                                break
-                        if isinstance(shape, shapes.Rectangle):
-                            if mouseInRect(shape.x,shape.y,shape.x+shape.width,shape.y+shape.height,mousex,mousey,0.5):
-                                #print('component',component['name'],'has shape under mouse: x,y',shape.x,shape.y,str(shape))
-                                selected.append(component)
-                                break
+        tolerance = self.hit_tolerance*self.magnifier
+
+        # only components whose bounds are near the mouse are tested shape by shape
+        for component in self.spatial_index.query_point(mousex, mousey, tolerance):
+            if isinstance(component.get('temp_shapes'),SCHEME_DRAW_ITEM):
+                # geometry also covers instanced symbols, which have no pyglet shapes
+                geometry = component['temp_shapes'].geometry
+                if geometry != None and geometry.hit(mousex, mousey, tolerance):
+                    selected.append(component)
         return selected
 
 
     def loadShapesFromJson(self, targetComponent = None, onlyBounds = False, macro_mode = False):
         if self.scheme.jsonData != None:
-            self.__schemeBatch = pyglet.graphics.Batch()
 
-            def border_dot(x,y):
+            def border_dot(x,y,group):
                 return shapes.Star( x, y, outer_radius = self.border_dots_width,
                                     inner_radius = self.border_dots_width/3,
                                     num_spikes = 10,
                                     rotation = 120,
                                     color = self.borders_color,
-                                    batch=self.batch,
-                                    group=self.camera)
-
-            def copare_bounds(x1,x2,y1,y2):
-                #nonlocal maxx,minx,maxy,miny
-
-                if x1 < self.minx: self.minx = x1
-                if x2 < self.minx: self.minx = x2
-                if x1 > self.maxx: self.maxx = x1
-                if x2 > self.maxx: self.maxx = x2
-
-                if y1 < self.miny: self.miny = y1
-                if y2 < self.miny: self.miny = y2
-                if y1 > self.maxy: self.maxy = y1
-                if y2 > self.maxy: self.maxy = y2
+                                    batch=self.sheet_batch,
+                                    group=group)
+
+            def sync_line(line, x1, y1, x2, y2, width, color, group):
+                if line == None:
+                    return shapes.Line(x1, y1, x2, y2, width=width, color=color, batch=self.sheet_batch, group=group)
+                if line.x != x1 or line.y != y1: line.position = (x1, y1)
+                if line.x2 != x2: line.x2 = x2
+                if line.y2 != y2: line.y2 = y2
+                if line.width != width: line.width = width
+                if tuple(line.color) != color: line.color = color
+                return line
+
+            def sync_rect(rect, x1, y1, x2, y2, color, group):
+                if rect == None:
+                    return shapes.Rectangle(x1, y1, x2-x1, y2-y1, color, batch=self.sheet_batch, group=group)
+                if rect.x != x1 or rect.y != y1: rect.position = (x1, y1)
+                if rect.width != x2-x1: rect.width = x2-x1
+                if rect.height != y2-y1: rect.height = y2-y1
+                if tuple(rect.color) != color: rect.color = color
+                return rect
+
+            def sync_label(label, text, font_name, font_size, x, y, group):
+                self.label_sizes.add(font_size)
+                if label == None:
+                    return LOD_LABEL(text, font_name, font_size, x, y, SCHEME_DRAW_ITEM.LABEL_COLOR,
+                                     self.label_level(font_size), self.sheet_batch, group, self.label_cache)
+                label.update(text, font_name, font_size, x, y, SCHEME_DRAW_ITEM.LABEL_COLOR)
+                label.set_level(self.label_level(font_size))
+                return label
 
             def loadShapesFromComponent(component, onlyBounds = False, macro_mode = False):
                 x0 = component['x']
                 y0 = component['y']
 
-                boundminx, boundminy, boundmaxx, boundmaxy = (100000,100000,-100000,-100000)
-
-                def compare_internal_bounds(x1,x2,y1,y2):
-                    nonlocal boundmaxx, boundmaxy, boundminx, boundminy
-
-                    if x1 < boundminx: boundminx = x1
-                    if x2 < boundminx: boundminx = x2
-                    if x1 > boundmaxx: boundmaxx = x1
-                    if x2 > boundmaxx: boundmaxx = x2
-
-                    if y1 < boundminy: boundminy = y1
-                    if y2 < boundminy: boundminy = y2
-                    if y1 > boundmaxy: boundmaxy = y1
-                    if y2 > boundmaxy: boundmaxy = y2
-
-                if onlyBounds == False:
-                    component['temp_shapes'] = SCHEME_DRAW_ITEM()
-
-                if 'shapes' in component:
-                    for shape in component['shapes']:
-                        if shape['type'] == "line":
-                            x1 = shape['x1']+x0
-                            x2 = shape['x2']+x0
-                            y1 = shape['y1']+y0
-                            y2 = shape['y2']+y0
-
-                            x1*=self.magnifier
-                            x2*=self.magnifier
-                            y1*=self.magnifier
-                            y2*=self.magnifier
-
-                            copare_bounds(x1,x2,y1,y2)
-                            compare_internal_bounds(x1,x2,y1,y2)
-
-                            line = shapes.Line(         x1, y1,\
-                                                        x2,y2,\
-                                                        width=shape['width']*self.magnifier,\
-                                                        color=(shape['color'][0], shape['color'][1], shape['color'][2],shape['color'][3]),\
-                                                        batch=self.batch,\
-                                                        group=self.camera)
-
-                            if onlyBounds == False:
-                                component['temp_shapes'].addItem(line)
-
-                                if macro_mode:
-                                    component['temp_shapes'].addItem(border_dot(x1, y1))
-                                    component['temp_shapes'].addItem(border_dot(x2, y2))
-
-
-
-                            #self.__shapes.append(line)
-
-                        if shape['type'] == "rectangle":
-                            x1 = shape['x1']+x0
-                            x2 = shape['x2']+x0
-                            y1 = shape['y1']+y0
-                            y2 = shape['y2']+y0
-
-                            x1*=self.magnifier
-                            x2*=self.magnifier
-                            y1*=self.magnifier
-                            y2*=self.magnifier
-
-                            copare_bounds(x1,x2,y1,y2)
-                            compare_internal_bounds(x1,x2,y1,y2)
+                # outside macro edit a library reference is drawn as an instanced symbol
+                part = None
+                if macro_mode == False and component.get('referenceTo') != None:
+                    part = self.library.getPart(component['referenceTo'])
 
-                            color=(shape['color'][0], shape['color'][1], shape['color'][2],shape['color'][3])
+                # a loader thread may have prepared the geometry already
+                prepared = component.get('temp_geometry')
+                if prepared != None and prepared.part != (part['name'] if part != None else None):
+                    prepared = None
 
-                            rect = shapes.Rectangle(x1,y1,x2-x1,y2-y1,color,\
-                                                batch=self.batch,\
-                                                group=self.camera)
-
-                            if onlyBounds == False:
-                                component['temp_shapes'].addItem(rect)
-
-                                if macro_mode:
-                                    component['temp_shapes'].addItem(border_dot(x1, y1))
-                                    component['temp_shapes'].addItem(border_dot(x1, y2))
-                                    component['temp_shapes'].addItem(border_dot(x2, y1))
-                                    component['temp_shapes'].addItem(border_dot(x2, y2))
-
-                if 'labels' in component:
-                    for label in component['labels']:
-                        x = label['x']+x0
-                        y = label['y']+y0
-
-
-                        x*=self.magnifier
-                        y*=self.magnifier
-
-                        copare_bounds(x1,x2,y1,y2)
-                        compare_internal_bounds(x1,x2,y1,y2)
-
-                        text = ''
-
-                        if label['field'] == 'name':
-                            text = component["name"]
-                        else:
-                            text = label['text']
-
-                        if 'field_visible' in label and label['field_visible'] == True:
-                            text = label['field'] + ":" + text
-
-
-                        label = segoe_ui_semilbold = pyglet.text.Label(text,\
-                            font_name=label['font']['name'],\
-                            bold="semibold",\
-                            font_size=label['font']['size']*self.magnifier,\
-                            x=x,\
-                            y=y,\
-                            batch=self.batch,
-                            group = self.camera)
-                        #self.__shapes.append(line)
-
-                        if onlyBounds == False:
-                            component['temp_shapes'].addItem(label)
                 if onlyBounds == True:
-                    return (boundminx,boundminy,boundmaxx,boundmaxy)
+                    if prepared != None:
+                        bounds = prepared.bounds
+                    else:
+                        bounds = tuple(COMPONENT_GEOMETRY.bounds_many([component], self.magnifier, [part])[0].tolist())
+                    if bounds == None or bounds[0] > bounds[2]:
+                        return COMPONENT_GEOMETRY.EMPTY_BOUNDS
+                    return bounds
+
+                component.pop('temp_geometry', None)
+                if prepared == None:
+                    prepared = COMPONENT_GEOMETRY.build([component], self.magnifier, [part])[0]
+
+                item = component.get('temp_shapes')
+                if not isinstance(item, SCHEME_DRAW_ITEM):
+                    item = SCHEME_DRAW_ITEM()
+                    component['temp_shapes'] = item
+                    self.scene_items[id(component)] = component
+                # cached tiles showing where it was
+                self.tile_cache.invalidate(item.bounds)
+
+                # shapes live under the culling tile of the component origin
+                group = self.tile_grid.group(x0*self.magnifier, y0*self.magnifier)
+                item.set_group(group)
+
+                # live objects are reused slot by slot; anything left over is deleted below
+                slots = []
+                if part == None:
+                    for index, kind, x1, y1, x2, y2, width, color in prepared.shapes():
+                        # None keeps slot indexes aligned with the json shape list
+                        slots += [None]*(index - len(slots))
+                        if kind == COMPONENT_GEOMETRY.LINE:
+                            slots.append(sync_line(item.take_slot(index, shapes.Line),
+                                                   x1, y1, x2, y2, width, color, group))
+                        else:
+                            slots.append(sync_rect(item.take_slot(index, shapes.Rectangle),
+                                                   x1, y1, x2, y2, color, group))
+                    slots += [None]*(len(prepared.kinds) - len(slots))
+
+                labels = []
+                for index, (text, font_name, font_size, x, y) in enumerate(prepared.labels):
+                    old = item.labels[index] if index < len(item.labels) else None
+                    labels.append(sync_label(old, text, font_name, font_size, x, y, group))
+
+                item.set_slots(slots)
+                if part != None:
+                    instance = self.symbols.place(part['name'], part['shapes'], id(component),
+                                                  x0*self.magnifier, y0*self.magnifier, group)
+                    # like synced shapes, a copy goes back to the colors of its part
+                    instance.color = SYMBOL_RENDERER.NO_TINT
+                    item.set_instance(instance)
+                else:
+                    item.set_instance(None)
+                item.geometry = prepared
+                item.set_labels(labels)
+                item.set_dots(prepared.dots() if macro_mode else [], lambda x, y: border_dot(x, y, group))
+                if self.in_macro_edit != None and component is not self.in_macro_edit:
+                    for shape in item.shapes:
+                        color = shape.color
+                        if len(color) == 4:
+                            shape.color = (color[0], color[1], color[2], self.macro_dim_alpha)
+                item.refresh_highlight()
+
+                # keep the hover index in sync with the freshly built shapes
+                if prepared.bounds != None:
+                    item.bounds = prepared.bounds
+                    self.spatial_index.insert(id(component), component, item.bounds)
+                    self.tile_grid.place(id(component), group, item.bounds)
+                    self.tile_cache.invalidate(item.bounds)
+                else:
+                    self.spatial_index.remove(id(component))
+                    self.tile_grid.release(id(component))
+                self.update_net(component)
 
             if targetComponent == None:
-                if 'components' in self.scheme.jsonData:
+                if self.scheme.jsonData.get('components') != None:
+                    alive = set()
+                    pending = []
                     for component in self.scheme.jsonData['components']:
-                        loadShapesFromComponent(component)
+                        if self.lazy_shapes and not isinstance(component.get('temp_shapes'), SCHEME_DRAW_ITEM):
+                            pending.append(component)
+                        else:
+                            loadShapesFromComponent(component)
+                        alive.add(id(component))
+                    # bounds of everything not yet built come out of one vectorized pass
+                    if pending:
+                        parts = [self.library.getPart(component['referenceTo']) if component.get('referenceTo') != None else None
+                                 for component in pending]
+                        for component, bounds in zip(pending, COMPONENT_GEOMETRY.bounds_many(pending, self.magnifier, parts).tolist()):
+                            self.register_component(component, tuple(bounds))
+                    # components gone from the json take their vertex lists and index entries with them,
+                    # built or only registered
+                    gone = {key: component for key, component in self.spatial_index.items() if key not in alive}
+                    gone.update((key, component) for key, component in self.scene_items.items() if key not in alive)
+                    for component in gone.values():
+                        self.deleteComponentShapes(component)
+                    for key in [key for key in self.netlist.components if key not in alive]:
+                        self.netlist.remove(key)
+                    self.update_culling()
             else:
-                loadShapesFromComponent(targetComponent, onlyBounds = onlyBounds, macro_mode = macro_mode)
+                return loadShapesFromComponent(targetComponent, onlyBounds = onlyBounds, macro_mode = macro_mode)
+
+    def world_bounds(self):
+        """ Extent to fit the view to: the component in macro edit, else the whole sheet. """
+        if self.in_macro_edit != None:
+            return self.component_bounds(self.in_macro_edit)
+        return self.spatial_index.world_bounds()
+
+    def component_bounds(self, component):
+        """ Cached bounds of a component; computed (without building shapes) if it was never indexed. """
+        bounds = self.spatial_index.bounds(id(component))
+        if bounds == None:
+            bounds = self.loadShapesFromJson(component, onlyBounds = True)
+            if bounds[0] > bounds[2]:
+                return None
+        return bounds
+
+    def invalidate_component(self, component):
+        """ Recompute a component after its json changed; its cached bounds follow. """
+        component.pop('temp_geometry', None)
+        if isinstance(component.get('temp_shapes'), SCHEME_DRAW_ITEM):
+            self.loadShapesFromJson(component, macro_mode = component is self.in_macro_edit)
+        else:
+            self.spatial_index.remove(id(component))
+            self.register_component(component)
+
+    def on_library_change(self, names):
+        """ Rebuild the copies of parts that were saved or deleted; names None means every part. """
+        for name in list(self.symbols.symbols) if names == None else names:
+            self.symbols.forget(name)
+        if self.scheme.jsonData == None:
+            return
+        for component in self.scheme.jsonData.get('components') or []:
+            if component.get('referenceTo') != None and (names == None or component['referenceTo'] in names):
+                self.invalidate_component(component)
+        self.invalidate()
+
+    def register_component(self, component, bounds = None):
+        """ Index a component by its json bounds; build its shapes only if it is in view. """
+        self.update_net(component)
+        if bounds == None:
+            bounds = self.loadShapesFromJson(component, onlyBounds = True)
+        if bounds == None or bounds[0] > bounds[2]:
+            return
+        self.spatial_index.insert(id(component), component, bounds)
+        minx, miny, maxx, maxy = self.camera.view_rect(self.view_margin)
+        if bounds[2] >= minx and bounds[0] <= maxx and bounds[3] >= miny and bounds[1] <= maxy:
+            self.loadShapesFromJson(component)
+
+    def materialize_visible(self, rect = None):
+        """ Build shapes for indexed components that have scrolled into view (or into rect). """
+        if self.lazy_shapes:
+            for component in self.spatial_index.query_rect(*(rect or self.camera.view_rect(self.view_margin))):
+                if not isinstance(component.get('temp_shapes'), SCHEME_DRAW_ITEM):
+                    self.loadShapesFromJson(component)
+        self.update_culling(rect)
+
+    def label_level(self, font_size):
+        """ LOD level for a label of font_size (world units) at the current zoom. """
+        px = font_size*4/3*self.camera.zoom
+        if px < self.label_hide_px:
+            return LOD_LABEL.HIDDEN
+        if px < self.label_bar_px:
+            return LOD_LABEL.BAR
+        return LOD_LABEL.TEXT
+
+    def update_label_lod(self):
+        """ Re-level labels, but only if the zoom moved some font size across a threshold. """
+        levels = {size: self.label_level(size) for size in self.label_sizes}
+        if levels == self.__label_levels:
+            return
+        self.__label_levels = levels
+        # tiles were rendered with the old levels
+        self.tile_cache.clear()
+        for component in self.scene_items.values():
+            for label in component['temp_shapes'].labels:
+                label.set_level(levels[label.font_size])
+
+    def update_culling(self, rect = None):
+        """ Hide the tiles of the sheet that are outside the window (or rect). """
+        self.tile_grid.update(*(rect or self.camera.view_rect()))
+
+    def streamScheme(self, fileName, on_loaded = None, time_budget = 0.008):
+        """ Load a scheme on a worker thread; the main thread only indexes and uploads.
+
+        Each frame gets at most time_budget seconds of loading work, so the window
+        keeps panning and zooming while a big file comes in.
+        """
+        if self.loader != None:
+            self.loader.cancel()
+            pyglet.clock.unschedule(self.__load_slice)
+            self.loader = None
+        self.clearScheme()
+        self.scheme.jsonData = {'components': []}
+        self.loader = SCHEME_LOADER(fileName, self.magnifier)
+        self.__pending = []
+        self.__on_loaded = on_loaded
+        self.__time_budget = time_budget
+        self.set_load_progress(0.0)
+        self.loader.start()
+        pyglet.clock.schedule(self.__load_slice)
+
+    def __load_slice(self, dt):
+        loader = self.loader
+        components = self.scheme.jsonData['components']
+        deadline = time.perf_counter() + self.__time_budget
+        while time.perf_counter() < deadline:
+            if not self.__pending:
+                try:
+                    batch = loader.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if batch == None:
+                    self.__finish_loading()
+                    return
+                # popped from the end, so reverse to keep file order
+                self.__pending = batch[::-1]
+            component = self.__pending.pop()
+            components.append(component)
+            self.register_component(component)
+        self.set_load_progress(loader.progress)
+
+    def __finish_loading(self):
+        pyglet.clock.unschedule(self.__load_slice)
+        loader = self.loader
+        self.loader = None
+        self.set_load_progress(None)
+        if loader.error != None:
+            print('loading', loader.fileName, 'failed:', loader.error)
+            return
+        self.scheme.jsonData = loader.document(self.scheme.jsonData['components'])
+        self.scheme.setSchemeFile(loader.fileName)
+        records = SCHEME_JOURNAL.read(loader.fileName)
+        if records:
+            # recover edits autosaved after the last full save
+            EDIT_HISTORY.replay(self.scheme.jsonData, records)
+            self.clearScheme()
+            self.loadShapesFromJson()
+        self.follow_journal()
+        self.update_culling()
+        STARTUP.mark_once('scheme')
+        if self.__on_loaded != None:
+            self.__on_loaded()
+
+    def set_load_progress(self, progress):
+        """ Show the loading bar at progress (0..1); None hides it. """
+        self.invalidate()
+        visible = progress != None
+        self.load_progress_bar.visible = visible
+        self.load_progress_frame.visible = visible
+        self.load_progress_label.visible = visible
+        if not visible:
+            return
+        x = self.width/2 - 100
+        y = 30
+        self.load_progress_frame.position = (x, y)
+        self.load_progress_bar.position = (x, y)
+        self.load_progress_bar.width = max(200*progress, 1)
+        self.load_progress_label.x = x
+        self.load_progress_label.y = y + 12
+        self.load_progress_label.text = 'loading ' + str(int(progress*100)) + '%'
+
+    def deleteComponentShapes(self, component):
+        item = component.get('temp_shapes')
+        if isinstance(item, SCHEME_DRAW_ITEM):
+            self.tile_cache.invalidate(item.bounds)
+            item.delete()
+            del component['temp_shapes']
+        self.scene_items.pop(id(component), None)
+        self.netlist.remove(id(component))
+        self.spatial_index.remove(id(component))
+        self.tile_grid.release(id(component))
 
 
 
 if __name__ == "__main__":
     cad = FEETCAD()
-    cad.scheme.loadScheme('test.json')
-    cad.loadShapesFromJson()
-    cad.reset_view()
     cad.initialize_in_macro_label()
-    cad.scheme.saveScheme('test_out.jschem')
-    pyglet.app.run()
+    cad.library.loadLibrary()
+    if cad.library.countParts() == 0 and os.path.exists('library.json'):
+        cad.library.importJson('library.json')
+    STARTUP.mark('library')
+
+    def scheme_loaded():
+        cad.reset_view()
+        print(STARTUP.report())
+        print(cad.label_cache.report())
+        cad.save_scheme(os.path.join(tempfile.gettempdir(), 'test_out.jschem'))
+
+    cad.streamScheme('test.json', scheme_loaded)
+    # glyphs of last session's fonts render while the worker parses
+    pyglet.clock.schedule_once(cad.preload_fonts, 0)
+    # frames are drawn on demand, see FEETCAD.invalidate
+    pyglet.app.run(None)
@@ -0,0 +1,45 @@
+import gc
+import os
+import sys
+
+import pyglet
+import pytest
+
+# the editor draws offscreen, the file tools need no OpenGL context at all
+pyglet.options['shadow_window'] = False
+pyglet.options['headless'] = True
+
+HOME = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HOME)
+
+
+def wire(name, x1, y1, x2, y2, x = 0, y = 0, pin = False):
+    """ Component holding one line, and a pin at its first end if pin is set. """
+    component = {'name': name, 'x': x, 'y': y, 'customGroup': 'test', 'referenceTo': None, 'nameMask': 'W#',
+                 'labels': [], 'pins': [],
+                 'shapes': [{'type': 'line', 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+                             'width': 0.3, 'color': [255, 255, 255, 255]}]}
+    if pin:
+        component['pins'].append({'name': '1', 'x': x1, 'y': y1, 'visible': 'True', 'shapeType': 'dot',
+                                  'color': [255, 255, 255, 255]})
+    return component
+
+
+@pytest.fixture
+def cad(monkeypatch, tmp_path):
+    """ Editor window on an empty scheme, with an in-memory library and its cache in tmp_path. """
+    import feetcad
+    monkeypatch.setattr(feetcad, 'CACHE_FILE', str(tmp_path / 'feetcad_cache.json'))
+    window = feetcad.FEETCAD()
+    window.initialize_in_macro_label()
+    window.library.setLibraryFile(':memory:')
+    window.library.loadLibrary()
+    window.scheme.jsonData = {'name': 'test', 'components': []}
+    yield window
+    space = window.context.object_space
+    window.on_close()
+    del window
+    gc.collect()
+    # the next window shares this object space, but vertex arrays are per context:
+    # names queued by the closed one would delete the next window's arrays
+    space.doomed_vaos.clear()
@@ -0,0 +1,76 @@
+import json
+import os
+
+from conftest import HOME
+from feetcad import BINARY_SCHEME, SCHEME
+
+
+def test_round_trip(tmp_path):
+    with open(os.path.join(HOME, 'test.jschem')) as handle:
+        data = json.load(handle)
+    fileName = str(tmp_path / ('test' + BINARY_SCHEME.EXTENSION))
+    BINARY_SCHEME.save(data, fileName)
+    assert BINARY_SCHEME.is_binary(fileName)
+    assert BINARY_SCHEME.component_count(fileName) == len(data['components'])
+    assert BINARY_SCHEME.load(fileName) == data
+
+
+def test_round_trip_through_scheme(tmp_path):
+    scheme = SCHEME()
+    scheme.loadScheme(os.path.join(HOME, 'test.jschem'))
+    fileName = str(tmp_path / ('test' + BINARY_SCHEME.EXTENSION))
+    scheme.saveScheme(fileName)
+    loaded = SCHEME()
+    loaded.loadScheme(fileName)
+    assert loaded.jsonData == scheme.persistentData()
+    streamed = SCHEME()
+    assert list(streamed.iterScheme(fileName)) == scheme.persistentData()['components']
+
+
+def test_component_list(tmp_path):
+    fileName = str(tmp_path / ('test' + BINARY_SCHEME.EXTENSION))
+    for data in ({'name': 'a', 'components': None, 'version': 1},
+                 {'name': 'a', 'components': [], 'version': 1},
+                 {'name': 'a'}):
+        BINARY_SCHEME.save(data, fileName)
+        loaded = BINARY_SCHEME.load(fileName)
+        assert loaded == data
+        assert list(loaded) == list(data)
+
+
+def test_untemplated_values(tmp_path):
+    fileName = str(tmp_path / ('test' + BINARY_SCHEME.EXTENSION))
+    data = {'components': [{'name': 'big', 'x': 2**70, 'y': -1.5, 'flags': [True, None, 'a']},
+                           {'name': 'small', 'x': 1, 'y': 2**40, 'color': [255, 0, 0, 255], 'empty': []}]}
+    BINARY_SCHEME.save(data, fileName)
+    assert BINARY_SCHEME.load(fileName) == data
+
+
+def test_reader_closes_map(tmp_path):
+    fileName = str(tmp_path / ('test' + BINARY_SCHEME.EXTENSION))
+    BINARY_SCHEME.save({'components': [{'x': n} for n in range(10)]}, fileName)
+    with BINARY_SCHEME.READER(fileName) as reader:
+        records = reader.records()
+        assert next(records) == {'x': 0}
+    assert reader.closed
+
+    scheme = SCHEME()
+    components = scheme.iterScheme(fileName)
+    next(components)
+    components.close()
+    assert scheme.jsonData['components'] == [{'x': 0}]
+
+
+def test_templates_keep_structure_and_sharing(tmp_path):
+    fileName = str(tmp_path / ('test' + BINARY_SCHEME.EXTENSION))
+    key = "'}); __import__('os').remove(%r) #" % fileName
+    data = {'components': [{key: 'x', 'pins': [{'x': 1, 'color': [1, 2]}, None, [[]], 7], 'more': {}},
+                           {key: 'y', 'pins': [{'x': 300, 'color': [1, 2]}, None, [[]], 8], 'more': {}},
+                           5, 'text', None, [1, 2], [True], [[1.5], {'a': None}]]}
+    BINARY_SCHEME.save(data, fileName)
+    loaded = BINARY_SCHEME.load(fileName)
+    assert loaded == data
+    assert [list(c) for c in loaded['components'][:2]] == [list(c) for c in data['components'][:2]]
+    # decoded containers are fresh objects, editing one record leaves the next alone
+    loaded['components'][0]['pins'][0]['color'].append(3)
+    assert loaded['components'][1]['pins'][0]['color'] == [1, 2]
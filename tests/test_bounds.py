@@ -0,0 +1,66 @@
+import random
+
+from feetcad import BOUNDS_SET, BOUNDS_TREE
+
+
+def union(boxes):
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def random_edits(rnd, target, steps):
+    """ Random sets, moves and removes on target, checked against the plain union. """
+    boxes = {}
+    for step in range(steps):
+        key = rnd.randrange(40)
+        if key in boxes and rnd.random() < 0.3:
+            del boxes[key]
+            target.remove(key)
+        else:
+            x, y = rnd.uniform(-5000, 5000), rnd.uniform(-5000, 5000)
+            boxes[key] = (x, y, x + rnd.uniform(0, 300), y + rnd.uniform(0, 300))
+            target.set(key, boxes[key])
+        if rnd.random() < 0.5:
+            assert target.bounds() == union(list(boxes.values()))
+    assert target.bounds() == union(list(boxes.values()))
+
+
+def test_set_shrinks_when_an_edge_member_leaves():
+    members = BOUNDS_SET()
+    assert members.bounds() == None
+    members.set('a', (0, 0, 10, 10))
+    members.set('b', (5, 5, 50, 20))
+    assert members.bounds() == (0, 0, 50, 20)
+    # inside the union: nothing to recompute
+    members.set('c', (1, 1, 2, 2))
+    members.remove('c')
+    assert members.bounds() == (0, 0, 50, 20)
+    members.set('b', (5, 5, 8, 8))
+    assert members.bounds() == (0, 0, 10, 10)
+    members.remove('a')
+    assert members.bounds() == (5, 5, 8, 8)
+    members.remove('b')
+    assert members.bounds() == None and len(members) == 0
+
+
+def test_set_matches_the_plain_union():
+    random_edits(random.Random(2), BOUNDS_SET(), 2000)
+
+
+def test_tree_matches_the_plain_union():
+    random_edits(random.Random(3), BOUNDS_TREE(tile_size = 700.0), 2000)
+
+
+def test_tree_moves_boxes_between_tiles():
+    tree = BOUNDS_TREE(tile_size = 100.0)
+    tree.set('a', (0, 0, 10, 10))
+    tree.set('b', (500, 500, 510, 510))
+    assert tree.bounds() == (0, 0, 510, 510)
+    tree.set('b', (20, 20, 30, 30))
+    assert tree.bounds() == (0, 0, 30, 30)
+    # the tile b left is dropped
+    assert list(tree.tiles) == [(0, 0)]
+    tree.clear()
+    assert tree.bounds() == None
@@ -0,0 +1,88 @@
+from conftest import wire
+from feetcad import EDIT_HISTORY, SCHEME
+
+
+def test_removed_lazy_component_leaves_index(cad):
+    cad.scheme.jsonData['components'] = [wire('W%d' % n, 0, 0, 1, 0, x = n*10000) for n in range(50)]
+    cad.loadShapesFromJson()
+    assert len(cad.spatial_index) == 50
+    # far apart, so the last one is only registered, never built
+    last = cad.scheme.jsonData['components'][49]
+    assert 'temp_shapes' not in last
+
+    cad.history.remove(['components', 49])
+    assert len(cad.spatial_index) == 49
+    assert cad.world_bounds()[2] < 49*10000*cad.magnifier
+    cad.camera.x = 49*10000*cad.magnifier
+    cad.materialize_visible()
+    assert 'temp_shapes' not in last
+
+    cad.history.undo()
+    assert len(cad.spatial_index) == 50
+
+
+def test_merged_steps_count_weight():
+    scheme = SCHEME()
+    scheme.jsonData = {'components': [{'x': 0, 'y': 0}]}
+    history = EDIT_HISTORY(scheme, max_weight = 100)
+    for n in range(20):
+        history.begin('nudge', merge = 'nudge')
+        history.set(['components', 0, 'x'], [n]*n)
+        history.end()
+    assert len(history.done) == 1
+    assert history.weight == history.done[0].weight == sum(command.weight() for command in history.done[0].commands)
+
+    history.set(['components', 0, 'y'], list(range(90)))
+    assert history.weight == sum(step.weight for step in history.done)
+    assert history.weight <= 100 or len(history.done) == 1
+
+
+def nudge_scene(cad):
+    components = [wire('W%d' % n, 0, 0, 10, 0, x = n*100) for n in range(5)]
+    cad.scheme.jsonData['components'] = components
+    cad.loadShapesFromJson()
+    return components
+
+
+def test_nudge_moves_the_selection_as_one_step(cad):
+    components = nudge_scene(cad)
+    cad.set_selection({id(component): component for component in components[1:3]})
+    before = cad.spatial_index.bounds(id(components[2]))
+    cad.nudge_components(5, -1)
+    assert [(c['x'], c['y']) for c in components] == [(0, 0), (105, -1), (205, -1), (300, 0), (400, 0)]
+    after = cad.spatial_index.bounds(id(components[2]))
+    assert after[0] - before[0] == 5*cad.magnifier
+    assert len(cad.history.done[-1].commands) == 4
+
+
+def test_nudges_coalesce_per_target_set(cad):
+    components = nudge_scene(cad)
+    cad.set_selection({id(components[0]): components[0]})
+    for n in range(3):
+        cad.nudge_components(1, 0)
+    assert len(cad.history.done) == 1
+    cad.set_selection({id(components[1]): components[1]})
+    cad.nudge_components(1, 0)
+    assert len(cad.history.done) == 2
+
+    cad.history.undo()
+    cad.history.undo()
+    assert components[0]['x'] == 0 and components[1]['x'] == 100
+    assert cad.spatial_index.bounds(id(components[0]))[0] == 0
+
+
+def test_redo_follows_and_a_new_nudge_drops_it(cad):
+    components = nudge_scene(cad)
+    cad.set_selection({id(components[4]): components[4]})
+    cad.nudge_components(0, 3)
+    cad.history.undo()
+    assert components[4]['y'] == 0
+    cad.history.redo()
+    assert components[4]['y'] == 3
+    assert cad.spatial_index.bounds(id(components[4]))[1] == 3*cad.magnifier
+
+    cad.history.undo()
+    cad.nudge_components(2, 0)
+    assert cad.history.undone == []
+    assert cad.history.redo() == None
+    assert (components[4]['x'], components[4]['y']) == (402, 0)
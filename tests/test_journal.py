@@ -0,0 +1,105 @@
+import json
+import os
+import time
+
+import pytest
+
+from conftest import wire
+from feetcad import EDIT_HISTORY, SCHEME, SCHEME_JOURNAL
+
+
+@pytest.fixture
+def base(tmp_path):
+    fileName = str(tmp_path / 'base.jschem')
+    scheme = SCHEME()
+    scheme.jsonData = {'name': 'base', 'components': [wire('W%d' % n, 0, 0, 10, 0, x = n*20) for n in range(4)]}
+    scheme.saveScheme(fileName)
+    return fileName
+
+
+def journaled(fileName, idle_time = 60.0):
+    """ Scheme loaded from fileName, its history and a running journal following the history. """
+    scheme = SCHEME()
+    scheme.loadScheme(fileName)
+    history = EDIT_HISTORY(scheme)
+    journal = SCHEME_JOURNAL(idle_time)
+    journal.start()
+    journal.open(fileName)
+    def on_change(step, commands, direction):
+        if direction < 0:
+            commands = [command.inverse() for command in reversed(commands)]
+        journal.append([command.record() for command in commands])
+    history.listeners.append(on_change)
+    return scheme, history, journal
+
+
+def edit(history):
+    history.set(['components', 0, 'x'], 99)
+    history.insert(['components', 1], wire('NEW', 0, 0, 5, 5))
+    history.remove(['components', 3])
+    history.set(['components', 0, 'extra'], [1, 2])
+    history.set(['name'], 'edited')
+    history.undo()
+
+
+def load(fileName):
+    scheme = SCHEME()
+    scheme.loadScheme(fileName)
+    return scheme.jsonData
+
+
+def test_reload_replays_the_journal(base):
+    scheme, history, journal = journaled(base)
+    edit(history)
+    journal.close()
+    assert os.path.exists(SCHEME_JOURNAL.path(base))
+    assert load(base) == scheme.persistentData()
+
+
+def test_save_as_takes_the_edits_along(base, tmp_path):
+    with open(base) as handle:
+        original = json.load(handle)
+    target = str(tmp_path / 'copy.jschem')
+    scheme, history, journal = journaled(base)
+    edit(history)
+    journal.save(target)
+    history.set(['components', 0, 'y'], 7)
+    journal.close()
+
+    # the old base stays as it was last saved
+    assert not os.path.exists(SCHEME_JOURNAL.path(base))
+    assert load(base) == original
+    # edits after the save are journaled against the copy
+    assert os.path.exists(SCHEME_JOURNAL.path(target))
+    assert load(target) == scheme.persistentData()
+
+
+def test_idle_compaction_keeps_the_json_format(base):
+    scheme, history, journal = journaled(base, idle_time = 0.05)
+    edit(history)
+    expected = json.dumps(scheme.persistentData(), indent=4)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with open(base) as handle:
+            if handle.read() == expected:
+                break
+        time.sleep(0.01)
+    journal.close()
+    with open(base) as handle:
+        assert handle.read() == expected
+    assert not os.path.exists(SCHEME_JOURNAL.path(base))
+
+
+def test_editor_save_as_leaves_the_loaded_file_alone(cad, base, tmp_path):
+    with open(base) as handle:
+        original = json.load(handle)
+    cad.scheme.loadScheme(base)
+    cad.loadShapesFromJson()
+    cad.follow_journal()
+    cad.history.set(['components', 2, 'x'], 500)
+    target = str(tmp_path / 'out.jschem')
+    cad.save_scheme(target)
+    cad.journal.close()
+    assert load(base) == original
+    assert load(target)['components'][2]['x'] == 500
+    assert cad.scheme.getSchemeFile() == target
@@ -0,0 +1,89 @@
+import io
+import json
+
+import pytest
+
+
+DOCUMENTS = {
+    'scheme': '{"name": "amp", "version": 3, "components": [{"shapes": [{"type": "line", "x": -1.5e2, "y": 12}], '
+              '"label": "R\\u00b5 \\"1\\""}, {"referenceTo": "gnd", "x": 100, "y": 0.25}, [], 7, true, null], '
+              '"grid": {"step": 10}}',
+    'components first': '{"components": [{"x": 1}], "name": "a"}',
+    'empty list': '{"name": "a", "components": [], "z": false}',
+    'null list': '{"name": "a", "components": null, "grid": 5}',
+    'missing list': '{"name": "a", "grid": {"step": 10}}',
+    'empty': ' { } ',
+    'whitespace': '\n{\n  "components" : [ 1 ,\n 22 , 333 ] ,\n  "name" : "a"\n}\n',
+}
+
+
+def stream_load(path, chunk_size):
+    import feetcad
+    scheme = feetcad.SCHEME()
+    components = list(scheme.iterScheme(str(path), chunk_size))
+    return scheme, components
+
+
+@pytest.mark.parametrize('name', sorted(DOCUMENTS))
+def test_every_chunk_size_loads_what_json_load_does(name, tmp_path):
+    text = DOCUMENTS[name]
+    path = tmp_path / 'scheme.jschem'
+    path.write_text(text)
+    expected = json.loads(text)
+    for chunk_size in range(1, len(text) + 2):
+        scheme, components = stream_load(path, chunk_size)
+        assert scheme.jsonData == expected, chunk_size
+        assert list(scheme.jsonData) == list(expected), chunk_size
+        assert components == (expected.get('components') or []), chunk_size
+        assert scheme.progress == 1.0
+
+
+def test_null_and_missing_lists_save_back_unchanged(tmp_path):
+    import feetcad
+    for text in (DOCUMENTS['null list'], DOCUMENTS['missing list']):
+        path = tmp_path / 'scheme.jschem'
+        path.write_text(text)
+        scheme, components = stream_load(path, 4)
+        assert components == []
+        assert scheme.persistentData() == json.loads(text)
+
+
+def test_numbers_split_across_chunks_are_read_whole():
+    import feetcad
+    stream = feetcad.JSON_STREAM(io.StringIO('[12345, -6.5e-3]'), 1)
+    stream.expect('[')
+    assert stream.value() == 12345
+    assert stream.expect(',') == ','
+    assert stream.value() == -6.5e-3
+    assert stream.expect(']') == ']'
+    assert stream.offset() == 16
+
+
+def test_errors_report_file_offsets():
+    import feetcad
+    text = '{"name": "a", "components": [1, 2 3]}'
+    stream = feetcad.JSON_STREAM(io.StringIO(text), 3)
+    stream.expect('{')
+    stream.value()
+    stream.expect(':')
+    stream.value()
+    stream.expect(',')
+    stream.value()
+    stream.expect(':')
+    stream.expect('[')
+    stream.value()
+    stream.expect(',')
+    stream.value()
+    with pytest.raises(ValueError, match='offset %d' % text.index('3]')):
+        stream.expect(',]')
+
+    stream = feetcad.JSON_STREAM(io.StringIO('{"name": "a", "x": tru}'), 2)
+    stream.expect('{')
+    stream.value()
+    stream.expect(':')
+    stream.value()
+    stream.expect(',')
+    stream.value()
+    stream.expect(':')
+    with pytest.raises(ValueError, match='offset 19'):
+        stream.value()
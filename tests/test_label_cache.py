@@ -0,0 +1,40 @@
+def test_layouts_are_shared_until_evicted(cad):
+    import feetcad
+    cache = feetcad.LABEL_CACHE(capacity = 2)
+    first = cache.layout('R1', 'GOST TYPE A', 5)
+    assert cache.layout('R1', 'GOST TYPE A', 5) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.layout('R2', 'GOST TYPE A', 5)
+    # R1 was used last, so R2 is the oldest when C1 comes in
+    cache.layout('R1', 'GOST TYPE A', 5)
+    cache.layout('C1', 'GOST TYPE A', 5)
+    assert cache.layout('R1', 'GOST TYPE A', 5) is first
+    misses = cache.misses
+    cache.layout('R2', 'GOST TYPE A', 5)
+    assert cache.misses == misses + 1
+    assert cache.hit_rate() == cache.hits / (cache.hits + cache.misses)
+
+
+def test_layout_keys_on_text_font_and_size(cad):
+    import feetcad
+    cache = feetcad.LABEL_CACHE()
+    small = cache.layout('10k', 'GOST TYPE A', 5)
+    large = cache.layout('10k', 'GOST TYPE A', 7)
+    assert small is not large
+    assert cache.misses == 2
+    assert cache.fonts() == [['GOST TYPE A', 5], ['GOST TYPE A', 7]]
+    width = lambda runs: max(max(vertices[0::3]) for texture, vertices, tex_coords, count, indices in runs)
+    assert width(large) > width(small)
+
+
+def test_layout_runs_hold_one_quad_per_glyph(cad):
+    import feetcad
+    cache = feetcad.LABEL_CACHE()
+    runs = cache.layout('R15 ΩµA', 'GOST TYPE A', 5)
+    assert sum(count for texture, vertices, tex_coords, count, indices in runs) == len('R15 ΩµA')
+    for texture, vertices, tex_coords, count, indices in runs:
+        assert len(vertices) == count*12
+        assert len(indices) == count*6
+        assert max(indices) == count*4 - 1
+    assert cache.report().startswith('label cache: 0 hits, 1 misses')
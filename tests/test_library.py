@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from feetcad import LIBRARY
+
+
+PARTS = [{'name': 'R%d' % n, 'group': 'passive', 'customGroup': 'resistors', 'shapes': [n]} for n in range(12)] + \
+        [{'name': 'C1', 'group': 'passive', 'customGroup': 'capacitors', 'shapes': []},
+         {'name': 'U1', 'group': 'ic', 'shapes': []}]
+
+
+@pytest.fixture
+def library(tmp_path):
+    source = tmp_path / 'library.json'
+    source.write_text(json.dumps({'parts': PARTS}))
+    library = LIBRARY(cache_size = 4)
+    library.setLibraryFile(str(tmp_path / 'library.db'))
+    library.loadLibrary()
+    assert library.importJson(str(source)) == len(PARTS)
+    yield library
+    library.closeLibrary()
+
+
+def test_parts_come_back_from_the_file(library, tmp_path):
+    assert library.getPart('R3') == PARTS[3]
+    assert library.getPart('missing') == None
+    library.closeLibrary()
+
+    reopened = LIBRARY()
+    reopened.setLibraryFile(str(tmp_path / 'library.db'))
+    reopened.loadLibrary()
+    assert reopened.getPart('U1') == PARTS[-1]
+    assert reopened.countParts() == len(PARTS)
+    reopened.closeLibrary()
+
+
+def test_parts_are_parsed_once_while_cached(library):
+    part = library.getPart('R1')
+    assert library.getPart('R1') is part
+    for name in ('R2', 'R3', 'R4', 'R5'):
+        library.getPart(name)
+    # R1 fell out of the 4 part cache and is parsed again
+    assert library.getPart('R1') is not part
+    assert library.getPart('R1') == part
+
+
+def test_save_and_delete_notify_listeners(library):
+    changes = []
+    library.listeners.append(changes.append)
+    part = dict(PARTS[0], shapes = ['changed'])
+    library.savePart(part)
+    assert library.getPart('R0') is part
+    assert library.countParts() == len(PARTS)
+    library.deletePart('R0')
+    assert library.getPart('R0') == None
+    assert library.countParts() == len(PARTS) - 1
+    assert changes == [['R0'], ['R0']]
+
+
+def test_find_parts_pages_by_name(library):
+    assert library.countParts('R1') == 3
+    assert [row[0] for row in library.findParts('R1')] == ['R1', 'R10', 'R11']
+    assert library.findParts(group = 'ic') == [('U1', 'ic', None)]
+    assert library.countParts(group = 'passive', customGroup = 'resistors') == 12
+    names = [row[0] for row in library.findParts(group = 'passive', offset = 2, limit = 3)]
+    assert names == sorted(part['name'] for part in PARTS if part['group'] == 'passive')[2:5]
+
+
+def test_closed_library_answers_empty():
+    library = LIBRARY()
+    assert library.getPart('R1') == None
+    assert library.findParts() == []
+    assert library.countParts() == 0
+    library.savePart(PARTS[0])
+    library.deletePart('R0')
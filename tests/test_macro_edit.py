@@ -0,0 +1,34 @@
+from conftest import wire
+
+
+def alphas(component):
+    """ Alpha of the json shapes of a component, without its border dots. """
+    return {shape.color[3] for shape in component['temp_shapes'].slots if shape != None}
+
+
+def test_macro_edit_dims_components_built_later(cad):
+    import feetcad
+    edited = wire('A', 0, 0, 40, 0)
+    built = wire('B', 0, 10, 40, 10)
+    far = wire('C', 0, 0, 40, 0, x = 100000)
+    cad.scheme.jsonData['components'] = [edited, built, far]
+    cad.loadShapesFromJson()
+    cad.loadShapesFromJson(edited)
+    cad.loadShapesFromJson(built)
+    assert not isinstance(far.get('temp_shapes'), feetcad.SCHEME_DRAW_ITEM)
+
+    cad.set_hilighted_components([edited])
+    cad.check_for_macro_edit()
+    assert cad.in_macro_edit is edited
+    assert alphas(edited) == {255}
+    assert alphas(built) == {cad.macro_dim_alpha}
+    # materialized or rebuilt while in macro edit
+    cad.loadShapesFromJson(far)
+    assert alphas(far) == {cad.macro_dim_alpha}
+    built['shapes'][0]['x2'] = 30
+    cad.invalidate_component(built)
+    assert alphas(built) == {cad.macro_dim_alpha}
+
+    cad.check_for_macro_edit(enter_to_edit = False)
+    for component in (edited, built, far):
+        assert alphas(component) == {255}
@@ -0,0 +1,84 @@
+import json
+
+from conftest import wire
+from feetcad import NETLIST
+
+
+def nets(netlist):
+    return sorted(sorted(name for name, kind, index in members) for members in netlist.members.values())
+
+
+def build(components):
+    netlist = NETLIST()
+    for component in components:
+        netlist.update(component['name'], component)
+    return netlist
+
+
+def test_wires_meeting_at_a_point_are_one_net():
+    netlist = build([wire('A', 0, 0, 1, 0), wire('B', 1, 0, 1, 1), wire('C', 5, 5, 6, 5)])
+    assert nets(netlist) == [['A', 'B'], ['C']]
+    # a new wire bridges them
+    netlist.update('D', wire('D', 1, 1, 5, 5))
+    assert nets(netlist) == [['A', 'B', 'C', 'D']]
+
+
+def test_removing_a_bridge_splits_the_net():
+    chain = [wire('W%d' % n, n, 0, n+1, 0) for n in range(6)]
+    netlist = build(chain)
+    netlist.remove('W2')
+    assert nets(netlist) == [['W0', 'W1'], ['W3', 'W4', 'W5']]
+    netlist.update('W2', chain[2])
+    assert nets(netlist) == [['W%d' % n for n in range(6)]]
+
+
+def test_removing_a_wire_of_a_loop_keeps_the_net():
+    loop = [wire('A', 0, 0, 1, 0), wire('B', 1, 0, 1, 1), wire('C', 1, 1, 0, 1), wire('D', 0, 1, 0, 0)]
+    netlist = build(loop)
+    netlist.remove('B')
+    assert nets(netlist) == [['A', 'C', 'D']]
+    # nodes still find their net
+    assert netlist.find(('A', 'shape', 0)) == netlist.find(('C', 'shape', 0))
+
+
+def test_moving_a_wire_follows_its_ends():
+    moving = wire('B', 1, 0, 1, 1)
+    netlist = build([wire('A', 0, 0, 1, 0), moving, wire('C', 3, 0, 4, 0)])
+    version = netlist.version
+    moving['x'] += 2
+    netlist.update('B', moving)
+    assert nets(netlist) == [['A'], ['B', 'C']]
+    assert netlist.version != version
+    # unchanged json is not a change
+    version = netlist.version
+    netlist.update('B', moving)
+    assert netlist.version == version
+
+
+def test_export_lists_nets_with_pins(cad, tmp_path):
+    cad.scheme.jsonData['components'] = [wire('R1', 0, 0, 1, 0, pin = True), wire('W1', 1, 0, 2, 0),
+                                         wire('R2', 2, 0, 3, 0, pin = True, x = 0), wire('W2', 7, 7, 8, 7)]
+    cad.scheme.jsonData['components'][2]['pins'][0]['x'] = 3
+    cad.loadShapesFromJson()
+    fileName = str(tmp_path / 'netlist.json')
+    assert cad.export_netlist(fileName) == 1
+    with open(fileName) as handle:
+        assert json.load(handle) == {'nets': [{'name': 'N1', 'pins': [['R1', '1'], ['R2', '1']], 'segments': 3}]}
+
+
+def test_hovered_net_tint_follows_edits(cad):
+    a = wire('A', 0, 0, 1, 0)
+    b = wire('B', 1, 0, 1, 1)
+    long = wire('L', 1, 1, 10000, 1)
+    # far away: indexed, but its shapes are never built
+    far = wire('F', 10000, 1, 10001, 1)
+    cad.scheme.jsonData['components'] = [a, b, long, far]
+    cad.loadShapesFromJson()
+    assert 'temp_shapes' not in far
+    cad.set_hilighted_components([a])
+    assert cad.net_tint.count == 3
+
+    b['x'] += 5
+    cad.invalidate_component(b)
+    cad.update_state()
+    assert cad.net_tint.count == 0
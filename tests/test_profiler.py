@@ -0,0 +1,65 @@
+import json
+
+
+class OWNER:
+    def on_event(self):
+        self.kept = [[n] for n in range(1000)]
+        return 'handled'
+
+    def work(self):
+        self.kept = None
+
+
+def test_wrappers_come_and_go(cad):
+    import feetcad
+    profiler = feetcad.PROFILER(cad, cad.batch, None)
+    owner = OWNER()
+    profiler.watch(owner, 'on_event')
+    profiler.watch(owner, 'work', 'owner.work')
+    owner.on_event()
+    assert len(profiler.events) == 0
+
+    profiler.enable()
+    assert 'on_event' in vars(owner) and 'work' in vars(owner)
+    assert owner.on_event() == 'handled'
+    owner.work()
+    profiler.disable()
+    assert 'on_event' not in vars(owner) and 'work' not in vars(owner)
+    owner.on_event()
+    assert [event[0] for event in profiler.events] == ['on_event', 'owner.work']
+
+
+def test_events_count_the_blocks_they_keep(cad):
+    import feetcad
+    profiler = feetcad.PROFILER(cad, cad.batch, None)
+    owner = OWNER()
+    profiler.watch(owner, 'on_event')
+    profiler.watch(owner, 'work')
+    profiler.enable()
+    owner.kept = None
+    owner.on_event()
+    owner.work()
+    # a method that is not an event handler has no block count
+    assert list(profiler.retained) == ['on_event']
+    calls, blocks = profiler.retained['on_event']
+    assert calls == 1 and blocks >= 1000
+    profiler.record('on_draw', 1.0, 1.5)
+    profiler.record('on_draw', 2.0, 2.5)
+    profiler.refresh()
+    text = profiler.label.text
+    assert 'net blocks retained/call' in text
+    assert 'fps 1.0' in text
+    profiler.disable()
+
+
+def test_export_writes_a_chrome_trace(cad, tmp_path):
+    import feetcad
+    profiler = feetcad.PROFILER(cad, cad.batch, None)
+    profiler.record('update', profiler.origin + 0.001, profiler.origin + 0.003)
+    fileName = str(tmp_path / 'trace.json')
+    assert profiler.export(fileName) == 1
+    with open(fileName) as handle:
+        trace = json.load(handle)
+    event, = trace['traceEvents']
+    assert event['name'] == 'update' and event['ph'] == 'X'
+    assert abs(event['ts'] - 1000) < 1e-6 and abs(event['dur'] - 2000) < 1e-6
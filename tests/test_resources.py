@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def home(tmp_path):
+    os.makedirs(tmp_path / 'buttons' / 'small')
+    (tmp_path / 'buttons' / 'line.png').write_bytes(b'line')
+    (tmp_path / 'buttons' / 'small' / 'pin.png').write_bytes(b'pin')
+    (tmp_path / 'notes.txt').write_text('not a resource')
+    return str(tmp_path)
+
+
+def test_index_holds_only_the_resource_folders(home):
+    import feetcad
+    cache = feetcad.STARTUP_CACHE(os.path.join(home, 'feetcad_cache.json'))
+    resources = feetcad.RESOURCES(cache, home, ['buttons'])
+    with resources.file('buttons/small/pin.png') as handle:
+        assert handle.read() == b'pin'
+    assert sorted(resources.index) == ['buttons/line.png', 'buttons/small/pin.png']
+    with pytest.raises(Exception):
+        resources.file('notes.txt')
+
+
+def test_cached_index_survives_writes_next_to_the_folders(home, monkeypatch):
+    import feetcad
+    cache = feetcad.STARTUP_CACHE(os.path.join(home, 'feetcad_cache.json'))
+    cache.load()
+    feetcad.RESOURCES(cache, home, ['buttons']).reindex()
+    cache.save()
+    # the cache file itself and other files in the program directory
+    with open(os.path.join(home, 'test_out.jschem'), 'w') as handle:
+        handle.write('{}')
+
+    cache = feetcad.STARTUP_CACHE(os.path.join(home, 'feetcad_cache.json'))
+    cache.load()
+    def walk(top):
+        raise AssertionError('walked ' + top)
+    monkeypatch.setattr(os, 'walk', walk)
+    resources = feetcad.RESOURCES(cache, home, ['buttons'])
+    with resources.file('buttons/line.png') as handle:
+        assert handle.read() == b'line'
+
+
+def test_new_file_in_a_folder_reindexes(home):
+    import feetcad
+    cache = feetcad.STARTUP_CACHE(os.path.join(home, 'feetcad_cache.json'))
+    feetcad.RESOURCES(cache, home, ['buttons']).reindex()
+    with open(os.path.join(home, 'buttons', 'small', 'text.png'), 'wb') as handle:
+        handle.write(b'text')
+    resources = feetcad.RESOURCES(cache, home, ['buttons'])
+    with resources.file('buttons/small/text.png') as handle:
+        assert handle.read() == b'text'
@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+import pyglet
+
+from conftest import wire
+
+
+def frame(cad):
+    cad.switch_to()
+    cad.on_draw()
+    image = pyglet.image.get_buffer_manager().get_color_buffer().get_image_data()
+    return np.frombuffer(image.get_data('RGBA', image.width*4), np.uint8).reshape(image.height, image.width, 4)
+
+
+def pixel(cad, pixels, x, y):
+    """ Color at sheet point x, y. """
+    camera = cad.camera
+    px = int(round((x*cad.magnifier - camera.x)*camera.zoom + cad.width/2))
+    py = int(round((y*cad.magnifier - camera.y)*camera.zoom + cad.height/2))
+    return tuple(int(c) for c in pixels[py, px, :3])
+
+
+def test_selection_tints_only_the_selected_geometry(cad):
+    frame_wire = wire('A', 0, 0, 40, 0)
+    frame_wire['shapes'].append(dict(frame_wire['shapes'][0], x1 = 0, y1 = 0, x2 = 0, y2 = 40, width = 1))
+    frame_wire['shapes'][0]['width'] = 1
+    inside = wire('B', 10, 20, 30, 20)
+    inside['shapes'][0]['width'] = 1
+    cad.scheme.jsonData['components'] = [frame_wire, inside]
+    cad.loadShapesFromJson()
+    cad.reset_view()
+    cad.set_selection({id(frame_wire): frame_wire})
+    pixels = frame(cad)
+    # B is inside the bounding box of A, but only A's lines are tinted
+    tint = np.array(cad.selection_group.color[:3])
+    assert np.abs(np.array(pixel(cad, pixels, 20, 0)) - tint).max() < 8
+    assert np.abs(np.array(pixel(cad, pixels, 0, 20)) - tint).max() < 8
+    assert pixel(cad, pixels, 20, 20) == (255, 255, 255)
+    # so is the empty sheet
+    assert pixel(cad, pixels, 20, 10) == pixel(cad, frame(cad), 20, 10)
+    cad.set_selection({})
+    assert pixel(cad, frame(cad), 20, 10) == pixel(cad, pixels, 20, 10)
+
+
+def test_double_click_into_macro_edit_keeps_the_selection(cad):
+    component = wire('A', 0, 0, 40, 0)
+    cad.scheme.jsonData['components'] = [component]
+    cad.loadShapesFromJson()
+    cad.reset_view()
+    # past the double click window of the window opening
+    time.sleep(0.3)
+    for click in range(2):
+        cad.set_hilighted_components([component] if cad.in_macro_edit == None else [])
+        cad.on_mouse_press(10, 10, pyglet.window.mouse.LEFT, 0)
+        cad.on_mouse_release(10, 10, pyglet.window.mouse.LEFT, 0)
+    assert cad.in_macro_edit is component
+    assert cad.selection == {id(component): component}
@@ -0,0 +1,54 @@
+import random
+
+from feetcad import SPATIAL_INDEX
+
+
+def brute(boxes, minx, miny, maxx, maxy):
+    return sorted(key for key, (x1, y1, x2, y2) in boxes.items()
+                  if x2 >= minx and x1 <= maxx and y2 >= miny and y1 <= maxy)
+
+
+def test_point_query_grows_bounds_by_tolerance():
+    index = SPATIAL_INDEX(cell_size = 10)
+    index.insert('a', 'A', (0, 0, 5, 5))
+    index.insert('b', 'B', (20, 20, 25, 25))
+    assert index.query_point(3, 3) == ['A']
+    assert index.query_point(7, 7) == []
+    assert index.query_point(7, 7, tolerance = 2) == ['A']
+    # a box across cells is found once
+    index.insert('c', 'C', (-15, -15, 15, 15))
+    assert sorted(index.query_point(3, 3)) == ['A', 'C']
+
+
+def test_rect_query_matches_brute_force():
+    rnd = random.Random(1)
+    index = SPATIAL_INDEX(cell_size = 7)
+    boxes = {}
+    for key in range(300):
+        x, y = rnd.uniform(-100, 100), rnd.uniform(-100, 100)
+        boxes[key] = (x, y, x + rnd.uniform(0, 30), y + rnd.uniform(0, 30))
+        index.insert(key, key, boxes[key])
+    for key in range(0, 300, 3):
+        # moved and removed boxes leave their old cells
+        if key % 2:
+            del boxes[key]
+            index.remove(key)
+        else:
+            boxes[key] = (boxes[key][0] + 50, boxes[key][1], boxes[key][2] + 50, boxes[key][3])
+            index.insert(key, key, boxes[key])
+    assert len(index) == len(boxes)
+    for rect in [(-10, -10, 10, 10), (-1000, -1000, 1000, 1000), (50, 50, 51, 51)]:
+        assert sorted(index.query_rect(*rect)) == brute(boxes, *rect)
+
+
+def test_world_bounds_follow_inserts_and_removes():
+    index = SPATIAL_INDEX(cell_size = 10)
+    assert index.world_bounds() == None
+    index.insert('a', 'A', (0, 0, 5, 5))
+    index.insert('b', 'B', (-20, 10, -10, 40))
+    assert index.world_bounds() == (-20, 0, 5, 40)
+    index.remove('b')
+    assert index.world_bounds() == (0, 0, 5, 5)
+    assert index.bounds('b') == None
+    index.clear()
+    assert len(index) == 0 and index.world_bounds() == None
@@ -0,0 +1,46 @@
+import numpy as np
+import pyglet
+
+from conftest import wire
+
+
+def tile_pixels(texture):
+    image = texture.get_image_data()
+    return np.frombuffer(image.get_data('RGBA', image.width*4), np.uint8).reshape(image.height, image.width, 4)
+
+
+def test_tile_keeps_translucent_alpha(cad):
+    cad.switch_to()
+    batch = pyglet.graphics.Batch()
+    size = cad.tile_cache.tile_size(0)
+    translucent = pyglet.shapes.Rectangle(0, 0, size/2, size, color = (171, 0, 247, 150),
+                                          batch = batch, group = cad.camera)
+    opaque = pyglet.shapes.Rectangle(size/2, 0, size/2, size, color = (0, 255, 0, 255),
+                                     batch = batch, group = cad.camera)
+    over = pyglet.shapes.Rectangle(size/2, 0, size/2, size, color = (255, 0, 0, 100),
+                                   batch = batch, group = cad.camera)
+    cad.tile_cache.render((0, 0, 0), lambda rect: batch.draw())
+    texture, sprite = cad.tile_cache.tiles[(0, 0, 0)]
+    pixels = tile_pixels(texture)
+    px = cad.tile_cache.tile_px
+    # premultiplied color, alpha as drawn
+    assert np.abs(pixels[px//2, px//4].astype(int) - [171*150//255, 0, 247*150//255, 150]).max() <= 1
+    assert pixels[px//2, 3*px//4][3] == 255
+
+
+def test_tile_render_draws_only_its_culling_tiles(cad):
+    cad.library.addPart({'name': 'P', 'shapes': wire('P', 0, 0, 10, 0)['shapes']})
+    near = wire('N1', 0, 0, 10, 0)
+    far = wire('F1', 0, 0, 10, 0, x = 300)
+    for component in (near, far):
+        component['referenceTo'] = 'P'
+    cad.scheme.jsonData['components'] = [near, far]
+    cad.loadShapesFromJson()
+    cad.reset_view()
+    cad.materialize_visible()
+    buckets = cad.symbols.symbols['P'].buckets
+    assert len(buckets) == 2
+
+    cad.draw_sheet((-10, -10, 20*cad.magnifier, 20))
+    drawn = [bucket for group, bucket in buckets.items() if group.visible]
+    assert len(drawn) == 1 and list(drawn[0].keys) == [id(near)]